@@ -19,3 +19,34 @@ class EvolutionOperationsMulti(object):
     def get_evolver(self):
         return self.evolver
 
+
+# The EvolutionOperations instances created so far, keyed by database name.
+_evolvers = {}
+
+
+def get_evolver(db_name=None):
+    """
+    Returns the EvolutionOperations for a database.
+
+    The instance is created the first time it's needed and then reused by
+    every caller for the rest of the process, so the backend only has to be
+    looked up once per database.
+    """
+    try:
+        return _evolvers[db_name]
+    except KeyError:
+        evolver = EvolutionOperationsMulti(db_name).get_evolver()
+        _evolvers[db_name] = evolver
+
+        return evolver
+
+
+def reset_evolvers():
+    """
+    Discards the EvolutionOperations instances created so far.
+
+    New instances will be created on next use, picking up any changes to
+    the settings.
+    """
+    _evolvers.clear()
+
@@ -1,15 +1,188 @@
 import django
+from django.conf import settings
 from django.core.management import color
 from django.db import connection as default_connection
+from django.db import models
 from django.db.backends.util import truncate_name
 import copy
+import re
+
+
+# Matches an ALTER TABLE statement operating on a single column, capturing
+# the table, the action and the column name(s) affected by it.
+ALTER_TABLE_RE = re.compile(
+    r'^ALTER TABLE (?P<table>"[^"]+"|`[^`]+`) '
+    r'(?P<action>(?P<verb>[A-Z]+) COLUMN (?P<column>"[^"]+"|`[^`]+`)'
+    r'(?: (?P<new_column>"[^"]+"|`[^`]+`))?.*);$')
+
+
+class SQLOperation(object):
+    """
+    An operation that can't be expressed as a single SQL statement, such as
+    one that must commit as it goes.
+
+    These can be returned in the lists of SQL statements generated by the
+    evolvers. execute_sql runs them by calling execute(), and write_sql
+    writes the statements returned by get_sql(). Subclasses override
+    either or both of these.
+    """
+    # The number of rows affected by the operation once executed, or -1 if
+    # it isn't known, as with a DB-API cursor's rowcount.
+    rowcount = -1
+
+    def execute(self, cursor, commit=None, progress=None):
+        """
+        Runs the operation on a cursor. commit, if provided, commits the
+        current transaction.
+
+        Long operations may report their progress by calling progress (if
+        provided) with a description, the amount of work done so far, and
+        the total amount of work.
+
+        By default, this runs the statements returned by get_sql().
+        """
+        for statement in self.get_sql():
+            if isinstance(statement, tuple):
+                cursor.execute(*statement)
+            else:
+                cursor.execute(statement)
+
+        self.rowcount = cursor.rowcount
+
+    def get_sql(self):
+        """
+        Returns the SQL statements to run in place of the operation when
+        it's applied by hand, as strings or (sql, params) tuples.
+
+        By default, this is the operation's unicode representation.
+        """
+        return [unicode(self)]
+
+    def get_report(self):
+        """
+        Returns a description of how the operation was performed once
+        executed, or None if there's nothing worth reporting.
+        """
+        return None
+
+
+class Backfill(SQLOperation):
+    """
+    Sets the initial value of a column on the rows where it's NULL, one
+    range of primary keys at a time.
+
+    When executed, each range is updated by its own UPDATE statement,
+    optionally committing after each one, so that no single transaction
+    needs to lock or log the whole table. The first range starts at the
+    lowest primary key still holding NULL, so running a backfill again
+    after an interruption resumes after the last range that was committed.
+
+    Subclasses can update other rows by overriding get_condition_sql().
+    """
+    def __init__(self, connection, table_name, pk_column, column, initial,
+                 chunk_size):
+        self.connection = connection
+        self.table_name = table_name
+        self.pk_column = pk_column
+        self.column = column
+        self.initial = initial
+        self.chunk_size = chunk_size
+
+    def get_value_sql(self):
+        "Returns the SQL for the value, along with any parameters."
+        if callable(self.initial):
+            return self.initial(), ()
+        else:
+            return '%s', (self.initial,)
+
+    def get_condition_sql(self):
+        "Returns the SQL condition matching the rows that need updating."
+        return '%s IS NULL' % self.connection.ops.quote_name(self.column)
+
+    def get_update_sql(self):
+        "Returns the UPDATE statement for one range, without parameters."
+        qn = self.connection.ops.quote_name
+        value_sql, value_params = self.get_value_sql()
+
+        return ('UPDATE %s SET %s = %s WHERE %s AND %s >= %%s '
+                'AND %s < %%s;'
+                % (qn(self.table_name), qn(self.column), value_sql,
+                   self.get_condition_sql(), qn(self.pk_column),
+                   qn(self.pk_column)))
+
+    def execute(self, cursor, commit=None, progress=None):
+        """
+        Runs the backfill on a cursor, calling commit (if provided) after
+        each range is updated.
+        """
+        qn = self.connection.ops.quote_name
+        cursor.execute('SELECT MIN(%s), MAX(%s) FROM %s WHERE %s;'
+                       % (qn(self.pk_column), qn(self.pk_column),
+                          qn(self.table_name), self.get_condition_sql()))
+        start, end = cursor.fetchone()
+        self.rowcount = 0
+
+        if start is None:
+            return
+
+        update_sql = self.get_update_sql()
+        value_params = self.get_value_sql()[1]
+
+        while start <= end:
+            cursor.execute(update_sql,
+                           value_params + (start, start + self.chunk_size))
+            self.rowcount += cursor.rowcount
+
+            if commit:
+                commit()
+
+            start += self.chunk_size
+
+    def get_sql(self):
+        """
+        Returns a single UPDATE statement for all the rows, as it's not
+        known which ranges need updating until the backfill is executed.
+        """
+        qn = self.connection.ops.quote_name
+        value_sql, value_params = self.get_value_sql()
+
+        return [('UPDATE %s SET %s = %s WHERE %s;'
+                 % (qn(self.table_name), qn(self.column), value_sql,
+                    self.get_condition_sql()),
+                 value_params)]
+
+    def __unicode__(self):
+        return u'-- Backfill in ranges of %d rows of %s:\n%s' % (
+            self.chunk_size, self.pk_column, self.get_update_sql())
 
 
 class BaseEvolutionOperations(object):
     connection = None
 
+    # Whether column changes are made by rebuilding the whole table. If set,
+    # the backend must provide rebuild_table(), and consecutive changes to
+    # a table will be applied through a single rebuild.
+    supports_table_rebuild = False
+
+    # The column actions (ADD, DROP, ALTER, ...) that can be combined into
+    # a single ALTER TABLE statement.
+    combinable_alter_actions = ()
+
+    # Whether INSERT statements can provide several rows of VALUES.
+    supports_multi_row_insert = True
+
+    # The number of rows inserted by each statement from insert_rows().
+    insert_batch_size = 100
+
+    # The number of rows updated at a time when setting the initial value
+    # of a column, or None to update all the rows in one statement.
+    backfill_chunk_size = None
+
     def __init__(self, connection = default_connection):
         self.connection = connection
+        self.backfill_chunk_size = getattr(
+            settings, 'DJANGO_EVOLUTION_BACKFILL_CHUNK_SIZE',
+            self.backfill_chunk_size)
         
     def quote_sql_param(self, param):
         "Add protective quoting around an SQL string parameter"
@@ -18,6 +191,115 @@ class BaseEvolutionOperations(object):
         else:
             return param
 
+    def combine_alter_statements(self, sql, sources=None):
+        """
+        Combines consecutive ALTER TABLE statements on the same table into
+        a single statement, so that the table only needs to be altered once.
+
+        Actions affecting a column already altered by the statement being
+        built start a new statement, as the order they're applied within a
+        statement isn't guaranteed.
+
+        If sources is provided, it must contain a list for each statement,
+        such as the mutations that generated it. The combined statements
+        are then returned along with the list of sources for each of them,
+        where a combined statement has the sources of every statement it
+        replaces.
+        """
+        output = []
+        output_sources = []
+        table = None
+        statements = []
+        statement_sources = []
+        actions = []
+        columns = set()
+
+        if sources is None:
+            all_sources = [[] for statement in sql]
+        else:
+            all_sources = sources
+
+        for statement, statement_source in zip(sql, all_sources):
+            m = None
+
+            if isinstance(statement, basestring):
+                m = ALTER_TABLE_RE.match(statement)
+
+            if m and m.group('verb') not in self.combinable_alter_actions:
+                m = None
+
+            if m:
+                statement_columns = set([m.group('column')])
+
+                if m.group('verb') == 'CHANGE':
+                    statement_columns.add(m.group('new_column'))
+
+                if (m.group('table') == table and
+                    not columns.intersection(statement_columns)):
+                    statements.append(statement)
+                    statement_sources.append(statement_source)
+                    actions.append(m.group('action').strip())
+                    columns.update(statement_columns)
+                    continue
+
+            self._flush_alter_actions(table, statements, statement_sources,
+                                      actions, output, output_sources)
+            statements = []
+            statement_sources = []
+            actions = []
+            columns = set()
+
+            if m:
+                table = m.group('table')
+                statements.append(statement)
+                statement_sources.append(statement_source)
+                actions.append(m.group('action').strip())
+                columns.update(statement_columns)
+            else:
+                table = None
+                output.append(statement)
+                output_sources.append(statement_source)
+
+        self._flush_alter_actions(table, statements, statement_sources,
+                                  actions, output, output_sources)
+
+        if sources is None:
+            return output
+
+        return output, output_sources
+
+    def _flush_alter_actions(self, table, statements, statement_sources,
+                             actions, output, output_sources):
+        combined = self._combine_alter_actions(table, statements, actions)
+        output.extend(combined)
+
+        if len(combined) == len(statements):
+            output_sources.extend(statement_sources)
+        else:
+            merged_sources = []
+
+            for statement_source in statement_sources:
+                for source in statement_source:
+                    if source not in merged_sources:
+                        merged_sources.append(source)
+
+            output_sources.append(merged_sources)
+
+    def _combine_alter_actions(self, table, statements, actions):
+        if len(statements) < 2:
+            return statements
+
+        return ['ALTER TABLE %s %s;' % (table, ', '.join(actions))]
+
+    def apply_online_ddl(self, sql):
+        """
+        Returns the list of SQL statements with any statements that can be
+        run without blocking writes converted to do so.
+
+        By default, statements are returned unchanged.
+        """
+        return sql
+
     def rename_table(self, model, old_db_tablename, db_tablename):
         if old_db_tablename == db_tablename:
             # No Operation
@@ -126,12 +408,7 @@ class BaseEvolutionOperations(object):
                 params = (qn(model._meta.db_table), qn(f.column), f.db_type(), unique_constraints)
                 output = ['ALTER TABLE %s ADD COLUMN %s %s %s;' % params]
 
-                if callable(initial):
-                    params = (qn(model._meta.db_table), qn(f.column), initial(), qn(f.column))
-                    output.append('UPDATE %s SET %s = %s WHERE %s IS NULL;' % params)
-                else:
-                    params = (qn(model._meta.db_table), qn(f.column), qn(f.column))
-                    output.append(('UPDATE %s SET %s = %%s WHERE %s IS NULL;' % params, (initial,)))
+                output.extend(self.set_initial_value(model, f, initial))
 
                 if not f.null:
                     # Only put this sql statement if the column cannot be null.
@@ -141,6 +418,30 @@ class BaseEvolutionOperations(object):
                 output = ['ALTER TABLE %s ADD COLUMN %s %s %s;' % params]
         return output
 
+    def set_initial_value(self, model, f, initial):
+        """
+        Returns the SQL setting a column to its initial value on every row
+        where it's NULL.
+
+        If backfill_chunk_size is set and the primary key is an integer,
+        this is a Backfill updating the rows in ranges of primary keys.
+        """
+        qn = self.connection.ops.quote_name
+        opts = model._meta
+
+        if (self.backfill_chunk_size and
+            isinstance(opts.pk, (models.AutoField, models.IntegerField))):
+            return [Backfill(self.connection, opts.db_table, opts.pk.column,
+                             f.column, initial, self.backfill_chunk_size)]
+
+        if callable(initial):
+            params = (qn(opts.db_table), qn(f.column), initial(), qn(f.column))
+            return ['UPDATE %s SET %s = %s WHERE %s IS NULL;' % params]
+        else:
+            params = (qn(opts.db_table), qn(f.column), qn(f.column))
+            return [('UPDATE %s SET %s = %%s WHERE %s IS NULL;' % params,
+                     (initial,))]
+
     def set_field_null(self, model, f, null):
         qn = self.connection.ops.quote_name
         params = (qn(model._meta.db_table), qn(f.column),)
@@ -182,13 +483,7 @@ class BaseEvolutionOperations(object):
             output.append(self.set_field_null(model, f, new_null_attr))
         else:
             if initial is not None:
-                output = []
-                if callable(initial):
-                    params = (qn(opts.db_table), qn(f.column), initial(), qn(f.column))
-                    output.append('UPDATE %s SET %s = %s WHERE %s IS NULL;' % params)
-                else:
-                    params = (qn(opts.db_table), qn(f.column), qn(f.column))
-                    output.append(('UPDATE %s SET %s = %%s WHERE %s IS NULL;' % params, (initial,)))
+                output.extend(self.set_initial_value(model, f, initial))
             output.append(self.set_field_null(model, f, new_null_attr))
 
         return output
@@ -232,3 +527,36 @@ class BaseEvolutionOperations(object):
         else:
             params = (qn(opts.db_table), constraint_name,)
             return ['ALTER TABLE %s DROP CONSTRAINT %s;' % params]
+
+    def insert_rows(self, table_name, columns, rows):
+        """
+        Returns the SQL to insert a list of rows into a table.
+
+        Rows are inserted in batches of insert_batch_size rows per
+        statement, or one row per statement if the backend doesn't support
+        multi-row inserts.
+        """
+        qn = self.connection.ops.quote_name
+
+        if self.supports_multi_row_insert:
+            batch_size = self.insert_batch_size
+        else:
+            batch_size = 1
+
+        sql_prefix = 'INSERT INTO %s (%s) VALUES ' % (
+            qn(table_name), ', '.join([qn(column) for column in columns]))
+        placeholders = '(%s)' % ', '.join(['%s'] * len(columns))
+        output = []
+
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            params = []
+
+            for row in batch:
+                params.extend(row)
+
+            output.append((sql_prefix +
+                           ', '.join([placeholders] * len(batch)) + ';',
+                           tuple(params)))
+
+        return output
@@ -1,8 +1,141 @@
+from django.conf import settings
 from django.core.management import color
+from django.db import models
+
+from common import BaseEvolutionOperations, Backfill, SQLOperation
+
+
+# The ALGORITHM and LOCK clauses tried for online DDL, from the least to the
+# most restrictive. The last entry runs the statement without any clauses,
+# letting MySQL pick the algorithm.
+ONLINE_DDL_HINTS = [
+    ('INPLACE', 'NONE'),
+    ('INPLACE', 'SHARED'),
+    (None, None),
+]
+
+# The MySQL errors raised when an ALGORITHM or LOCK clause isn't supported
+# for a statement (or at all, on servers older than 5.6).
+REJECTED_HINT_ERRORS = (
+    1064,  # ER_PARSE_ERROR
+    1845,  # ER_ALTER_OPERATION_NOT_SUPPORTED
+    1846,  # ER_ALTER_OPERATION_NOT_SUPPORTED_REASON
+)
+
+
+class OnlineDDLOperation(SQLOperation):
+    """
+    Runs an ALTER TABLE, CREATE INDEX or DROP INDEX statement with the
+    ALGORITHM and LOCK clauses that block the table the least.
+
+    If the server rejects the clauses, the statement is retried with the
+    next, more restrictive ones from ONLINE_DDL_HINTS. The clauses that were
+    accepted are reported once the statement has run.
+    """
+    def __init__(self, sql, hints=ONLINE_DDL_HINTS):
+        self.sql = sql
+        self.hints = hints
+        self.used_hint = None
+
+    def get_hinted_sql(self, algorithm, lock):
+        "Returns the statement with the given ALGORITHM and LOCK clauses."
+        if algorithm is None:
+            return self.sql
+
+        statement = self.sql.rstrip().rstrip(';')
+
+        if statement.startswith('ALTER TABLE '):
+            return '%s, ALGORITHM=%s, LOCK=%s;' % (statement, algorithm, lock)
+        else:
+            return '%s ALGORITHM=%s LOCK=%s;' % (statement, algorithm, lock)
+
+    def execute(self, cursor, commit=None, progress=None):
+        for algorithm, lock in self.hints:
+            try:
+                cursor.execute(self.get_hinted_sql(algorithm, lock))
+            except Exception, e:
+                if (algorithm is None or
+                    not e.args or e.args[0] not in REJECTED_HINT_ERRORS):
+                    raise
+
+                continue
+
+            self.used_hint = (algorithm, lock)
+            break
+
+    def get_report(self):
+        if self.used_hint is None:
+            return None
+
+        algorithm, lock = self.used_hint
+
+        if algorithm is None:
+            used = 'server default (online DDL rejected)'
+        else:
+            used = 'ALGORITHM=%s, LOCK=%s' % (algorithm, lock)
+
+        return '%s -- %s' % (self.sql, used)
+
+    def __unicode__(self):
+        return unicode(self.get_hinted_sql(*self.hints[0]))
+
+
+class Truncation(Backfill):
+    """
+    Truncates the values of a column that are longer than a new maximum
+    length, one range of primary keys at a time.
+
+    Only the rows whose values are too long are updated, so running the
+    truncation again after an interruption resumes where it left off.
+    """
+    def __init__(self, connection, table_name, pk_column, column,
+                 max_length, chunk_size):
+        qn = connection.ops.quote_name
+        super(Truncation, self).__init__(
+            connection, table_name, pk_column, column,
+            lambda: 'LEFT(%s,%d)' % (qn(column), max_length), chunk_size)
+        self.max_length = max_length
+
+    def get_condition_sql(self):
+        return 'CHAR_LENGTH(%s) > %d' % (
+            self.connection.ops.quote_name(self.column), self.max_length)
+
+    def __unicode__(self):
+        return u'-- Truncate in ranges of %d rows of %s:\n%s' % (
+            self.chunk_size, self.pk_column, self.get_update_sql())
 
-from common import BaseEvolutionOperations
 
 class EvolutionOperations(BaseEvolutionOperations):
+    combinable_alter_actions = ('ADD', 'DROP', 'MODIFY', 'CHANGE')
+
+    # Whether schema changes are run with online DDL clauses, falling back
+    # to more restrictive ones if the server rejects them.
+    online_ddl = False
+
+    def __init__(self, *args, **kwargs):
+        super(EvolutionOperations, self).__init__(*args, **kwargs)
+        self.online_ddl = getattr(settings,
+                                  'DJANGO_EVOLUTION_MYSQL_ONLINE_DDL',
+                                  self.online_ddl)
+
+    def apply_online_ddl(self, sql):
+        if not self.online_ddl:
+            return sql
+
+        output = []
+
+        for statement in sql:
+            if (isinstance(statement, basestring) and
+                (statement.startswith('ALTER TABLE ') or
+                 statement.startswith('CREATE INDEX ') or
+                 statement.startswith('CREATE UNIQUE INDEX ') or
+                 statement.startswith('DROP INDEX '))):
+                statement = OnlineDDLOperation(statement)
+
+            output.append(statement)
+
+        return output
+
     def rename_column(self, opts, old_field, f):
         if old_field.column == f.column:
             # No Operation
@@ -49,9 +182,19 @@ class EvolutionOperations(BaseEvolutionOperations):
             return 'ALTER TABLE %s MODIFY COLUMN %s %s NOT NULL;' % params
 
     def change_max_length(self, model, field_name, new_max_length, initial=None):
+        """
+        Returns the SQL changing the maximum length of a column.
+
+        When the column is shrinking, the values that no longer fit are
+        truncated first. Only the rows holding such values are updated,
+        in ranges of primary keys if backfill_chunk_size is set and the
+        primary key is an integer. Widening a column never truncates
+        anything, so no UPDATE is needed.
+        """
         qn = self.connection.ops.quote_name
         opts = model._meta
         f = opts.get_field(field_name)
+        old_max_length = f.max_length
         f.max_length = new_max_length
         params = {
             'table': qn(opts.db_table),
@@ -59,8 +202,22 @@ class EvolutionOperations(BaseEvolutionOperations):
             'length': f.max_length,
             'type': f.db_type()
         }
-        return ['UPDATE %(table)s SET %(column)s=LEFT(%(column)s,%(length)d);' % params,
-                'ALTER TABLE %(table)s MODIFY COLUMN %(column)s %(type)s;' % params]
+        output = []
+
+        if old_max_length is None or new_max_length < old_max_length:
+            if (self.backfill_chunk_size and
+                isinstance(opts.pk, (models.AutoField, models.IntegerField))):
+                output.append(Truncation(self.connection, opts.db_table,
+                                         opts.pk.column, f.column,
+                                         new_max_length,
+                                         self.backfill_chunk_size))
+            else:
+                output.append('UPDATE %(table)s SET %(column)s=LEFT(%(column)s,%(length)d) '
+                              'WHERE CHAR_LENGTH(%(column)s) > %(length)d;' % params)
+
+        output.append('ALTER TABLE %(table)s MODIFY COLUMN %(column)s %(type)s;' % params)
+
+        return output
 
     def drop_index(self, model, f):
         qn = self.connection.ops.quote_name
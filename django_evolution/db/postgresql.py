@@ -1,10 +1,144 @@
+import re
+
+from django.conf import settings
 from django.core.management import color
 from django.db.backends.util import truncate_name
+from django.utils.functional import curry
+
+from django_evolution import EvolutionException
+
+from common import BaseEvolutionOperations, SQLOperation
+
+
+CREATE_INDEX_RE = re.compile(r'^CREATE (UNIQUE )?INDEX (?P<name>"[^"]+"|\S+)')
+DROP_INDEX_RE = re.compile(r'^DROP INDEX (?P<name>"[^"]+"|[^\s;]+)')
+
+# The psycopg2 isolation level that puts a connection in autocommit mode.
+ISOLATION_LEVEL_AUTOCOMMIT = 0
+
+
+class ConcurrentIndexOperation(SQLOperation):
+    """
+    Creates or drops an index concurrently, without blocking writes to the
+    table.
+
+    PostgreSQL can't do this inside a transaction block, so the current
+    transaction is committed first and the statement is run in autocommit
+    mode. A failed concurrent build leaves an INVALID index behind, which is
+    dropped after the failure, as well as before building the index in case
+    an earlier attempt failed.
+
+    Indexes are only dropped concurrently if concurrent_drop is set, as
+    that requires PostgreSQL 9.2. The statement is skipped if the index
+    has already been created or dropped, so an interrupted evolution can
+    be run again.
+    """
+    def __init__(self, connection, sql, concurrent_drop=True):
+        self.connection = connection
+        self.sql = sql
+        self.index_name = None
+        self.dropping = False
+        self.concurrent_drop = concurrent_drop
+
+        m = CREATE_INDEX_RE.match(sql)
+
+        if m:
+            self.sql = '%sCONCURRENTLY %s' % (sql[:m.start('name')],
+                                              sql[m.start('name'):])
+        else:
+            m = DROP_INDEX_RE.match(sql)
+
+            if m:
+                self.dropping = True
+
+                if concurrent_drop:
+                    self.sql = 'DROP INDEX CONCURRENTLY %s' % \
+                               sql[len('DROP INDEX '):]
+
+        if m:
+            self.index_name = m.group('name').strip('"')
+
+    def execute(self, cursor, commit=None, progress=None):
+        if not commit:
+            raise EvolutionException(
+                'Indexes can only be created or dropped concurrently if '
+                'the current transaction can be committed first.')
+
+        commit()
+
+        db_connection = self.connection.connection
+
+        if hasattr(db_connection, 'set_isolation_level'):
+            # psycopg2
+            old_isolation_level = db_connection.isolation_level
+            db_connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            restore_transactions = curry(db_connection.set_isolation_level,
+                                         old_isolation_level)
+        else:
+            # psycopg1
+            db_connection.autocommit(1)
+            restore_transactions = curry(db_connection.autocommit, 0)
+
+        try:
+            if self.dropping:
+                if self.index_exists(cursor):
+                    cursor.execute(self.sql)
+            else:
+                self.drop_invalid_index(cursor)
 
-from common import BaseEvolutionOperations
+                if not self.index_exists(cursor):
+                    try:
+                        cursor.execute(self.sql)
+                    except Exception:
+                        self.drop_invalid_index(cursor)
+                        raise
+        finally:
+            restore_transactions()
+
+    def index_exists(self, cursor):
+        "Returns whether the index exists."
+        cursor.execute("SELECT 1 FROM pg_class"
+                       " WHERE relname = %s AND relkind = 'i';",
+                       (self.index_name,))
+
+        return cursor.fetchone() is not None
+
+    def drop_invalid_index(self, cursor):
+        "Drops the index being built if it was left INVALID."
+        if not self.index_name:
+            return
+
+        cursor.execute('SELECT 1 FROM pg_class c'
+                       ' JOIN pg_index i ON i.indexrelid = c.oid'
+                       ' WHERE c.relname = %s AND NOT i.indisvalid;',
+                       (self.index_name,))
+
+        if cursor.fetchone():
+            qn = self.connection.ops.quote_name
+
+            if self.concurrent_drop:
+                cursor.execute('DROP INDEX CONCURRENTLY %s;'
+                               % qn(self.index_name))
+            else:
+                cursor.execute('DROP INDEX %s;' % qn(self.index_name))
+
+    def __unicode__(self):
+        return unicode(self.sql)
 
 
 class EvolutionOperations(BaseEvolutionOperations):
+    combinable_alter_actions = ('ADD', 'DROP', 'ALTER')
+
+    # Whether indexes are created and dropped concurrently, outside of the
+    # evolution's transaction.
+    concurrent_indexes = False
+
+    def __init__(self, *args, **kwargs):
+        super(EvolutionOperations, self).__init__(*args, **kwargs)
+        self.concurrent_indexes = getattr(
+            settings, 'DJANGO_EVOLUTION_CONCURRENT_INDEXES',
+            self.concurrent_indexes)
+
     def rename_column(self, opts, old_field, new_field):
         if old_field.column == new_field.column:
             # No Operation
@@ -60,3 +194,28 @@ class EvolutionOperations(BaseEvolutionOperations):
         # By default, Django 1.2 will use a digest hash for the column name.
         # The PostgreSQL support, however, uses the column name itself.
         return '%s_%s' % (model._meta.db_table, f.column)
+
+    def can_drop_index_concurrently(self):
+        "Returns whether indexes can be dropped concurrently."
+        # DROP INDEX CONCURRENTLY was introduced in PostgreSQL 9.2.
+        return self.connection.ops.postgres_version >= (9, 2)
+
+    def create_index(self, model, f):
+        sql = super(EvolutionOperations, self).create_index(model, f)
+
+        if self.concurrent_indexes:
+            concurrent_drop = self.can_drop_index_concurrently()
+            sql = [ConcurrentIndexOperation(self.connection, statement,
+                                            concurrent_drop)
+                   for statement in sql]
+
+        return sql
+
+    def drop_index(self, model, f):
+        sql = super(EvolutionOperations, self).drop_index(model, f)
+
+        if self.concurrent_indexes and self.can_drop_index_concurrently():
+            sql = [ConcurrentIndexOperation(self.connection, statement)
+                   for statement in sql]
+
+        return sql
@@ -1,11 +1,212 @@
+from django.conf import settings
 from django.core.management import color
 from django.db import models
+from django.db.backends.sqlite3.base import Database
 
-from common import BaseEvolutionOperations
+from common import BaseEvolutionOperations, SQLOperation
 
 TEMP_TABLE_NAME = 'TEMP_TABLE'
 
+# The suffix of the table that rows are copied into when a table is rebuilt
+# by renaming its copy.
+NEW_TABLE_SUFFIX = '__evolution_new'
+
+
+class FakeMeta(object):
+    def __init__(self, table_name, field_list):
+        self.db_table = table_name
+        self.local_fields = field_list
+        self.fields = field_list # Required for Pre QS-RF support
+        self.db_tablespace = None
+        self.managed = True
+        self.proxy = False
+
+
+class FakeModel(object):
+    "A stand-in for a model, used to generate the SQL for its indexes."
+    def __init__(self, table_name, field_list):
+        self._meta = FakeMeta(table_name, field_list)
+
+
+class TableCopy(SQLOperation):
+    """
+    Copies the rows of one table into another, one range of rowids at a
+    time.
+
+    select_columns contains the SQL expression used to populate each of
+    the destination columns, and params contains the parameters for those
+    expressions. After each range is copied, progress (if provided) is
+    called with the number of rows copied so far and the total number of
+    rows.
+    """
+    def __init__(self, connection, source_table, dest_table, dest_columns,
+                 select_columns, params, batch_size):
+        self.connection = connection
+        self.source_table = source_table
+        self.dest_table = dest_table
+        self.dest_columns = dest_columns
+        self.select_columns = select_columns
+        self.params = tuple(params)
+        self.batch_size = batch_size
+
+    def get_copy_sql(self, batched=True):
+        """
+        Returns the INSERT statement for one range, without parameters, or
+        for the whole table if batched is False.
+        """
+        qn = self.connection.ops.quote_name
+        sql = ('INSERT INTO %s (%s) SELECT %s FROM %s'
+               % (qn(self.dest_table),
+                  ', '.join([qn(column) for column in self.dest_columns]),
+                  ', '.join(self.select_columns), qn(self.source_table)))
+
+        if batched:
+            sql += ' WHERE rowid >= %s AND rowid < %s ORDER BY rowid'
+
+        return sql + ';'
+
+    def get_sql(self):
+        """
+        Returns a single INSERT statement copying the whole table, as the
+        batches depend on the rowids in the table.
+        """
+        return [(self.get_copy_sql(batched=False), self.params)]
+
+    def execute(self, cursor, commit=None, progress=None):
+        qn = self.connection.ops.quote_name
+        cursor.execute('SELECT MIN(rowid), MAX(rowid), COUNT(*) FROM %s;'
+                       % qn(self.source_table))
+        start, end, total = cursor.fetchone()
+        self.rowcount = 0
+
+        if start is None:
+            return
+
+        copy_sql = self.get_copy_sql()
+        description = 'Copying rows of %s' % self.source_table
+
+        while start <= end:
+            cursor.execute(copy_sql,
+                           self.params + (start, start + self.batch_size))
+            self.rowcount += cursor.rowcount
+            start += self.batch_size
+
+            if progress:
+                progress(description, self.rowcount, total)
+
+    def __unicode__(self):
+        return u'-- Copy in batches of %d rows by rowid:\n%s' % (
+            self.batch_size, self.get_copy_sql())
+
+
 class EvolutionOperations(BaseEvolutionOperations):
+    supports_table_rebuild = True
+
+    # Multi-row VALUES were introduced in SQLite 3.7.11.
+    supports_multi_row_insert = Database.sqlite_version_info >= (3, 7, 11)
+
+    # The number of rows copied at a time when rebuilding a table, or None
+    # to rebuild tables through a temporary copy of the whole table.
+    copy_batch_size = None
+
+    # Columns can be renamed in place, rather than by rebuilding the table,
+    # since SQLite 3.25.0, and dropped in place since SQLite 3.35.0.
+    supports_rename_column = Database.sqlite_version_info >= (3, 25, 0)
+    supports_drop_column = Database.sqlite_version_info >= (3, 35, 0)
+
+    def __init__(self, *args, **kwargs):
+        super(EvolutionOperations, self).__init__(*args, **kwargs)
+        self.copy_batch_size = getattr(
+            settings, 'DJANGO_EVOLUTION_SQLITE_COPY_BATCH_SIZE',
+            self.copy_batch_size)
+
+    def can_drop_column(self, model, f):
+        """
+        Returns whether a column can be dropped in place.
+
+        SQLite refuses to drop columns that are part of a primary key, a
+        UNIQUE constraint or a foreign key. Those need a table rebuild.
+        """
+        if not self.supports_drop_column:
+            return False
+
+        for unique_together in model._meta.unique_together:
+            if f.name in unique_together:
+                return False
+
+        return not (f.primary_key or f.unique or f.rel)
+
+    def copy_table(self, table_name, fields, sources, initials,
+                   create_index=True):
+        """
+        Rebuilds a table by copying its rows once into a new table, which
+        then replaces the original one.
+
+        fields is the list of fields in the new table, and sources contains
+        the field in the old table that each of them is copied from, or None
+        for new fields. initials maps field names to a tuple of (initial
+        value, only_null), used to populate the field as it's copied.
+
+        Rows are copied in batches of copy_batch_size, so progress can be
+        reported along the way, and the new table is renamed rather than
+        copied a second time, keeping a single extra copy of the data on
+        disk.
+        """
+        qn = self.connection.ops.quote_name
+        new_table_name = table_name + NEW_TABLE_SUFFIX
+        dest_columns = []
+        select_columns = []
+        params = []
+
+        for f, source in zip(fields, sources):
+            if isinstance(f, models.ManyToManyField):
+                continue
+
+            value = None
+
+            if f.name in initials and initials[f.name][0] is not None:
+                initial, only_null = initials[f.name]
+
+                if callable(initial):
+                    value = initial()
+                else:
+                    value = '%s'
+                    params.append(initial)
+
+                if source is not None and only_null:
+                    value = 'COALESCE(%s, %s)' % (qn(source.column), value)
+            elif source is not None:
+                value = qn(source.column)
+
+            if value is not None:
+                dest_columns.append(f.column)
+                select_columns.append(value)
+
+        output = []
+        output.extend(self.create_table(new_table_name, fields,
+                                        create_index=False))
+        output.append(TableCopy(self.connection, table_name, new_table_name,
+                                dest_columns, select_columns, params,
+                                self.copy_batch_size))
+        output.extend(self.delete_table(table_name))
+        output.append('ALTER TABLE %s RENAME TO %s;'
+                      % (qn(new_table_name), qn(table_name)))
+
+        if create_index:
+            output.extend(self.create_indexes_for_table(table_name, fields))
+
+        return output
+
+    def drop_index_if_exists(self, model, f):
+        """
+        Returns the SQL dropping a field's index, if it still exists.
+
+        Tables rebuilt without their indexes (such as when adding a column
+        or changing an attribute) no longer have an index for the field.
+        """
+        return [statement.replace('DROP INDEX ', 'DROP INDEX IF EXISTS ', 1)
+                for statement in self.drop_index(model, f)]
+
     def delete_column(self, model, f):
         output = []
 
@@ -14,6 +215,20 @@ class EvolutionOperations(BaseEvolutionOperations):
                         and field.db_type() is not None] # and any Generic fields
         table_name = model._meta.db_table
 
+        if self.can_drop_column(model, f):
+            qn = self.connection.ops.quote_name
+
+            if f.db_index:
+                output.extend(self.drop_index_if_exists(model, f))
+
+            output.append('ALTER TABLE %s DROP COLUMN %s;'
+                          % (qn(table_name), qn(f.column)))
+
+            return output
+
+        if self.copy_batch_size:
+            return self.copy_table(table_name, field_list, field_list, {})
+
         output.extend(self.create_temp_table(field_list))
         output.extend(self.copy_to_temp_table(table_name, field_list))
         output.extend(self.delete_table(table_name))
@@ -58,7 +273,7 @@ class EvolutionOperations(BaseEvolutionOperations):
 
         return ', '.join(columns)
 
-    def insert_to_temp_table(self, field, initial):
+    def insert_to_temp_table(self, field, initial, only_null=False):
         qn = self.connection.ops.quote_name
 
         # At this point, initial can only be None if null=True, otherwise it is
@@ -69,32 +284,23 @@ class EvolutionOperations(BaseEvolutionOperations):
         params = {
             'table_name': qn(TEMP_TABLE_NAME),
             'column_name': qn(field.column),
+            'where': '',
         }
 
+        if only_null:
+            params['where'] = ' WHERE %s IS NULL' % qn(field.column)
+
         if callable(initial):
             params['value'] = initial()
-            return ["UPDATE %(table_name)s SET %(column_name)s = %(value)s;" % params]
+            return ["UPDATE %(table_name)s SET %(column_name)s = %(value)s%(where)s;" % params]
         else:
-            return [("UPDATE %(table_name)s SET %(column_name)s = %%s;" % params, (initial,))]
+            return [("UPDATE %(table_name)s SET %(column_name)s = %%s%(where)s;" % params, (initial,))]
 
 
     def create_temp_table(self, field_list):
         return self.create_table(TEMP_TABLE_NAME, field_list, True, False)
 
     def create_indexes_for_table(self, table_name, field_list):
-        class FakeMeta(object):
-            def __init__(self, table_name, field_list):
-                self.db_table = table_name
-                self.local_fields = field_list
-                self.fields = field_list # Required for Pre QS-RF support
-                self.db_tablespace = None
-                self.managed = True
-                self.proxy = False
-
-        class FakeModel(object):
-            def __init__(self, table_name, field_list):
-                self._meta = FakeMeta(table_name, field_list)
-
         style = color.no_style()
         return self.connection.creation.sql_indexes_for_model(FakeModel(table_name, field_list), style)
 
@@ -155,6 +361,16 @@ class EvolutionOperations(BaseEvolutionOperations):
                     new_fields.append(f)
 
         table_name = opts.db_table
+
+        if self.supports_rename_column:
+            return self.rename_column_in_place(table_name, new_fields,
+                                               old_field, new_field)
+
+        if self.copy_batch_size:
+            sources = [(f is new_field and old_field) or f
+                       for f in new_fields]
+            return self.copy_table(table_name, new_fields, sources, {})
+
         output = []
         output.extend(self.create_temp_table(new_fields))
         output.extend(self.copy_to_temp_table(table_name, original_fields,
@@ -166,6 +382,26 @@ class EvolutionOperations(BaseEvolutionOperations):
 
         return output
 
+    def rename_column_in_place(self, table_name, field_list, old_field,
+                               new_field):
+        """
+        Renames a column with ALTER TABLE ... RENAME COLUMN.
+
+        SQLite keeps the column's index under its old name, so the index is
+        recreated with the name it would have been given for the new column.
+        """
+        qn = self.connection.ops.quote_name
+        output = ['ALTER TABLE %s RENAME COLUMN %s TO %s;'
+                  % (qn(table_name), qn(old_field.column),
+                     qn(new_field.column))]
+
+        if old_field.db_index and not old_field.unique:
+            model = FakeModel(table_name, field_list)
+            output.extend(self.drop_index_if_exists(model, old_field))
+            output.extend(self.create_index(model, new_field))
+
+        return output
+
     def add_column(self, model, f, initial):
         output = []
         table_name = model._meta.db_table
@@ -173,6 +409,12 @@ class EvolutionOperations(BaseEvolutionOperations):
         new_fields = list(original_fields)
         new_fields.append(f)
 
+        if self.copy_batch_size:
+            return self.copy_table(table_name, new_fields,
+                                   original_fields + [None],
+                                   {f.name: (initial, False)},
+                                   create_index=False)
+
         output.extend(self.create_temp_table(new_fields))
         output.extend(self.copy_to_temp_table(table_name, original_fields))
         output.extend(self.insert_to_temp_table(f, initial))
@@ -198,6 +440,11 @@ class EvolutionOperations(BaseEvolutionOperations):
         setattr(opts.get_field(field_name), attr_name, new_attr_value)
         fields = [f for f in opts.local_fields if f.db_type() is not None]
 
+        if self.copy_batch_size:
+            return self.copy_table(table_name, fields, fields,
+                                   {field_name: (initial, False)},
+                                   create_index=False)
+
         output.extend(self.create_temp_table(fields))
         output.extend(self.copy_to_temp_table(table_name, fields))
         output.extend(self.insert_to_temp_table(opts.get_field(field_name), initial))
@@ -206,3 +453,52 @@ class EvolutionOperations(BaseEvolutionOperations):
         output.extend(self.copy_from_temp_table(table_name, fields))
         output.extend(self.delete_table(TEMP_TABLE_NAME))
         return output
+
+    def rebuild_table(self, old_model, new_model, field_sources, initials):
+        """
+        Rebuilds a table in a single copy pass, going from the fields in
+        old_model to those in new_model.
+
+        field_sources maps each field name in new_model to the name of the
+        field in old_model that its data is copied from, or None for new
+        fields. initials maps field names to a tuple of (initial value,
+        only_null), used to populate the field after the copy.
+        """
+        output = []
+        table_name = old_model._meta.db_table
+        old_fields = dict([(f.name, f) for f in old_model._meta.local_fields])
+        new_fields = [f for f in new_model._meta.local_fields
+                      if f.db_type() is not None]
+
+        copied_fields = []
+        source_fields = []
+
+        for f in new_fields:
+            source_name = field_sources.get(f.name)
+
+            if source_name is not None:
+                copied_fields.append(f)
+                source_fields.append(old_fields[source_name])
+
+        if self.copy_batch_size:
+            sources = [old_fields.get(field_sources.get(f.name))
+                       for f in new_fields]
+            return self.copy_table(table_name, new_fields, sources, initials)
+
+        output.extend(self.create_temp_table(new_fields))
+        output.extend(self.copy_to_temp_table(table_name, source_fields,
+                                              copied_fields))
+
+        for f in new_fields:
+            if f.name in initials:
+                initial, only_null = initials[f.name]
+                output.extend(self.insert_to_temp_table(f, initial,
+                                                        only_null))
+
+        output.extend(self.delete_table(table_name))
+        output.extend(self.create_table(new_model._meta.db_table, new_fields))
+        output.extend(self.copy_from_temp_table(new_model._meta.db_table,
+                                                new_fields))
+        output.extend(self.delete_table(TEMP_TABLE_NAME))
+
+        return output
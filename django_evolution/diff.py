@@ -1,5 +1,7 @@
 from django.db import models
 from django.db.models.fields.related import *
+from django.utils import simplejson
+from django.utils.datastructures import SortedDict
 
 from django_evolution import EvolutionException
 from django_evolution.mutations import DeleteField, AddField, DeleteModel, ChangeField
@@ -45,11 +47,218 @@ def get_initial_value(app_label, model_name, field_name):
     return NullFieldInitialCallback(app_label, model_name, field_name)
 
 
+class Change(object):
+    """
+    A single difference between two project signatures.
+
+    Changes are flat records, identified by their type, which can be
+    converted to dictionaries and serialized as JSON.
+    """
+    type = None
+
+    def __init__(self, app_label, model_name=None, field_name=None):
+        self.app_label = app_label
+        self.model_name = model_name
+        self.field_name = field_name
+
+    def to_dict(self):
+        "Returns the change as a dictionary that can be encoded as JSON."
+        data = SortedDict([
+            ('type', self.type),
+            ('app_label', self.app_label),
+        ])
+
+        if self.model_name is not None:
+            data['model_name'] = self.model_name
+
+        if self.field_name is not None:
+            data['field_name'] = self.field_name
+
+        return data
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__,
+                            '.'.join([name for name in (self.app_label,
+                                                        self.model_name,
+                                                        self.field_name)
+                                      if name is not None]))
+
+
+class AppDeleted(Change):
+    "An application that has been deleted, along with its models."
+    type = 'app_deleted'
+
+    def __init__(self, app_label, model_names):
+        super(AppDeleted, self).__init__(app_label)
+        self.model_names = model_names
+
+    def to_dict(self):
+        data = super(AppDeleted, self).to_dict()
+        data['model_names'] = self.model_names
+
+        return data
+
+
+class ModelDeleted(Change):
+    "A model that has been deleted."
+    type = 'model_deleted'
+
+
+class FieldAdded(Change):
+    "A field that has been added to a model."
+    type = 'field_added'
+
+
+class FieldDeleted(Change):
+    "A field that has been deleted from a model."
+    type = 'field_deleted'
+
+
+class FieldChanged(Change):
+    "A field whose properties have changed."
+    type = 'field_changed'
+
+    def __init__(self, app_label, model_name, field_name, properties):
+        super(FieldChanged, self).__init__(app_label, model_name, field_name)
+        self.properties = properties
+
+    def to_dict(self):
+        data = super(FieldChanged, self).to_dict()
+        data['properties'] = self.properties
+
+        return data
+
+
+def diff_signatures(original, current, original_hashes=None,
+                    current_hashes=None, app_labels=None):
+    """
+    Returns the list of Changes needed to go from the original project
+    signature to the current one.
+
+    Applications, models and fields whose signatures are equal are skipped
+    without comparing their contents. If hashes for both signatures are
+    provided (as returned by create_project_sig_hashes), applications and
+    models whose hashes match are skipped without comparing them at all.
+
+    If app_labels is provided, only those applications are compared, so
+    the signatures of other applications in a lazily-created project
+    signature are never created. Deleted applications are still found.
+    """
+    if original.get('__version__', 1) != 1:
+        raise EvolutionException(
+            "Unknown version identifier in original signature: %s",
+            original['__version__'])
+
+    if current.get('__version__', 1) != 1:
+        raise EvolutionException(
+            "Unknown version identifier in target signature: %s",
+            current['__version__'])
+
+    def hashes_match(*keys):
+        if not original_hashes or not current_hashes:
+            return False
+
+        original_hash = original_hashes
+        current_hash = current_hashes
+
+        for key in keys:
+            original_hash = original_hash.get(key) or {}
+            current_hash = current_hash.get(key) or {}
+
+        return (isinstance(original_hash, basestring) and
+                original_hash == current_hash)
+
+    changes = []
+
+    if hashes_match('project'):
+        return changes
+
+    for app_name, old_app_sig in original.items():
+        if app_name == '__version__':
+            # Ignore the __version__ tag
+            continue
+
+        if app_name not in current:
+            changes.append(AppDeleted(app_name, old_app_sig.keys()))
+            continue
+
+        if app_labels is not None and app_name not in app_labels:
+            continue
+
+        if hashes_match('apps', app_name):
+            continue
+
+        new_app_sig = current[app_name]
+
+        if old_app_sig == new_app_sig:
+            continue
+
+        for model_name, old_model_sig in old_app_sig.items():
+            new_model_sig = new_app_sig.get(model_name, None)
+
+            if new_model_sig is None:
+                changes.append(ModelDeleted(app_name, model_name))
+                continue
+
+            if (hashes_match('models', app_name, model_name) or
+                old_model_sig['fields'] == new_model_sig['fields']):
+                continue
+
+            old_fields = old_model_sig['fields']
+            new_fields = new_model_sig['fields']
+
+            # Look for deleted or modified fields
+            for field_name, old_field_data in old_fields.items():
+                new_field_data = new_fields.get(field_name, None)
+
+                if new_field_data is None:
+                    changes.append(FieldDeleted(app_name, model_name,
+                                                field_name))
+                    continue
+
+                if old_field_data == new_field_data:
+                    continue
+
+                properties = set(old_field_data.keys())
+                properties.update(new_field_data.keys())
+                changed_properties = []
+
+                for prop in properties:
+                    old_value = old_field_data.get(prop,
+                        ATTRIBUTE_DEFAULTS.get(prop, None))
+                    new_value = new_field_data.get(prop,
+                        ATTRIBUTE_DEFAULTS.get(prop, None))
+
+                    if old_value != new_value:
+                        if prop == 'field_type':
+                            old_type = Diff.get_internal_type(old_value)
+
+                            if (old_type is not None and
+                                old_type == Diff.get_internal_type(new_value)):
+                                continue
+
+                        changed_properties.append(prop)
+
+                if changed_properties:
+                    changes.append(FieldChanged(app_name, model_name,
+                                                field_name,
+                                                changed_properties))
+
+            # Look for added fields
+            for field_name in new_fields.keys():
+                if field_name not in old_fields:
+                    changes.append(FieldAdded(app_name, model_name,
+                                              field_name))
+
+    return changes
+
+
 class Diff(object):
     """
     A diff between two model signatures.
 
-    The resulting diff is contained in two attributes:
+    The differences are listed in self.changes, as returned by
+    diff_signatures. They are also contained in two attributes:
 
     self.changed = {
         app_label: {
@@ -67,99 +276,93 @@ class Diff(object):
     self.deleted = {
         app_label: [ list of models in deleted app ]
     }
+
+    If hashes for both signatures are provided (as returned by
+    create_project_sig_hashes), only the applications and models whose
+    hashes differ are compared.
+
+    If app_labels is provided, only those applications are compared, so
+    the signatures of other applications in a lazily-created project
+    signature are never created. Deleted applications are still found.
     """
-    def __init__(self, original, current):
+    # The internal types of field classes, as returned by get_internal_type.
+    internal_types = {}
+
+    def __init__(self, original, current, original_hashes=None,
+                 current_hashes=None, app_labels=None):
         self.original_sig = original
         self.current_sig = current
+        self.original_hashes = original_hashes
+        self.current_hashes = current_hashes
 
+        self.changes = diff_signatures(original, current, original_hashes,
+                                       current_hashes, app_labels)
         self.changed = {}
         self.deleted = {}
 
-        if self.original_sig.get('__version__', 1) != 1:
-            raise EvolutionException(
-                "Unknown version identifier in original signature: %s",
-                self.original_sig['__version__'])
+        for change in self.changes:
+            if isinstance(change, AppDeleted):
+                self.deleted[change.app_label] = change.model_names
+                continue
 
-        if self.current_sig.get('__version__', 1) != 1:
-            raise EvolutionException(
-                "Unknown version identifier in target signature: %s",
-                self.current_sig['__version__'])
+            app_changes = self.changed.setdefault(change.app_label, {})
 
-        for app_name, old_app_sig in original.items():
-            if app_name == '__version__':
-                # Ignore the __version__ tag
+            if isinstance(change, ModelDeleted):
+                app_changes.setdefault('deleted',
+                                       []).append(change.model_name)
                 continue
 
-            new_app_sig = self.current_sig.get(app_name, None)
+            model_changes = app_changes.setdefault(
+                'changed', {}).setdefault(change.model_name, {})
+
+            if isinstance(change, FieldAdded):
+                model_changes.setdefault('added',
+                                         []).append(change.field_name)
+            elif isinstance(change, FieldDeleted):
+                model_changes.setdefault('deleted',
+                                         []).append(change.field_name)
+            elif isinstance(change, FieldChanged):
+                model_changes.setdefault('changed', {})[change.field_name] = \
+                    change.properties
+
+    @classmethod
+    def register_internal_type(cls, field_type, internal_type):
+        """
+        Registers the internal type of a field class.
 
-            if new_app_sig is None:
-                # App has been deleted
-                self.deleted[app_name] = old_app_sig.keys()
-                continue
+        This can be used for custom fields that are expensive to construct
+        or that can't be constructed without arguments, so that changes
+        between them and fields of the same internal type aren't reported.
+        """
+        cls.internal_types[field_type] = internal_type
+
+    @classmethod
+    def get_internal_type(cls, field_type):
+        """
+        Returns the internal type of a field class, or None if it's unknown.
 
-            for model_name, old_model_sig in old_app_sig.items():
-                new_model_sig = new_app_sig.get(model_name, None)
+        Unregistered field classes are instantiated without arguments the
+        first time they're looked up. If that fails, the internal type is
+        recorded as unknown and the class isn't instantiated again.
+        """
+        try:
+            return cls.internal_types[field_type]
+        except KeyError:
+            pass
 
-                if new_model_sig is None:
-                    # Model has been deleted
-                    self.changed.setdefault(app_name,
-                        {}).setdefault('deleted',
-                        []).append(model_name)
-                    continue
+        try:
+            internal_type = field_type().get_internal_type()
+        except Exception:
+            internal_type = None
+
+        cls.internal_types[field_type] = internal_type
+
+        return internal_type
 
-                old_fields = old_model_sig['fields']
-                new_fields = new_model_sig['fields']
-
-                # Look for deleted or modified fields
-                for field_name, old_field_data in old_fields.items():
-                    new_field_data = new_fields.get(field_name, None)
-
-                    if new_field_data is None:
-                        # Field has been deleted
-                        self.changed.setdefault(app_name,
-                            {}).setdefault('changed',
-                            {}).setdefault(model_name,
-                            {}).setdefault('deleted',
-                            []).append(field_name)
-                        continue
-
-                    properties = set(old_field_data.keys())
-                    properties.update(new_field_data.keys())
-
-                    for prop in properties:
-                        old_value = old_field_data.get(prop,
-                            ATTRIBUTE_DEFAULTS.get(prop, None))
-                        new_value = new_field_data.get(prop,
-                            ATTRIBUTE_DEFAULTS.get(prop, None))
-
-                        if old_value != new_value:
-                            try:
-                                if (prop == 'field_type' and
-                                    (old_value().get_internal_type() ==
-                                     new_value().get_internal_type())):
-                                    continue
-                            except TypeError:
-                                pass
-
-                            # Field has been changed
-                            self.changed.setdefault(app_name,
-                                {}).setdefault('changed',
-                                {}).setdefault(model_name,
-                                {}).setdefault('changed',
-                                {}).setdefault(field_name,[]).append(prop)
-
-                # Look for added fields
-                new_fields = new_model_sig['fields']
-
-                for field_name, new_field_data in new_fields.items():
-                    old_field_data = old_fields.get(field_name, None)
-
-                    if old_field_data is None:
-                        self.changed.setdefault(app_name,
-                            {}).setdefault('changed',
-                            {}).setdefault(model_name,
-                            {}).setdefault('added',
-                            []).append(field_name)
+    def to_json(self, indent=None):
+        "Returns the list of changes as JSON."
+        return simplejson.dumps([change.to_dict() for change in self.changes],
+                                indent=indent)
 
     def is_empty(self, ignore_apps=True):
         """Is this an empty diff? i.e., is the source and target the same?
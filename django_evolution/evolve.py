@@ -1,9 +1,13 @@
 import os
 
+from django.db import transaction
+
 from django_evolution import EvolutionException, is_multi_db
 from django_evolution.builtin_evolutions import BUILTIN_SEQUENCES
-from django_evolution.models import Evolution
+from django_evolution.db import get_evolver
+from django_evolution.models import Evolution, Version
 from django_evolution.mutations import SQLMutation
+from django_evolution.utils import execute_sql, get_sql_hash
 
 
 def get_evolution_sequence(app):
@@ -20,19 +24,134 @@ def get_evolution_sequence(app):
         return []
 
 
-def get_unapplied_evolutions(app, database):
-    "Obtain the list of unapplied evolutions for an application"
+def get_applied_evolutions(database, app_labels=None):
+    """
+    Obtain the labels of the applied evolutions for every application (or
+    only those in app_labels), in a single query.
+
+    This returns a dictionary mapping each application label to a set of
+    evolution labels.
+    """
+    evolutions = Evolution.objects.all()
+
+    if app_labels is not None:
+        evolutions = evolutions.filter(app_label__in=app_labels)
+
+    if is_multi_db():
+        evolutions = evolutions.using(database)
+
+    applied = {}
+
+    for app_label, label in evolutions.values_list('app_label', 'label'):
+        applied.setdefault(app_label, set()).add(label)
+
+    return applied
+
+
+def get_unapplied_evolutions(app, database, applied=None):
+    """
+    Obtain the list of unapplied evolutions for an application
+
+    If the applied evolutions have already been loaded through
+    get_applied_evolutions, they can be passed as applied to avoid another
+    query.
+    """
     sequence = get_evolution_sequence(app)
     app_label = app.__name__.split('.')[-2]
 
-    evolutions = Evolution.objects.filter(app_label=app_label)
+    if applied is None:
+        applied = get_applied_evolutions(database, [app_label])
+
+    app_applied = applied.get(app_label, set())
+
+    return [seq for seq in sequence if seq not in app_applied]
+
+
+def save_evolutions(evolutions, database):
+    """
+    Saves a list of new Evolution instances.
+
+    The rows are written with multi-row INSERT statements where the
+    database supports them, rather than one query per evolution. The
+    instances themselves are not updated with their new IDs.
+    """
+    if not evolutions:
+        return
+
+    evolver = get_evolver(database)
+    opts = Evolution._meta
+    columns = [opts.get_field(field_name).column
+               for field_name in ('version', 'app_label', 'label')]
+    rows = [(evolution.version_id, evolution.app_label, evolution.label)
+            for evolution in evolutions]
+
+    execute_sql(evolver.connection.cursor(),
+                evolver.insert_rows(opts.db_table, columns, rows))
 
     if is_multi_db():
-        evolutions = evolutions.using(database)
+        transaction.commit_unless_managed(using=database)
+    else:
+        transaction.commit_unless_managed()
+
+
+def execute_evolution_sql(cursor, sql, database, latest_version, commit,
+                          progress=None, report=None, sources=None):
+    """
+    Executes the SQL for an evolution of the database, which was last
+    evolved to the signature stored in latest_version.
+
+    Operations such as backfills commit the transaction as they go, by
+    calling commit. Along with the first of those commits, a Version is
+    saved with the signature of latest_version and a checkpoint recording
+    the number of statements that have been committed, which is updated
+    as the evolution goes on. If the evolution is interrupted, executing
+    the same SQL again skips those statements, rather than repeating
+    schema changes that were already made, and backfills resume with the
+    rows that haven't been updated yet.
+
+    Returns the number of statements skipped. An EvolutionException is
+    raised if an interrupted evolution with different SQL is found.
+    """
+    sql_hash = get_sql_hash(sql)
+    checkpoint = latest_version.get_checkpoint()
+    skipped = 0
+
+    if checkpoint is not None:
+        if checkpoint['sql'] != sql_hash:
+            raise EvolutionException(
+                'An earlier evolution of this database was interrupted '
+                'after committing %d statement(s), and the evolution has '
+                'changed since. The rest of the earlier evolution must be '
+                'applied by hand.' % checkpoint['completed'])
+
+        skipped = checkpoint['completed']
+
+    if sources:
+        sources = sources[skipped:]
+
+    checkpoint_version = Version()
+
+    def commit_checkpoint(completed):
+        checkpoint = {
+            'sql': sql_hash,
+            'completed': skipped + completed,
+        }
+
+        if checkpoint_version.get_checkpoint() != checkpoint:
+            checkpoint_version.set_signature(latest_version.get_signature(),
+                                             latest_version, checkpoint)
+
+            if is_multi_db():
+                checkpoint_version.save(using=database)
+            else:
+                checkpoint_version.save()
+
+        commit()
 
-    applied = [evo.label for evo in evolutions]
+    execute_sql(cursor, sql[skipped:], commit_checkpoint, progress, report,
+                sources)
 
-    return [seq for seq in sequence if seq not in applied]
+    return skipped
 
 
 def get_mutations(app, evolution_labels, database):
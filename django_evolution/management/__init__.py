@@ -1,18 +1,66 @@
-try:
-    import cPickle as pickle
-except ImportError:
-    import pickle as pickle
-
 from django.core.management.color import color_style
 from django.db.models import signals, get_apps
 
 from django_evolution import is_multi_db, models as django_evolution
-from django_evolution.evolve import get_evolution_sequence, get_unapplied_evolutions
-from django_evolution.signature import create_project_sig
+from django_evolution.evolve import get_applied_evolutions, \
+                                    get_evolution_sequence, \
+                                    get_unapplied_evolutions, \
+                                    save_evolutions
+from django_evolution.signature import create_project_sig, \
+                                       create_project_sig_hashes
 from django_evolution.diff import Diff
 
 style = color_style()
 
+# The project state for the syncdb run being handled, per database.
+_syncdb_states = {}
+
+
+class SyncdbState(object):
+    """
+    The project signature, latest version and applied evolutions for a
+    database, computed once per syncdb run.
+
+    syncdb sends post_syncdb once for every application, passing the same
+    created_models set each time, so that set is used to tell runs apart.
+    """
+    def __init__(self, created_models, db):
+        self.created_models = created_models
+        self.proj_sig = create_project_sig(db)
+
+        self.db = db
+
+        versions = django_evolution.Version.objects
+
+        if is_multi_db():
+            versions = versions.using(db)
+
+        try:
+            self.latest_version = versions.latest('when')
+        except django_evolution.Version.DoesNotExist:
+            self.latest_version = None
+
+        self.applied = get_applied_evolutions(db)
+
+    def get_unapplied_evolutions(self, app):
+        "Obtain the list of unapplied evolutions for an application"
+        return get_unapplied_evolutions(app, self.db, self.applied)
+
+
+def get_syncdb_state(created_models, db):
+    """
+    Returns the SyncdbState for the syncdb run on a database, computing it
+    if this is the first application of the run.
+    """
+    state = _syncdb_states.get(db, None)
+
+    if state is None or state.created_models is not created_models:
+        state = SyncdbState(created_models, db)
+        _syncdb_states[db] = state
+
+    return state
+
+
 def evolution(app, created_models, verbosity=1, **kwargs):
     """
     A hook into syncdb's post_syncdb signal, that is used to notify the user
@@ -24,27 +72,25 @@ def evolution(app, created_models, verbosity=1, **kwargs):
         default_db = DEFAULT_DB_ALIAS
 
     db = kwargs.get('db', default_db)
-    proj_sig = create_project_sig(db)
-    signature = pickle.dumps(proj_sig)
+    state = get_syncdb_state(created_models, db)
+    proj_sig = state.proj_sig
+    latest_version = state.latest_version
 
     using_args = {}
 
     if is_multi_db():
         using_args['using'] = db
 
-    try:
-        if is_multi_db():
-            latest_version = \
-                django_evolution.Version.objects.using(db).latest('when')
-        else:
-            latest_version = django_evolution.Version.objects.latest('when')
-    except django_evolution.Version.DoesNotExist:
+    if latest_version is None:
         # We need to create a baseline version.
         if verbosity > 0:
             print "Installing baseline version"
 
-        latest_version = django_evolution.Version(signature=signature)
+        latest_version = django_evolution.Version()
+        latest_version.set_signature(proj_sig)
         latest_version.save(**using_args)
+        state.latest_version = latest_version
+        evolutions = []
 
         for a in get_apps():
             app_label = a.__name__.split('.')[-2]
@@ -56,12 +102,15 @@ def evolution(app, created_models, verbosity=1, **kwargs):
                           ', '.join(sequence)
 
             for evo_label in sequence:
-                evolution = django_evolution.Evolution(app_label=app_label,
-                                                       label=evo_label,
-                                                       version=latest_version)
-                evolution.save(**using_args)
+                evolutions.append(
+                    django_evolution.Evolution(app_label=app_label,
+                                               label=evo_label,
+                                               version=latest_version))
+                state.applied.setdefault(app_label, set()).add(evo_label)
 
-    unapplied = get_unapplied_evolutions(app, db)
+        save_evolutions(evolutions, db)
+
+    unapplied = state.get_unapplied_evolutions(app)
 
     if unapplied:
         print style.NOTICE('There are unapplied evolutions for %s.'
@@ -70,7 +119,15 @@ def evolution(app, created_models, verbosity=1, **kwargs):
     # Evolutions are checked over the entire project, so we only need to check
     # once. We do this check when Django Evolutions itself is synchronized.
     if app == django_evolution:
-        old_proj_sig = pickle.loads(str(latest_version.signature))
+        proj_sig_hashes = create_project_sig_hashes(proj_sig)
+        old_proj_sig_hashes = latest_version.get_signature_hashes()
+
+        if (proj_sig_hashes['project'] and
+            proj_sig_hashes['project'] == old_proj_sig_hashes['project']):
+            # Nothing has changed since the stored signature.
+            return
+
+        old_proj_sig = latest_version.get_signature()
 
         # If any models have been added, a baseline must be set
         # for those new models
@@ -102,9 +159,15 @@ def evolution(app, created_models, verbosity=1, **kwargs):
             if verbosity > 0:
                 print "Adding baseline version for new models"
 
-            latest_version = \
-                django_evolution.Version(signature=pickle.dumps(old_proj_sig))
+            # An interrupted evolution's checkpoint is kept, so that the
+            # evolution can still be resumed.
+            base_version = latest_version
+            latest_version = django_evolution.Version()
+            latest_version.set_signature(old_proj_sig, base_version,
+                                         base_version.get_checkpoint())
             latest_version.save(**using_args)
+            state.latest_version = latest_version
+            old_proj_sig_hashes = latest_version.get_signature_hashes()
 
         # TODO: Model introspection step goes here.
         # # If the current database state doesn't match the last
@@ -117,14 +180,15 @@ def evolution(app, created_models, verbosity=1, **kwargs):
         #     nudge.save()
         #     latest_version = nudge
 
-        diff = Diff(old_proj_sig, proj_sig)
+        diff = Diff(old_proj_sig, proj_sig, old_proj_sig_hashes,
+                    proj_sig_hashes)
 
         if not diff.is_empty():
             print style.NOTICE(
                 'Project signature has changed - an evolution is required')
 
             if verbosity > 1:
-                old_proj_sig = pickle.loads(str(latest_version.signature))
+                old_proj_sig = latest_version.get_signature()
                 print diff
 
 signals.post_syncdb.connect(evolution)
@@ -1,23 +1,34 @@
+from multiprocessing.pool import ThreadPool
 from optparse import make_option
+from StringIO import StringIO
 import sys
-try:
-    import cPickle as pickle
-except ImportError:
-    import pickle as pickle
+import time
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.core.management.base import BaseCommand, CommandError
 from django.db.models import get_apps, get_app
 from django.db import connection, transaction
+from django.utils import simplejson
+from django.utils.datastructures import SortedDict
 
-from django_evolution import CannotSimulate, EvolutionException, is_multi_db
+from django_evolution import EvolutionException, is_multi_db
+from django_evolution.db.common import SQLOperation
 from django_evolution.diff import Diff
-from django_evolution.evolve import get_unapplied_evolutions, get_mutations
+from django_evolution.evolve import execute_evolution_sql, \
+                                    get_applied_evolutions, \
+                                    get_unapplied_evolutions, get_mutations, \
+                                    save_evolutions
 from django_evolution.models import Version, Evolution
-from django_evolution.mutations import DeleteApplication
-from django_evolution.signature import create_project_sig
-from django_evolution.utils import write_sql, execute_sql
+from django_evolution.mutations import DeleteApplication, MockModelCache, \
+                                       RoutingCache, set_mock_model_cache, \
+                                       set_routing_cache
+from django_evolution.mutators import AppMutator
+from django_evolution.optimizer import optimize_mutations
+from django_evolution.signature import create_project_sig, \
+                                       create_project_sig_hashes, \
+                                       create_project_sigs
+from django_evolution.utils import ExecutionReport, write_sql
 
 class Command(BaseCommand):
     option_list = BaseCommand.option_list + (
@@ -41,6 +52,14 @@ class Command(BaseCommand):
         make_option(
             '--database', action='store', dest='database',
             help='Nominates a database to synchronize.'),
+        make_option(
+            '--all-databases', action='store_true', dest='all_databases',
+            default=False,
+            help='Evolve every database at once, each in its own thread.'),
+        make_option(
+            '--report', action='store', dest='report_file',
+            help='Write a JSON report of the time taken and rows affected '
+                 'by each statement executed to the given file.'),
     )
 
     if '--verbosity' not in [opt.get_opt_string()
@@ -60,18 +79,206 @@ class Command(BaseCommand):
         self.evolve(*app_labels, **options)
 
     def evolve(self, *app_labels, **options):
+        """
+        Evolves the project.
+
+        When executing, each statement is recorded in an ExecutionReport.
+        If a statement_callback option is provided, it's called with the
+        record for each statement as soon as it has executed. When evolving
+        all databases, it's called from the thread evolving the database.
+        """
+        if options.get('all_databases'):
+            self._evolve_all_databases(*app_labels, **options)
+        else:
+            execution_report = ExecutionReport(
+                options.get('database'), options.get('statement_callback'))
+
+            try:
+                self._evolve_database(sys.stdout, app_labels, options,
+                                      execution_report=execution_report)
+            finally:
+                self._write_report(options, [execution_report])
+
+    def _write_report(self, options, execution_reports):
+        "Writes the ExecutionReports to the report file, if requested."
+        if options.get('report_file'):
+            f = open(options['report_file'], 'w')
+
+            try:
+                f.write(simplejson.dumps(
+                    [execution_report.get_data()
+                     for execution_report in execution_reports],
+                    indent=2))
+            finally:
+                f.close()
+
+    def _evolve_all_databases(self, *app_labels, **options):
+        """
+        Evolves every database in settings.DATABASES.
+
+        The project signature is built once for each distinct way the router
+        splits models between databases. Each database is then evolved in
+        its own thread, using its own connection and transaction. The output
+        for each database is shown once it has finished, followed by the
+        result and time taken for each database.
+        """
+        if not is_multi_db():
+            raise CommandError('--all-databases requires a version of '
+                               'Django with multiple database support.')
+
+        if options.get('database'):
+            raise CommandError('Cannot specify a database when evolving '
+                               'all databases.')
+
+        verbosity = int(options['verbosity'])
+        databases = sorted(settings.DATABASES.keys())
+
+        if options['execute'] and options['interactive']:
+            confirm = raw_input("""
+You have requested a database evolution. This will alter tables
+and data currently in the %s databases, and may result in
+IRREVERSABLE DATA LOSS. Evolutions should be *thoroughly* reviewed
+prior to execution.
+
+Are you sure you want to execute the evolutions?
+
+Type 'yes' to continue, or 'no' to cancel: """
+                % ', '.join([repr(database) for database in databases]))
+
+            if confirm.lower() != 'yes':
+                print self.style.ERROR('Evolution cancelled.')
+                return
+
+        proj_sigs = create_project_sigs(databases)
+        proj_sig_hashes = {}
+
+        for proj_sig in proj_sigs.values():
+            if id(proj_sig) not in proj_sig_hashes:
+                proj_sig_hashes[id(proj_sig)] = \
+                    create_project_sig_hashes(proj_sig)
+
+        def evolve_database(database):
+            db_options = dict(options, database=database, interactive=False)
+            proj_sig = proj_sigs[database]
+            execution_report = ExecutionReport(
+                database, options.get('statement_callback'))
+            out = StringIO()
+            start = time.time()
+
+            try:
+                evolved = self._evolve_database(
+                    out, app_labels, db_options, proj_sig,
+                    proj_sig_hashes[id(proj_sig)], execution_report)
+                error = None
+            except CommandError, e:
+                evolved = False
+                error = str(e)
+            except Exception, e:
+                evolved = False
+                error = '%s: %s' % (e.__class__.__name__, e)
+
+            return SortedDict([
+                ('database', database),
+                ('evolved', evolved),
+                ('error', error),
+                ('time', time.time() - start),
+                ('output', out.getvalue()),
+                ('execution_report', execution_report),
+            ])
+
+        pool = ThreadPool(len(databases))
+
+        try:
+            results = pool.map(evolve_database, databases)
+        finally:
+            pool.close()
+            pool.join()
+
+        self._write_report(options,
+                           [result['execution_report'] for result in results])
+
+        failed = []
+
+        for result in results:
+            if result['output'] or verbosity > 0:
+                print self.style.NOTICE('#----- Database %s'
+                                        % result['database'])
+                sys.stdout.write(result['output'])
+
+            if result['error']:
+                failed.append(result['database'])
+                print self.style.ERROR(result['error'])
+
+        if verbosity > 0:
+            print
+            print 'Results:'
+
+            for result in results:
+                if result['error']:
+                    status = 'failed'
+                elif not result['evolved']:
+                    status = 'no evolution required'
+                elif options['execute']:
+                    status = 'evolved'
+                else:
+                    status = 'evolution required'
+
+                print '    %s: %s (%.2f seconds)' % (result['database'],
+                                                    status, result['time'])
+
+        if failed:
+            raise CommandError('Evolution failed for the %s database(s).'
+                               % ', '.join([repr(database)
+                                            for database in failed]))
+
+    def _evolve_database(self, out, app_labels, options,
+                         current_proj_sig=None,
+                         current_proj_sig_hashes=None,
+                         execution_report=None):
+        """
+        Evolves a single database, writing any output to out.
+
+        Returns whether the database required an evolution.
+        """
+        verbosity = int(options['verbosity'])
+
+        # MockModels and routing decisions are cached for the duration of
+        # the evolution, as most mutations need them for the same models.
+        mock_model_cache = MockModelCache()
+        set_mock_model_cache(mock_model_cache)
+        routing_cache = RoutingCache()
+        set_routing_cache(routing_cache)
+
+        try:
+            return self._evolve(out, app_labels, options, current_proj_sig,
+                                current_proj_sig_hashes, execution_report)
+        finally:
+            set_mock_model_cache(None)
+            set_routing_cache(None)
+
+            if verbosity > 1:
+                print >>out, 'Mock model cache: %d hits, %d misses' % \
+                      (mock_model_cache.hits, mock_model_cache.misses)
+                print >>out, 'Routing cache: %d hits, %d misses' % \
+                      (routing_cache.hits, routing_cache.misses)
+
+    def _evolve(self, out, app_labels, options, current_proj_sig=None,
+                current_proj_sig_hashes=None, execution_report=None):
         verbosity = int(options['verbosity'])
         interactive = options['interactive']
         execute = options['execute']
         compile_sql = options['compile_sql']
         hint = options['hint']
         purge = options['purge']
-        database = options['database']
+        database = options.get('database')
 
         if not database and is_multi_db():
             from django.db.utils import DEFAULT_DB_ALIAS
             database = DEFAULT_DB_ALIAS
 
+        if execution_report is not None:
+            execution_report.database = database
+
         using_args = {}
 
         if is_multi_db():
@@ -94,10 +301,24 @@ class Command(BaseCommand):
         evolution_required = False
         simulated = True
         sql = []
+        sql_sources = []
         new_evolutions = []
 
-        current_proj_sig = create_project_sig(database)
-        current_signature = pickle.dumps(current_proj_sig)
+        # When evolving specific applications, only the signatures of those
+        # applications are created and compared. Otherwise, hashes of the
+        # whole project let unchanged applications be skipped.
+        if app_labels:
+            diff_app_labels = [app.__name__.split('.')[-2]
+                               for app in app_list]
+        else:
+            diff_app_labels = None
+
+        if current_proj_sig is None:
+            current_proj_sig = create_project_sig(database)
+
+            if not app_labels:
+                current_proj_sig_hashes = \
+                    create_project_sig_hashes(current_proj_sig)
 
         try:
             if is_multi_db():
@@ -105,12 +326,22 @@ class Command(BaseCommand):
             else:
                 latest_version = Version.objects.latest('when')
 
-            database_sig = pickle.loads(str(latest_version.signature))
-            diff = Diff(database_sig, current_proj_sig)
-        except Evolution.DoesNotExist:
+            database_sig = latest_version.get_signature()
+
+            if app_labels:
+                diff = Diff(database_sig, current_proj_sig,
+                            app_labels=diff_app_labels)
+            else:
+                diff = Diff(database_sig, current_proj_sig,
+                            latest_version.get_signature_hashes(),
+                            current_proj_sig_hashes)
+        except Version.DoesNotExist:
             raise CommandError("Can't evolve yet. Need to set an "
                                "evolution baseline.")
 
+        if not hint:
+            applied = get_applied_evolutions(database)
+
         try:
             for app in app_list:
                 app_label = app.__name__.split('.')[-2]
@@ -119,7 +350,8 @@ class Command(BaseCommand):
                     hinted_evolution = diff.evolution()
                     temp_mutations = hinted_evolution.get(app_label, [])
                 else:
-                    evolutions = get_unapplied_evolutions(app, database)
+                    evolutions = get_unapplied_evolutions(app, database,
+                                                          applied)
                     temp_mutations = get_mutations(app, evolutions, database)
 
                 mutations = [
@@ -128,23 +360,30 @@ class Command(BaseCommand):
                                            database)
                 ]
 
+                # Remove any mutations that cancel each other out, and merge
+                # those that can be applied as one.
+                mutations = optimize_mutations(app_label, mutations,
+                                               database_sig, database)
+
                 if mutations:
                     app_sql = ['-- Evolve application %s' % app_label]
                     evolution_required = True
 
-                    for mutation in mutations:
-                        # Only compile SQL if we want to show it
-                        if compile_sql or execute:
-                            app_sql.extend(
-                                mutation.mutate(app_label, database_sig,
-                                                database))
-
-                        # Now run the simulation, which will modify the
-                        # signatures
-                        try:
-                            mutation.simulate(app_label, database_sig, database)
-                        except CannotSimulate:
-                            simulated = False
+                    # Only compile SQL if we want to show it. Running the
+                    # mutations simulates them, which modifies the
+                    # signatures.
+                    app_mutator = AppMutator(app_label, database_sig,
+                                             database)
+                    app_sql.extend(
+                        app_mutator.run_mutations(mutations,
+                                                  compile_sql or execute))
+                    sql_sources.append((app_label, []))
+                    sql_sources.extend([(app_label, statement_mutations)
+                                        for statement_mutations
+                                        in app_mutator.sources])
+
+                    if not app_mutator.simulated:
+                        simulated = False
 
                     new_evolutions.extend(
                         Evolution(app_label=app_label, label=label)
@@ -152,22 +391,24 @@ class Command(BaseCommand):
 
                     if not execute:
                         if compile_sql:
-                            write_sql(app_sql, database)
+                            write_sql(app_sql, database, out)
                         else:
-                            print '#----- Evolution for %s' % app_label
-                            print 'from django_evolution.mutations import *'
-                            print 'from django.db import models'
-                            print
-                            print 'MUTATIONS = ['
-                            print '   ',
-                            print ',\n    '.join(unicode(m) for m in mutations)
-                            print ']'
-                            print '#----------------------'
+                            print >>out, '#----- Evolution for %s' % app_label
+                            print >>out, \
+                                'from django_evolution.mutations import *'
+                            print >>out, 'from django.db import models'
+                            print >>out
+                            print >>out, 'MUTATIONS = ['
+                            print >>out, '   ',
+                            print >>out, ',\n    '.join(unicode(m)
+                                                         for m in mutations)
+                            print >>out, ']'
+                            print >>out, '#----------------------'
 
                     sql.extend(app_sql)
                 else:
                     if verbosity > 1:
-                        print 'Application %s is up to date' % app_label
+                        print >>out, 'Application %s is up to date' % app_label
 
             # Process the purged applications if requested to do so.
             if purge:
@@ -180,60 +421,67 @@ class Command(BaseCommand):
                         if delete_app.is_mutable(app_label, database_sig,
                                                  database):
                             if compile_sql or execute:
-                                purge_sql.append('-- Purge application %s'
-                                                 % app_label)
-                                purge_sql.extend(
+                                app_purge_sql = [
+                                    '-- Purge application %s' % app_label
+                                ]
+                                app_purge_sql.extend(
                                     delete_app.mutate(app_label, database_sig,
                                                       database))
+                                purge_sql.extend(app_purge_sql)
+                                sql_sources.extend(
+                                    [(app_label, [delete_app])] *
+                                    len(app_purge_sql))
                             delete_app.simulate(app_label, database_sig,
                                                 database)
 
                     if not execute:
                         if compile_sql:
-                            write_sql(purge_sql, database)
+                            write_sql(purge_sql, database, out)
                         else:
-                            print 'The following application(s) can be purged:'
+                            print >>out, 'The following application(s) ' \
+                                         'can be purged:'
 
                             for app_label in diff.deleted:
-                                print '    ', app_label
+                                print >>out, '    ', app_label
 
-                            print
+                            print >>out
 
                     sql.extend(purge_sql)
                 else:
                     if verbosity > 1:
-                        print 'No applications need to be purged.'
+                        print >>out, 'No applications need to be purged.'
 
         except EvolutionException, e:
             raise CommandError(str(e))
 
         if simulated:
-            diff = Diff(database_sig, current_proj_sig)
+            diff = Diff(database_sig, current_proj_sig,
+                        app_labels=diff_app_labels)
 
             if not diff.is_empty(not purge):
                 if hint:
-                    print self.style.ERROR(
+                    print >>out, self.style.ERROR(
                         'Your models contain changes that Django Evolution '
                         'cannot resolve automatically.')
-                    print 'This is probably due to a currently unimplemented ' \
-                          'mutation type.'
-                    print 'You will need to manually construct a mutation ' \
-                          'to resolve the remaining changes.'
+                    print >>out, 'This is probably due to a currently ' \
+                                 'unimplemented mutation type.'
+                    print >>out, 'You will need to manually construct a ' \
+                                 'mutation to resolve the remaining changes.'
                 else:
-                    print self.style.ERROR(
+                    print >>out, self.style.ERROR(
                         'The stored evolutions do not completely resolve '
                         'all model changes.')
-                    print 'Run `./manage.py evolve --hint` to see a ' \
+                    print >>out, 'Run `./manage.py evolve --hint` to see a ' \
                           'suggestion for the changes required.'
-                print
-                print 'The following are the changes that could ' \
+                print >>out
+                print >>out, 'The following are the changes that could ' \
                       'not be resolved:'
-                print diff
+                print >>out, diff
 
                 raise CommandError('Your models contain changes that Django '
                                    'Evolution cannot resolve automatically.')
         else:
-            print self.style.NOTICE(
+            print >>out, self.style.NOTICE(
                 'Evolution could not be simulated, possibly due to raw '
                 'SQL mutations')
 
@@ -262,22 +510,45 @@ Type 'yes' to continue, or 'no' to cancel: """ % database)
                     transaction.enter_transaction_management(**using_args)
                     transaction.managed(flag=True, **using_args)
 
+                    if verbosity > 0:
+                        def progress(description, done, total):
+                            print >>out, '%s: %d of %d' % (description,
+                                                           done, total)
+                    else:
+                        progress = None
+
                     if is_multi_db():
                         cursor = connections[database].cursor()
                     else:
                         cursor = connection.cursor()
 
+                    checkpoint = latest_version.get_checkpoint()
+
+                    if checkpoint is not None and verbosity > 0:
+                        print >>out, 'Resuming an interrupted evolution ' \
+                                     'after its first %d statement(s).' % \
+                                     checkpoint['completed']
+
                     try:
-                        # Perform the SQL
-                        execute_sql(cursor, sql)
+                        # Perform the SQL. Backfills of initial values
+                        # commit after each range of rows they update,
+                        # recording a checkpoint to resume from, and
+                        # batched table copies report their progress.
+                        execute_evolution_sql(
+                            cursor, sql, database, latest_version,
+                            lambda: transaction.commit(**using_args),
+                            progress, execution_report, sql_sources)
 
                         # Now update the evolution table
-                        version = Version(signature=current_signature)
+                        version = Version()
+                        version.set_signature(current_proj_sig,
+                                              latest_version)
                         version.save(**using_args)
 
                         for evolution in new_evolutions:
                             evolution.version = version
-                            evolution.save(**using_args)
+
+                        save_evolutions(new_evolutions, database)
 
                         transaction.commit(**using_args)
                     except Exception, ex:
@@ -288,13 +559,22 @@ Type 'yes' to continue, or 'no' to cancel: """ % database)
                     transaction.leave_transaction_management(**using_args)
 
                     if verbosity > 0:
-                        print 'Evolution successful.'
+                        for statement in sql:
+                            if isinstance(statement, SQLOperation):
+                                report = statement.get_report()
+
+                                if report:
+                                    print >>out, report
+
+                        print >>out, 'Evolution successful.'
                 else:
-                    print self.style.ERROR('Evolution cancelled.')
+                    print >>out, self.style.ERROR('Evolution cancelled.')
             elif not compile_sql:
                 if verbosity > 0:
                     if simulated:
-                        print "Trial evolution successful."
-                        print "Run './manage.py evolve %s--execute' to apply evolution." % (hint and '--hint ' or '')
+                        print >>out, "Trial evolution successful."
+                        print >>out, "Run './manage.py evolve %s--execute' to apply evolution." % (hint and '--hint ' or '')
         elif verbosity > 0:
-            print 'No evolution required.'
+            print >>out, 'No evolution required.'
+
+        return evolution_required
@@ -1,7 +1,17 @@
 from datetime import datetime
 
+from django.conf import settings
 from django.db import models
 
+from django_evolution import EvolutionException, is_multi_db
+from django_evolution.signature import create_project_sig_hashes, \
+                                       deserialize_project_sig, \
+                                       get_signature_depth, \
+                                       load_signature_checkpoint, \
+                                       load_signature_hashes, \
+                                       serialize_project_sig, \
+                                       serialize_project_sig_delta
+
 
 class Version(models.Model):
     signature = models.TextField()
@@ -12,11 +22,101 @@ class Version(models.Model):
         db_table = 'django_project_version'
 
     def __unicode__(self):
+        if self.get_checkpoint() is not None:
+            return u'Interrupted evolution, updated on %s' % self.when
+
         if not self.evolutions.count():
             return u'Hinted version, updated on %s' % self.when
 
         return u'Stored version, updated on %s' % self.when
 
+    def get_signature(self):
+        "Returns the project signature stored in this version."
+        return deserialize_project_sig(self.signature,
+                                       self._load_base_signature)
+
+    def get_signature_hashes(self):
+        """
+        Returns the hashes of the project signature stored in this version,
+        as returned by create_project_sig_hashes.
+
+        Older signatures don't store their hashes, so they're computed from
+        the signature.
+        """
+        hashes = load_signature_hashes(self.signature)
+
+        if hashes is None:
+            hashes = create_project_sig_hashes(self.get_signature())
+
+        return hashes
+
+    def get_checkpoint(self):
+        """
+        Returns the checkpoint stored by an evolution that was interrupted
+        after committing some of its statements, or None.
+
+        The checkpoint is a dictionary containing the hash of the
+        evolution's SQL, as returned by get_sql_hash, and the number of
+        its statements that were committed.
+        """
+        if not self.signature:
+            return None
+
+        return load_signature_checkpoint(self.signature)
+
+    def set_signature(self, proj_sig, base_version=None, checkpoint=None):
+        """
+        Sets the project signature stored in this version, along with a
+        checkpoint of an interrupted evolution if provided.
+
+        If DJANGO_EVOLUTION_SIGNATURE_SNAPSHOT_INTERVAL is set to a number
+        N, and a base_version is given, only the changes since base_version
+        are stored. A full signature is stored every N versions, so loading
+        a signature never needs more than N versions.
+
+        Once this is set, old versions must not be pruned from the database,
+        as the versions after them may need them to load their signatures.
+        If base_version's own signature can't be loaded, a full signature
+        is stored instead.
+        """
+        interval = getattr(settings,
+                           'DJANGO_EVOLUTION_SIGNATURE_SNAPSHOT_INTERVAL',
+                           None)
+
+        if base_version is not None and base_version.pk and interval:
+            depth = get_signature_depth(base_version.signature) + 1
+
+            if depth < interval:
+                try:
+                    base_sig = base_version.get_signature()
+                except EvolutionException:
+                    base_sig = None
+
+                if base_sig is not None:
+                    self.signature = serialize_project_sig_delta(
+                        base_sig, proj_sig, base_version.pk, depth,
+                        checkpoint=checkpoint)
+                    return
+
+        self.signature = serialize_project_sig(proj_sig,
+                                               checkpoint=checkpoint)
+
+    def _load_base_signature(self, version_id):
+        versions = Version.objects
+
+        if is_multi_db():
+            versions = versions.using(self._state.db)
+
+        try:
+            base_version = versions.get(pk=version_id)
+        except Version.DoesNotExist:
+            raise EvolutionException(
+                'Unable to load the signature of version %s, as the version '
+                '%s it was stored relative to no longer exists'
+                % (self.pk, version_id))
+
+        return base_version.get_signature()
+
 
 class Evolution(models.Model):
     version = models.ForeignKey(Version, related_name='evolutions')
@@ -1,4 +1,5 @@
 import copy
+import threading
 
 from django.db.models.fields import *
 from django.db.models.fields.related import *
@@ -8,7 +9,7 @@ from django.utils.functional import curry
 
 from django_evolution.signature import ATTRIBUTE_DEFAULTS
 from django_evolution import CannotSimulate, SimulationFailure, EvolutionNotImplementedError, is_multi_db
-from django_evolution.db import EvolutionOperationsMulti
+from django_evolution.db import get_evolver
 
 FK_INTEGER_TYPES = [
     'AutoField', 'PositiveIntegerField', 'PositiveSmallIntegerField'
@@ -31,8 +32,8 @@ def create_field(proj_sig, field_name, field_type, field_attrs, parent_model):
     if related_model:
         related_app_name, related_model_name = related_model.split('.')
         related_model_sig = proj_sig[related_app_name][related_model_name]
-        to = MockModel(proj_sig, related_app_name, related_model_name,
-                       related_model_sig, stub=True)
+        to = get_mock_model(proj_sig, related_app_name, related_model_name,
+                            related_model_sig, stub=True)
 
         field = field_type(to, name=field_name, **field_attrs)
         field_attrs['related_model'] = related_model
@@ -208,6 +209,204 @@ class MockModel(object):
                 self.model_name == other.model_name)
 
 
+class MockModelCache(object):
+    """
+    A cache of MockModels built from a project signature.
+
+    Building a MockModel means creating every field in the model, along with
+    stub models for related models and fake through models. During an
+    evolution, the same models are built over and over, so they can be
+    cached for as long as their signature doesn't change.
+
+    Each model has a version counter, which is bumped when a mutation's
+    simulation changes the model. Models that depend on it (through a
+    relation) are invalidated along with it.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._models = {}
+        self._versions = {}
+        self._dependents = {}
+        self._building = []
+
+    def get_model(self, proj_sig, app_name, model_name, model_sig,
+                  stub=False):
+        "Returns a MockModel for the model, building it if needed."
+        model_key = (app_name, model_name)
+
+        if self._building:
+            self._dependents.setdefault(model_key, set()).add(
+                self._building[-1])
+
+        version = self._versions.get(model_key, 0)
+        key = (id(proj_sig), app_name, model_name, stub)
+
+        try:
+            cached_proj_sig, cached_version, model = self._models[key]
+
+            if cached_proj_sig is proj_sig and cached_version == version:
+                self.hits += 1
+                return model
+        except KeyError:
+            pass
+
+        self.misses += 1
+        self._building.append(model_key)
+
+        try:
+            model = MockModel(proj_sig, app_name, model_name, model_sig, stub)
+        finally:
+            self._building.pop()
+
+        self._models[key] = (proj_sig, version, model)
+
+        return model
+
+    def invalidate(self, app_name, model_name=None):
+        """
+        Invalidates the cached models for a model, or for every model in an
+        application if model_name isn't provided.
+        """
+        if model_name is None:
+            model_keys = [key[1:3] for key in self._models.keys()
+                          if key[1] == app_name]
+        else:
+            model_keys = [(app_name, model_name)]
+
+        invalidated = set()
+
+        while model_keys:
+            model_key = model_keys.pop()
+
+            if model_key not in invalidated:
+                invalidated.add(model_key)
+                self._versions[model_key] = \
+                    self._versions.get(model_key, 0) + 1
+                model_keys.extend(self._dependents.pop(model_key, []))
+
+    def clear(self):
+        "Removes all cached models, and resets the hit and miss counts."
+        self.__init__()
+
+
+# The caches in use for the current evolution, if any. These are kept per
+# thread, so that evolutions of different databases can run side by side
+# without sharing MockModels built from different signatures.
+_caches = threading.local()
+
+
+def get_mock_model_cache():
+    "Returns the MockModelCache in use, or None if caching is disabled."
+    return getattr(_caches, 'mock_model_cache', None)
+
+
+def set_mock_model_cache(cache):
+    """
+    Sets the MockModelCache to use for building MockModels.
+
+    Passing None disables caching. The cache is only used by the current
+    thread.
+    """
+    _caches.mock_model_cache = cache
+
+
+def get_mock_model(proj_sig, app_name, model_name, model_sig, stub=False):
+    """
+    Returns a MockModel for a model signature, using the MockModelCache if
+    one is in use.
+    """
+    cache = get_mock_model_cache()
+
+    if cache is None:
+        return MockModel(proj_sig, app_name, model_name, model_sig, stub)
+
+    return cache.get_model(proj_sig, app_name, model_name,
+                                       model_sig, stub)
+
+
+class RoutingCache(object):
+    """
+    Caches the database that the router sends writes for each model to.
+
+    Routing decisions don't change during an evolution, so each model only
+    needs to be routed once, no matter how many mutations touch it.
+    """
+    def __init__(self):
+        self._databases = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_db_for_write(self, app_name, model_name, get_model):
+        """
+        Returns the database for a model, calling get_model to fetch the
+        model to route if it hasn't been routed yet.
+        """
+        key = (app_name, model_name)
+
+        try:
+            db_name = self._databases[key]
+            self.hits += 1
+        except KeyError:
+            self.misses += 1
+            db_name = router.db_for_write(get_model())
+            self._databases[key] = db_name
+
+        return db_name
+
+    def clear(self):
+        "Removes all cached databases, and resets the hit and miss counts."
+        self.__init__()
+
+
+def set_routing_cache(cache):
+    """
+    Sets the RoutingCache to use for routing models.
+
+    Passing None disables caching. The cache is only used by the current
+    thread.
+    """
+    _caches.routing_cache = cache
+
+
+def get_db_for_write(proj_sig, app_name, model_name, model=None):
+    """
+    Returns the database that writes to a model are routed to, using the
+    RoutingCache if one is in use.
+
+    The router is given the installed model if there is one. Otherwise, it
+    is given the provided model, or a MockModel built from the signature.
+    """
+    def get_model():
+        installed_model = models.get_model(app_name, model_name)
+
+        if installed_model is not None:
+            return installed_model
+        elif model is not None:
+            return model
+        else:
+            return get_mock_model(proj_sig, app_name, model_name,
+                                  proj_sig[app_name][model_name])
+
+    cache = getattr(_caches, 'routing_cache', None)
+
+    if cache is None:
+        return router.db_for_write(get_model())
+
+    return cache.get_db_for_write(app_name, model_name, get_model)
+
+
+def invalidate_mock_models(app_name, model_name=None):
+    """
+    Invalidates any cached MockModels for a model, or for a whole
+    application if model_name isn't provided.
+    """
+    cache = get_mock_model_cache()
+
+    if cache is not None:
+        cache.invalidate(app_name, model_name)
+
+
 class MockRelated(object):
     """
     A mockup of django.db.models.related.RelatedObject, providing
@@ -261,16 +460,15 @@ class MonoBaseMutation(BaseMutation):
         db_name = None
 
         if is_multi_db():
-            db_name = router.db_for_write(model)
+            opts = model._meta
+            db_name = get_db_for_write(None, opts.app_label,
+                                       opts.object_name, model)
 
-        return EvolutionOperationsMulti(db_name).get_evolver()
+        return get_evolver(db_name)
 
     def is_mutable(self, app_label, proj_sig, database):
         if is_multi_db():
-            app_sig = proj_sig[app_label]
-            model_sig = app_sig[self.model_name]
-            model = MockModel(proj_sig, app_label, self.model_name, model_sig)
-            db_name = router.db_for_write(model)
+            db_name = get_db_for_write(proj_sig, app_label, self.model_name)
             return db_name and db_name == database
         else:
             return True
@@ -290,6 +488,7 @@ class SQLMutation(BaseMutation):
         provided"""
 
         if callable(self.update_func):
+            invalidate_mock_models(app_label)
             self.update_func(app_label, proj_sig)
         else:
             raise CannotSimulate('Cannot simulate SQLMutations')
@@ -311,6 +510,8 @@ class DeleteField(MonoBaseMutation):
         return "DeleteField('%s', '%s')" % (self.model_name, self.field_name)
 
     def simulate(self, app_label, proj_sig, database=None):
+        invalidate_mock_models(app_label, self.model_name)
+
         app_sig = proj_sig[app_label]
         model_sig = app_sig[self.model_name]
 
@@ -347,7 +548,8 @@ class DeleteField(MonoBaseMutation):
         model_sig = app_sig[self.model_name]
         field_sig = model_sig['fields'][self.field_name]
 
-        model = MockModel(proj_sig, app_label, self.model_name, model_sig)
+        model = get_mock_model(proj_sig, app_label, self.model_name,
+                               model_sig)
 
         # Temporarily remove field_type from the field signature
         # so that we can create a field
@@ -389,6 +591,8 @@ class AddField(MonoBaseMutation):
         return 'AddField(' + ', '.join(str_output) + ')'
 
     def simulate(self, app_label, proj_sig, database=None):
+        invalidate_mock_models(app_label, self.model_name)
+
         app_sig = proj_sig[app_label]
         model_sig = app_sig[self.model_name]
 
@@ -421,7 +625,8 @@ class AddField(MonoBaseMutation):
         app_sig = proj_sig[app_label]
         model_sig = app_sig[self.model_name]
 
-        model = MockModel(proj_sig, app_label, self.model_name, model_sig)
+        model = get_mock_model(proj_sig, app_label, self.model_name,
+                               model_sig)
         field = create_field(proj_sig, self.field_name, self.field_type,
                              self.field_attrs, model)
 
@@ -438,7 +643,8 @@ class AddField(MonoBaseMutation):
         app_sig = proj_sig[app_label]
         model_sig = app_sig[self.model_name]
 
-        model = MockModel(proj_sig, app_label, self.model_name, model_sig)
+        model = get_mock_model(proj_sig, app_label, self.model_name,
+                               model_sig)
 
         field = create_field(proj_sig, self.field_name, self.field_type,
                              self.field_attrs, model)
@@ -446,8 +652,8 @@ class AddField(MonoBaseMutation):
         related_app_label, related_model_name = \
             self.field_attrs['related_model'].split('.')
         related_sig = proj_sig[related_app_label][related_model_name]
-        related_model = MockModel(proj_sig, related_app_label,
-                                  related_model_name, related_sig)
+        related_model = get_mock_model(proj_sig, related_app_label,
+                                       related_model_name, related_sig)
         related = MockRelated(related_model, model, field)
 
         if hasattr(field, '_get_m2m_column_name'):
@@ -487,6 +693,8 @@ class RenameField(MonoBaseMutation):
         return "RenameField(%s)" % params
 
     def simulate(self, app_label, proj_sig, database=None):
+        invalidate_mock_models(app_label, self.model_name)
+
         app_sig = proj_sig[app_label]
         model_sig = app_sig[self.model_name]
         field_dict = model_sig['fields']
@@ -539,7 +747,8 @@ class RenameField(MonoBaseMutation):
         # Restore the field type to the signature
         old_field_sig['field_type'] = field_type
 
-        model = MockModel(proj_sig, app_label, self.model_name, model_sig)
+        model = get_mock_model(proj_sig, app_label, self.model_name,
+                               model_sig)
 
         if models.ManyToManyField == field_type:
             old_m2m_table = old_field._get_m2m_db_table(model._meta)
@@ -576,6 +785,8 @@ class ChangeField(MonoBaseMutation):
         return 'ChangeField(' + ', '.join(str_output) + ')'
 
     def simulate(self, app_label, proj_sig, database=None):
+        invalidate_mock_models(app_label, self.model_name)
+
         app_sig = proj_sig[app_label]
         model_sig = app_sig[self.model_name]
         field_sig = model_sig['fields'][self.field_name]
@@ -597,7 +808,8 @@ class ChangeField(MonoBaseMutation):
         app_sig = proj_sig[app_label]
         model_sig = app_sig[self.model_name]
         old_field_sig = model_sig['fields'][self.field_name]
-        model = MockModel(proj_sig, app_label, self.model_name, model_sig)
+        model = get_mock_model(proj_sig, app_label, self.model_name,
+                               model_sig)
 
         sql_statements = []
 
@@ -637,6 +849,8 @@ class DeleteModel(MonoBaseMutation):
         return "DeleteModel(%r)" % self.model_name
 
     def simulate(self, app_label, proj_sig, database=None):
+        invalidate_mock_models(app_label, self.model_name)
+
         app_sig = proj_sig[app_label]
 
         # Simulate the deletion of the model.
@@ -647,7 +861,8 @@ class DeleteModel(MonoBaseMutation):
         model_sig = app_sig[self.model_name]
 
         sql_statements = []
-        model = MockModel(proj_sig, app_label, self.model_name, model_sig)
+        model = get_mock_model(proj_sig, app_label, self.model_name,
+                               model_sig)
 
         # Remove any many to many tables.
         for field_name, field_sig in model_sig['fields'].items():
@@ -667,6 +882,8 @@ class DeleteApplication(BaseMutation):
         return 'DeleteApplication()'
 
     def simulate(self, app_label, proj_sig, database=None):
+        invalidate_mock_models(app_label)
+
         if database:
             app_sig = proj_sig[app_label]
 
@@ -0,0 +1,267 @@
+import copy
+
+from django.db import models
+
+from django_evolution import CannotSimulate
+from django_evolution.db import get_evolver
+from django_evolution.mutations import AddField, ChangeField, DeleteField, \
+                                       MockModel, RenameField, get_mock_model
+
+
+# Attributes that a ChangeField can modify as part of a table rebuild.
+REBUILD_ATTRS = set(['null', 'max_length', 'unique', 'db_column',
+                     'db_index'])
+
+
+class TableRebuild(object):
+    """
+    A set of consecutive mutations on a single model that will be applied
+    through one rebuild of the model's table.
+
+    Backends such as SQLite can't alter columns in place, and must copy
+    the whole table for every column change. This tracks where each column
+    of the resulting table comes from, and what initial values need to be
+    set, so that the backend can perform all the changes in one copy.
+    """
+    def __init__(self, app_label, proj_sig, database, mutation):
+        self.app_label = app_label
+        self.proj_sig = proj_sig
+        self.database = database
+        self.model_name = mutation.model_name
+        self.mutations = []
+
+        model_sig = proj_sig[app_label][self.model_name]
+
+        self.old_model = MockModel(proj_sig, app_label, self.model_name,
+                                   model_sig)
+
+        # Map each field in the new table to the field in the old table
+        # that it will be copied from, or None if it's a new field.
+        self.field_sources = {}
+
+        for field_name in model_sig['fields'].keys():
+            self.field_sources[field_name] = field_name
+
+        # Initial values for fields, along with whether the value only
+        # replaces NULL values.
+        self.initials = {}
+
+        # The model's signature before the rebuild, used to generate the SQL
+        # for the first mutation if no others join it.
+        self.old_model_sig = copy.deepcopy(model_sig)
+
+    def can_add(self, mutation):
+        "Returns whether a mutation can be part of this rebuild."
+        return (mutation.model_name == self.model_name and
+                can_rebuild(self.app_label, self.proj_sig, mutation))
+
+    def add(self, mutation):
+        """
+        Adds a mutation to the rebuild.
+
+        The mutation is simulated immediately, so that the next mutation
+        can be checked against the resulting signature.
+        """
+        if isinstance(mutation, AddField):
+            self.field_sources[mutation.field_name] = None
+
+            if mutation.initial is not None:
+                self.initials[mutation.field_name] = (mutation.initial, False)
+        elif isinstance(mutation, DeleteField):
+            del self.field_sources[mutation.field_name]
+            self.initials.pop(mutation.field_name, None)
+        elif isinstance(mutation, RenameField):
+            self.field_sources[mutation.new_field_name] = \
+                self.field_sources.pop(mutation.old_field_name)
+
+            if mutation.old_field_name in self.initials:
+                self.initials[mutation.new_field_name] = \
+                    self.initials.pop(mutation.old_field_name)
+        elif isinstance(mutation, ChangeField):
+            if ('null' in mutation.field_attrs and
+                not mutation.field_attrs['null'] and
+                mutation.initial is not None and
+                mutation.field_name not in self.initials):
+                self.initials[mutation.field_name] = (mutation.initial, True)
+
+        mutation.simulate(self.app_label, self.proj_sig, self.database)
+        self.mutations.append(mutation)
+
+    def get_sql(self):
+        """
+        Returns the SQL needed to apply every mutation in the rebuild.
+
+        A single mutation generates its own SQL, unless it's a ChangeField
+        changing several attributes, which would otherwise rebuild the
+        table once per attribute.
+        """
+        if len(self.mutations) == 1:
+            mutation = self.mutations[0]
+
+            if not (isinstance(mutation, ChangeField) and
+                    len(mutation.field_attrs) > 1):
+                old_proj_sig = copy.copy(self.proj_sig)
+                old_proj_sig[self.app_label] = \
+                    self.proj_sig[self.app_label].copy()
+                old_proj_sig[self.app_label][self.model_name] = \
+                    self.old_model_sig
+
+                return mutation.mutate(self.app_label, old_proj_sig,
+                                       self.database)
+
+        new_model = MockModel(self.proj_sig, self.app_label, self.model_name,
+                              self.proj_sig[self.app_label][self.model_name])
+        evolver = self.mutations[0].evolver(new_model)
+
+        return evolver.rebuild_table(self.old_model, new_model,
+                                     self.field_sources, self.initials)
+
+
+class AppMutator(object):
+    """
+    Generates the SQL for a list of mutations on an application, simulating
+    each mutation against the project signature as it goes.
+
+    If the database backend rebuilds tables in order to change columns,
+    consecutive mutations on the same model are combined, so that the
+    table is only rebuilt once. Otherwise, consecutive ALTER TABLE
+    statements on the same table are combined where the backend allows it.
+
+    After running the mutations, sources contains the list of mutations
+    that each returned statement was generated for.
+    """
+    def __init__(self, app_label, proj_sig, database=None):
+        self.app_label = app_label
+        self.proj_sig = proj_sig
+        self.database = database
+        self.evolver = get_evolver(database)
+        self.simulated = True
+        self.sources = []
+
+    def run_mutations(self, mutations, compile_sql=True):
+        """
+        Simulates the list of mutations, returning the SQL for them if
+        compile_sql is set.
+        """
+        sql = []
+        sources = []
+        rebuild = None
+
+        for mutation in mutations:
+            if rebuild and rebuild.can_add(mutation):
+                rebuild.add(mutation)
+                continue
+
+            if rebuild:
+                rebuild_sql = rebuild.get_sql()
+                sql.extend(rebuild_sql)
+                sources.extend([rebuild.mutations] * len(rebuild_sql))
+                rebuild = None
+
+            if (compile_sql and
+                self.evolver.supports_table_rebuild and
+                can_rebuild(self.app_label, self.proj_sig, mutation) and
+                not can_alter_in_place(self.evolver, self.app_label,
+                                       self.proj_sig, mutation)):
+                rebuild = TableRebuild(self.app_label, self.proj_sig,
+                                       self.database, mutation)
+                rebuild.add(mutation)
+            else:
+                mutation_sql = self.run_mutation(mutation, compile_sql)
+                sql.extend(mutation_sql)
+                sources.extend([[mutation]] * len(mutation_sql))
+
+        if rebuild:
+            rebuild_sql = rebuild.get_sql()
+            sql.extend(rebuild_sql)
+            sources.extend([rebuild.mutations] * len(rebuild_sql))
+
+        if compile_sql:
+            sql, sources = self.evolver.combine_alter_statements(sql, sources)
+            sql = self.evolver.apply_online_ddl(sql)
+
+        self.sources = sources
+
+        return sql
+
+    def run_mutation(self, mutation, compile_sql=True):
+        sql = []
+
+        if compile_sql:
+            sql.extend(mutation.mutate(self.app_label, self.proj_sig,
+                                       self.database))
+
+        # Now run the simulation, which will modify the signatures
+        try:
+            mutation.simulate(self.app_label, self.proj_sig, self.database)
+        except CannotSimulate:
+            self.simulated = False
+
+        return sql
+
+
+def can_rebuild(app_label, proj_sig, mutation):
+    """
+    Returns whether a mutation only changes columns of its model's table,
+    and can therefore be applied as part of a table rebuild.
+    """
+    if isinstance(mutation, AddField):
+        return mutation.field_type != models.ManyToManyField
+
+    if isinstance(mutation, DeleteField):
+        field_name = mutation.field_name
+    elif isinstance(mutation, RenameField):
+        field_name = mutation.old_field_name
+    elif isinstance(mutation, ChangeField):
+        if not mutation.field_attrs or \
+           not REBUILD_ATTRS.issuperset(mutation.field_attrs.keys()):
+            return False
+
+        field_name = mutation.field_name
+    else:
+        return False
+
+    try:
+        model_sig = proj_sig[app_label][mutation.model_name]
+        field_sig = model_sig['fields'][field_name]
+    except KeyError:
+        return False
+
+    return (field_sig['field_type'] != models.ManyToManyField and
+            not field_sig.get('primary_key', False))
+
+
+def can_alter_in_place(evolver, app_label, proj_sig, mutation):
+    """
+    Returns whether a mutation can be applied without rebuilding its
+    model's table.
+
+    Index changes never need a rebuild, and some backends can rename or
+    drop columns in place. These mutations shouldn't cause a table rebuild,
+    but they can be folded into one that's already happening.
+    """
+    if is_index_only_change(mutation):
+        return True
+
+    if isinstance(mutation, RenameField):
+        return evolver.supports_rename_column
+
+    if isinstance(mutation, DeleteField) and evolver.supports_drop_column:
+        model = get_mock_model(proj_sig, app_label, mutation.model_name,
+                               proj_sig[app_label][mutation.model_name])
+
+        return evolver.can_drop_column(
+            model, model._meta.get_field(mutation.field_name))
+
+    return False
+
+
+def is_index_only_change(mutation):
+    """
+    Returns whether a mutation only changes an index.
+
+    These are cheap on their own, so they shouldn't cause a table rebuild,
+    but they can be folded into one that's already happening.
+    """
+    return (isinstance(mutation, ChangeField) and
+            mutation.field_attrs.keys() == ['db_index'])
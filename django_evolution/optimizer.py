@@ -0,0 +1,260 @@
+import copy
+
+from django.db import models
+
+from django_evolution import EvolutionException
+from django_evolution.mutations import AddField, ChangeField, DeleteField, \
+                                       DeleteModel, RenameField
+
+
+# Mutations that the optimizer knows how to reason about. Anything else
+# (such as SQLMutation) may depend on the exact state of the database, so
+# mutations are never moved or merged across it.
+OPTIMIZABLE_MUTATIONS = (AddField, ChangeField, DeleteField, DeleteModel,
+                         RenameField)
+
+
+def optimize_mutations(app_label, mutations, proj_sig, database=None):
+    """
+    Returns an optimized version of a list of mutations for an application.
+
+    Mutations that cancel each other out (such as adding and then deleting
+    a field) are removed, chained renames are merged into one rename, and
+    consecutive changes to a field are merged into one ChangeField keeping
+    the last value for each attribute.
+
+    The optimized list is then simulated against the signature and checked
+    against a simulation of the original list. If the resulting signatures
+    differ, or if either list cannot be simulated, the original list is
+    returned.
+    """
+    optimized = []
+    segment = []
+
+    for mutation in mutations:
+        if isinstance(mutation, OPTIMIZABLE_MUTATIONS):
+            segment.append(mutation)
+        else:
+            optimized.extend(_optimize_segment(segment))
+            optimized.append(mutation)
+            segment = []
+
+    optimized.extend(_optimize_segment(segment))
+
+    if len(optimized) == len(mutations):
+        return mutations
+
+    try:
+        original_sig = _simulate(app_label, mutations, proj_sig, database)
+        optimized_sig = _simulate(app_label, optimized, proj_sig, database)
+    except (EvolutionException, KeyError):
+        return mutations
+
+    if not _app_sigs_match(original_sig, optimized_sig):
+        return mutations
+
+    return optimized
+
+
+def _simulate(app_label, mutations, proj_sig, database):
+    """
+    Simulates a list of mutations on a copy of an application's signature,
+    returning the resulting application signature.
+    """
+    test_sig = proj_sig.copy()
+    test_sig[app_label] = copy.deepcopy(proj_sig[app_label])
+
+    for mutation in mutations:
+        mutation.simulate(app_label, test_sig, database)
+
+    return test_sig[app_label]
+
+
+def _app_sigs_match(app_sig1, app_sig2):
+    """
+    Returns whether two application signatures are the same.
+
+    DeleteField normalizes unique_together to a tuple of tuples, so that's
+    done for both signatures before comparing.
+    """
+    if sorted(app_sig1.keys()) != sorted(app_sig2.keys()):
+        return False
+
+    for model_name, model_sig1 in app_sig1.items():
+        model_sig2 = app_sig2[model_name]
+        meta1 = model_sig1['meta'].copy()
+        meta2 = model_sig2['meta'].copy()
+
+        for meta in (meta1, meta2):
+            meta['unique_together'] = \
+                tuple([tuple(ut) for ut in meta['unique_together']])
+
+        if meta1 != meta2 or model_sig1['fields'] != model_sig2['fields']:
+            return False
+
+    return True
+
+
+def _optimize_segment(mutations):
+    "Optimizes a list of mutations that only contains optimizable mutations."
+    mutations = list(mutations)
+    changed = True
+
+    while changed:
+        changed = False
+
+        for i in range(len(mutations)):
+            for j in range(i + 1, len(mutations)):
+                if _optimize_pair(mutations, i, j):
+                    changed = True
+                    break
+
+            if changed:
+                break
+
+    return mutations
+
+
+def _optimize_pair(mutations, i, j):
+    """
+    Attempts to merge or cancel out the mutations at indexes i and j,
+    updating the list in place. Returns whether the list was changed.
+
+    The mutations can only be combined if none of the mutations between
+    them touch the same fields.
+    """
+    first = mutations[i]
+    second = mutations[j]
+
+    if first.model_name != second.model_name:
+        return False
+
+    if isinstance(second, DeleteModel):
+        if isinstance(first, DeleteModel):
+            return False
+
+        # Any change to a model that's later deleted is pointless.
+        del mutations[i]
+        return True
+
+    if isinstance(first, DeleteModel):
+        return False
+
+    field_names = _get_field_names(first) + _get_field_names(second)
+    shared = False
+
+    for field_name in _get_field_names(first):
+        if field_name in _get_field_names(second):
+            shared = True
+
+    if isinstance(first, RenameField) and isinstance(second, RenameField):
+        shared = (first.new_field_name == second.old_field_name)
+
+    if not shared:
+        return False
+
+    for mutation in mutations[i + 1:j]:
+        if isinstance(mutation, DeleteModel):
+            return False
+
+        if mutation.model_name == first.model_name:
+            for field_name in _get_field_names(mutation):
+                if field_name in field_names:
+                    return False
+
+    merged = _merge(first, second)
+
+    if merged is False:
+        return False
+
+    del mutations[j]
+
+    if merged is None:
+        del mutations[i]
+    else:
+        mutations[i] = merged
+
+    return True
+
+
+def _merge(first, second):
+    """
+    Merges two mutations on the same field.
+
+    Returns the mutation replacing both, None if they cancel each other out,
+    or False if they can't be merged.
+    """
+    if isinstance(first, AddField):
+        if isinstance(second, DeleteField):
+            if second.field_name == first.field_name:
+                return None
+        elif isinstance(second, ChangeField):
+            if second.field_name == first.field_name:
+                field_attrs = first.field_attrs.copy()
+                field_attrs.update(second.field_attrs)
+                initial = first.initial
+
+                if initial is None:
+                    initial = second.initial
+
+                return AddField(first.model_name, first.field_name,
+                                first.field_type, initial=initial,
+                                **field_attrs)
+        elif isinstance(second, RenameField):
+            if second.old_field_name == first.field_name:
+                field_attrs = first.field_attrs.copy()
+                _apply_rename(second, first.field_type, field_attrs)
+
+                return AddField(first.model_name, second.new_field_name,
+                                first.field_type, initial=first.initial,
+                                **field_attrs)
+    elif isinstance(first, ChangeField):
+        if (isinstance(second, DeleteField) and
+            second.field_name == first.field_name):
+            return second
+        elif (isinstance(second, ChangeField) and
+              second.field_name == first.field_name):
+            field_attrs = first.field_attrs.copy()
+            field_attrs.update(second.field_attrs)
+            initial = second.initial
+
+            if initial is None:
+                initial = first.initial
+
+            return ChangeField(first.model_name, first.field_name,
+                               initial=initial, **field_attrs)
+    elif isinstance(first, RenameField):
+        if (isinstance(second, DeleteField) and
+            second.field_name == first.new_field_name):
+            return DeleteField(first.model_name, first.old_field_name)
+        elif (isinstance(second, RenameField) and
+              second.old_field_name == first.new_field_name):
+            return RenameField(first.model_name, first.old_field_name,
+                               second.new_field_name,
+                               db_column=second.db_column,
+                               db_table=second.db_table)
+
+    return False
+
+
+def _apply_rename(rename, field_type, field_attrs):
+    "Applies the column or table changes of a RenameField to field attributes."
+    if field_type == models.ManyToManyField:
+        if rename.db_table:
+            field_attrs['db_table'] = rename.db_table
+        else:
+            field_attrs.pop('db_table', None)
+    elif rename.db_column:
+        field_attrs['db_column'] = rename.db_column
+    else:
+        field_attrs.pop('db_column', None)
+
+
+def _get_field_names(mutation):
+    "Returns the names of the fields touched by a mutation."
+    if isinstance(mutation, RenameField):
+        return [mutation.old_field_name, mutation.new_field_name]
+    elif isinstance(mutation, DeleteModel):
+        return []
+    else:
+        return [mutation.field_name]
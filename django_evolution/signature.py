@@ -1,9 +1,23 @@
+import base64
+import copy
+import zlib
+from UserDict import DictMixin
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle as pickle
+
+from django.db import models
 from django.db.models import get_apps, get_models
+from django.db.models.fields import NOT_PROVIDED
 from django.db.models.fields.related import *
-from django.conf import global_settings
+from django.conf import global_settings, settings
 from django.contrib.contenttypes import generic
+from django.utils import simplejson
 from django.utils.datastructures import SortedDict
-from django_evolution import is_multi_db
+from django.utils.hashcompat import sha_constructor
+from django.utils.importlib import import_module
+from django_evolution import EvolutionException, is_multi_db
 
 if is_multi_db():
     from django.db import router
@@ -35,25 +49,52 @@ ATTRIBUTE_ALIASES = {
     'unique': '_unique'
 }
 
+# The attributes checked by create_field_sig for each field class, as
+# computed by _get_field_sig_plan.
+_field_sig_plans = {}
+
+# Marks an attribute that a field doesn't have.
+_MISSING = object()
+
+def _get_field_sig_plan(field_class):
+    """
+    Returns a list of (attribute, alias, default) tuples for the attributes
+    that create_field_sig stores for fields of a class.
+
+    The aliases and defaults only depend on the class, so they're worked
+    out once for each class instead of for every field.
+    """
+    try:
+        return _field_sig_plans[field_class]
+    except KeyError:
+        pass
+
+    is_foreign_key = issubclass(field_class, ForeignKey)
+    plan = []
+
+    for attrib in ATTRIBUTE_DEFAULTS.keys():
+        if is_foreign_key and attrib == 'db_index':
+            default = True
+        else:
+            default = ATTRIBUTE_DEFAULTS[attrib]
+
+        plan.append((attrib, ATTRIBUTE_ALIASES.get(attrib, attrib), default))
+
+    _field_sig_plans[field_class] = plan
+
+    return plan
+
 def create_field_sig(field):
     field_sig = {
         'field_type': field.__class__,
     }
 
-    for attrib in ATTRIBUTE_DEFAULTS.keys():
-        alias = ATTRIBUTE_ALIASES.get(attrib, attrib)
-        if hasattr(field,alias):
-            value = getattr(field,alias)
-            if isinstance(field, ForeignKey):
-                if attrib == 'db_index':
-                    default = True
-                else:
-                    default = ATTRIBUTE_DEFAULTS[attrib]
-            else:
-                default = ATTRIBUTE_DEFAULTS[attrib]
-            # only store non-default values
-            if default != value:
-                field_sig[attrib] = value
+    for attrib, alias, default in _get_field_sig_plan(field.__class__):
+        value = getattr(field, alias, _MISSING)
+
+        # only store non-default values
+        if value is not _MISSING and default != value:
+            field_sig[attrib] = value
 
     rel = field_sig.pop('rel', None)
 
@@ -96,15 +137,508 @@ def create_app_sig(app, database):
 
     return app_sig
 
+class LazyProjectSig(DictMixin):
+    """
+    A project signature that only creates the signature of an application
+    the first time it's accessed.
+
+    This behaves like the dictionary of application signatures, and can be
+    used anywhere a project signature is expected. The application labels
+    are known up front, so checking for an application doesn't create its
+    signature, but anything that reads every application (such as
+    serializing the signature) creates all of them.
+
+    Copying or pickling the signature results in a normal dictionary.
+    """
+    def __init__(self, database):
+        self.database = database
+        self._app_sigs = {
+            '__version__': 1,
+        }
+        self._apps = {}
+
+        for app in get_apps():
+            self._apps[app.__name__.split('.')[-2]] = app
+
+    def __getitem__(self, app_label):
+        try:
+            return self._app_sigs[app_label]
+        except KeyError:
+            pass
+
+        app = self._apps.get(app_label)
+
+        if app is None:
+            # Either there's no such application, or another thread has just
+            # created its signature.
+            return self._app_sigs[app_label]
+
+        app_sig = create_app_sig(app, self.database)
+        self._app_sigs[app_label] = app_sig
+        self._apps.pop(app_label, None)
+
+        return app_sig
+
+    def __setitem__(self, app_label, app_sig):
+        self._app_sigs[app_label] = app_sig
+        self._apps.pop(app_label, None)
+
+    def __delitem__(self, app_label):
+        if app_label in self._apps:
+            del self._apps[app_label]
+        else:
+            del self._app_sigs[app_label]
+
+    def __contains__(self, app_label):
+        return app_label in self._app_sigs or app_label in self._apps
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        return self._app_sigs.keys() + self._apps.keys()
+
+    def has_key(self, app_label):
+        return app_label in self
+
+    def copy(self):
+        return dict(self.items())
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self.items()), memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self.items()),))
+
 def create_project_sig(database):
     """
     Create a dictionary representation of the apps in a given project.
+
+    The signature of each application is only created when it's first
+    accessed.
     """
+    return LazyProjectSig(database)
+
+def create_project_sigs(databases):
+    """
+    Create the project signatures for several databases, returned as a
+    dictionary mapping each database to its signature.
+
+    The models in a signature only depend on which models the router allows
+    to be synced to the database. Databases that the router treats the same
+    share one signature, which is only created once.
+    """
+    proj_sigs = {}
+    routed_sigs = {}
+
+    for database in databases:
+        routing = tuple([
+            (model._meta.app_label, model._meta.object_name)
+            for app in get_apps()
+            for model in get_models(app)
+            if not is_multi_db() or router.allow_syncdb(database, model)
+        ])
+
+        if routing not in routed_sigs:
+            routed_sigs[routing] = create_project_sig(database)
+
+        proj_sigs[database] = routed_sigs[routing]
+
+    return proj_sigs
+
+
+# The version of the format used to store signatures in the database.
+#
+# Version 1 signatures are pickled project signatures. Version 2 signatures
+# are stored as canonical JSON, with field types stored as short strings and
+# default attribute values left out. They may also be compressed with zlib.
+SIGNATURE_STORAGE_VERSION = 2
+
+COMPRESSED_SIG_PREFIX = 'zlib:'
+
+def get_field_type_name(field_type):
+    """
+    Returns the short name used to store a field class in a signature.
+
+    Fields provided by django.db.models are stored by class name. Any other
+    field is stored by its full import path.
+    """
+    name = field_type.__name__
+
+    if getattr(models, name, None) is field_type:
+        return name
+
+    return '%s.%s' % (field_type.__module__, name)
+
+def get_field_type(name):
+    "Returns the field class for a name from get_field_type_name."
+    try:
+        if '.' in name:
+            module_name, class_name = name.rsplit('.', 1)
+            return getattr(import_module(module_name), class_name)
+
+        return getattr(models, name)
+    except (ImportError, AttributeError):
+        raise EvolutionException('Unable to find the field type "%s" used '
+                                 'in the stored signature' % name)
+
+def _get_attribute_default(field_type, attrib):
+    if attrib == 'db_index' and issubclass(field_type, ForeignKey):
+        return True
+
+    return ATTRIBUTE_DEFAULTS.get(attrib, NOT_PROVIDED)
+
+def _pack_field_sig(field_sig):
+    field_type = field_sig['field_type']
+    packed = {
+        'field_type': get_field_type_name(field_type),
+    }
+
+    for attrib, value in field_sig.items():
+        if (attrib != 'field_type' and
+            value != _get_attribute_default(field_type, attrib)):
+            packed[attrib] = value
+
+    return packed
+
+def _unpack_field_sig(packed):
+    field_sig = {}
+
+    for attrib, value in packed.items():
+        field_sig[str(attrib)] = value
+
+    field_sig['field_type'] = get_field_type(packed['field_type'])
+
+    return field_sig
+
+def _pack_model_sig(model_sig):
+    meta = {}
+
+    for key, value in model_sig['meta'].items():
+        if key == 'unique_together':
+            if value:
+                meta[key] = [list(fields) for fields in value]
+        elif (key != 'db_tablespace' or
+              value != global_settings.DEFAULT_TABLESPACE):
+            meta[key] = value
+
+    fields = {}
+
+    for field_name, field_sig in model_sig['fields'].items():
+        fields[field_name] = _pack_field_sig(field_sig)
+
+    return {
+        'meta': meta,
+        'fields': fields,
+    }
+
+def _unpack_model_sig(packed):
+    meta = {
+        'unique_together': [],
+        'db_tablespace': global_settings.DEFAULT_TABLESPACE,
+    }
+
+    for key, value in packed['meta'].items():
+        if key == 'unique_together':
+            value = tuple([tuple(fields) for fields in value])
+
+        meta[str(key)] = value
+
+    fields = {}
+
+    for field_name, packed_field_sig in packed['fields'].items():
+        fields[str(field_name)] = _unpack_field_sig(packed_field_sig)
+
+    return {
+        'meta': meta,
+        'fields': fields,
+    }
+
+def _pack_project_sig(proj_sig):
+    apps = {}
+
+    for app_label, app_sig in proj_sig.items():
+        if app_label != '__version__':
+            apps[app_label] = [
+                [model_name, _pack_model_sig(model_sig)]
+                for model_name, model_sig in app_sig.items()
+            ]
+
+    return apps
+
+def _hash_data(data):
+    """
+    Returns a digest of JSON-compatible data, or None if the data can't be
+    represented as JSON.
+    """
+    try:
+        return sha_constructor(simplejson.dumps(
+            data, sort_keys=True, separators=(',', ':'))).hexdigest()
+    except (TypeError, ValueError):
+        return None
+
+def _create_sig_hashes(packed_apps):
+    app_hashes = {}
+    model_hashes = {}
+
+    for app_label, models_list in packed_apps.items():
+        model_hashes[app_label] = {}
+
+        for model_name, packed_model_sig in models_list:
+            model_hashes[app_label][model_name] = \
+                _hash_data(packed_model_sig)
+
+        if None in model_hashes[app_label].values():
+            app_hashes[app_label] = None
+        else:
+            app_hashes[app_label] = _hash_data(model_hashes[app_label])
+
+    if None in app_hashes.values():
+        project_hash = None
+    else:
+        project_hash = _hash_data(app_hashes)
+
+    return {
+        'project': project_hash,
+        'apps': app_hashes,
+        'models': model_hashes,
+    }
+
+def create_project_sig_hashes(proj_sig):
+    """
+    Returns content hashes for a project signature, and for each of its
+    applications and models.
+
+    The hashes are returned as:
+
+    {
+        'project': project_hash,
+        'apps': { app_label: app_hash },
+        'models': { app_label: { model_name: model_hash } },
+    }
+
+    Two signatures with the same hash have the same content, regardless of
+    the order of their applications or attributes, and of any attributes
+    set to their default values. A hash is None if the signature contains
+    values that can't be hashed, in which case it never matches.
+    """
+    return _create_sig_hashes(_pack_project_sig(proj_sig))
+
+def _dump_signature(data, compress):
+    signature = simplejson.dumps(data, sort_keys=True, separators=(',', ':'))
+
+    if compress is None:
+        compress = getattr(settings, 'DJANGO_EVOLUTION_COMPRESS_SIGNATURES',
+                           False)
+
+    if compress:
+        signature = COMPRESSED_SIG_PREFIX + \
+                    base64.b64encode(zlib.compress(signature))
+
+    return signature
+
+def _load_signature_data(signature):
+    """
+    Returns the stored data for a version 2 signature, or None if the
+    signature is an older, pickled one.
+    """
+    signature = str(signature)
+
+    if signature.startswith(COMPRESSED_SIG_PREFIX):
+        signature = zlib.decompress(
+            base64.b64decode(signature[len(COMPRESSED_SIG_PREFIX):]))
+    elif not signature.startswith('{'):
+        return None
+
+    data = simplejson.loads(signature)
+
+    if data.get('__version__') != SIGNATURE_STORAGE_VERSION:
+        raise EvolutionException('Unknown signature version %s'
+                                 % data.get('__version__'))
+
+    return data
+
+def serialize_project_sig(proj_sig, compress=None, checkpoint=None):
+    """
+    Serializes a project signature for storage in Version.signature.
+
+    The signature is stored as canonical JSON, in storage version 2. If
+    compress is True (or if it's None and the
+    DJANGO_EVOLUTION_COMPRESS_SIGNATURES setting is set), the result is also
+    compressed with zlib and base64-encoded.
+
+    checkpoint, if provided, is stored along with the signature and can be
+    loaded with load_signature_checkpoint.
+
+    Signatures that contain values JSON can't represent (such as those
+    added by custom SQLMutation update functions) are pickled instead,
+    without the checkpoint.
+    """
+    apps = _pack_project_sig(proj_sig)
+    data = {
+        '__version__': SIGNATURE_STORAGE_VERSION,
+        'apps': apps,
+        'hashes': _create_sig_hashes(apps),
+    }
+
+    if checkpoint is not None:
+        data['checkpoint'] = checkpoint
+
+    try:
+        return _dump_signature(data, compress)
+    except (TypeError, ValueError):
+        return pickle.dumps(proj_sig)
+
+def serialize_project_sig_delta(base_proj_sig, proj_sig, base_id, depth,
+                                compress=None, checkpoint=None):
+    """
+    Serializes a project signature as the changes made since the signature
+    stored in the version with the ID base_id.
+
+    Only the applications that changed are stored, and within those, only
+    the models that changed (along with the order of the models). depth is
+    the number of deltas that must be applied, counting this one, to get
+    back to a full signature.
+
+    checkpoint, if provided, is stored as with serialize_project_sig.
+
+    If the signature can't be stored as JSON, it's stored as a full
+    signature instead.
+    """
+    packed_apps = _pack_project_sig(proj_sig)
+    apps = {}
+    deleted_apps = []
+
+    for app_label, models_list in packed_apps.items():
+        base_app_sig = base_proj_sig.get(app_label, {})
+        changed_models = {}
+
+        for model_name, packed in models_list:
+            if (model_name not in base_app_sig or
+                _pack_model_sig(base_app_sig[model_name]) != packed):
+                changed_models[model_name] = packed
+
+        model_names = [model_name for model_name, packed in models_list]
+
+        if (app_label not in base_proj_sig or changed_models or
+            model_names != base_app_sig.keys()):
+            apps[app_label] = {
+                'order': model_names,
+                'models': changed_models,
+            }
+
+    for app_label in base_proj_sig.keys():
+        if app_label != '__version__' and app_label not in proj_sig:
+            deleted_apps.append(app_label)
+
+    data = {
+        '__version__': SIGNATURE_STORAGE_VERSION,
+        'base': base_id,
+        'depth': depth,
+        'apps': apps,
+        'deleted_apps': sorted(deleted_apps),
+        'hashes': _create_sig_hashes(packed_apps),
+    }
+
+    if checkpoint is not None:
+        data['checkpoint'] = checkpoint
+
+    try:
+        return _dump_signature(data, compress)
+    except (TypeError, ValueError):
+        return serialize_project_sig(proj_sig, compress, checkpoint)
+
+def get_signature_depth(signature):
+    """
+    Returns the number of deltas that must be applied to load a stored
+    signature, or 0 if it's a full signature.
+    """
+    data = _load_signature_data(signature)
+
+    if data is None:
+        return 0
+
+    return data.get('depth', 0)
+
+def load_signature_hashes(signature):
+    """
+    Returns the hashes stored along with a signature, as returned by
+    create_project_sig_hashes, or None if the signature has no hashes.
+    """
+    data = _load_signature_data(signature)
+
+    if data is None:
+        return None
+
+    return data.get('hashes')
+
+def load_signature_checkpoint(signature):
+    """
+    Returns the checkpoint stored along with a signature, or None if the
+    signature has no checkpoint.
+    """
+    data = _load_signature_data(signature)
+
+    if data is None:
+        return None
+
+    return data.get('checkpoint')
+
+def deserialize_project_sig(signature, load_base=None):
+    """
+    Loads a project signature stored by serialize_project_sig or
+    serialize_project_sig_delta.
+
+    Older, pickled signatures are loaded as well. In either case, the
+    result is a version 1 project signature, as returned by
+    create_project_sig.
+
+    Loading a delta requires load_base, which is called with the ID of the
+    base version and must return a new copy of its project signature.
+    """
+    data = _load_signature_data(signature)
+
+    if data is None:
+        return pickle.loads(str(signature))
+
+    if 'base' in data:
+        if load_base is None:
+            raise EvolutionException('The stored signature is a delta, but '
+                                     'its base signature cannot be loaded')
+
+        proj_sig = load_base(data['base'])
+
+        for app_label in data['deleted_apps']:
+            proj_sig.pop(app_label, None)
+
+        for app_label, app_delta in data['apps'].items():
+            base_app_sig = proj_sig.get(app_label, {})
+            app_sig = SortedDict()
+
+            for model_name in app_delta['order']:
+                if model_name in app_delta['models']:
+                    app_sig[str(model_name)] = \
+                        _unpack_model_sig(app_delta['models'][model_name])
+                else:
+                    app_sig[str(model_name)] = base_app_sig[model_name]
+
+            proj_sig[str(app_label)] = app_sig
+
+        return proj_sig
+
     proj_sig = {
         '__version__': 1,
     }
 
-    for app in get_apps():
-        proj_sig[app.__name__.split('.')[-2]] = create_app_sig(app, database)
+    for app_label, models_list in data['apps'].items():
+        app_sig = SortedDict()
+
+        for model_name, packed_model_sig in models_list:
+            app_sig[str(model_name)] = _unpack_model_sig(packed_model_sig)
+
+        proj_sig[str(app_label)] = app_sig
 
     return proj_sig
@@ -9,6 +9,11 @@ from sql_mutation import tests as sql_mutation_tests
 from ordering import tests as ordering_tests
 from generics import tests as generics_tests
 from inheritance import tests as inheritance_tests
+from app_mutator import tests as app_mutator_tests
+from optimizer import tests as optimizer_tests
+from evolutions import tests as evolutions_tests
+from backfill import tests as backfill_tests
+from table_copy import tests as table_copy_tests
 from django_evolution import is_multi_db
 # Define doctests
 __test__ = {
@@ -22,7 +27,12 @@ __test__ = {
     'sql_mutation': sql_mutation_tests,
     'ordering': ordering_tests,
     'generics': generics_tests,
-    'inheritance': inheritance_tests
+    'inheritance': inheritance_tests,
+    'app_mutator': app_mutator_tests,
+    'optimizer': optimizer_tests,
+    'evolutions': evolutions_tests,
+    'backfill': backfill_tests,
+    'table_copy': table_copy_tests,
 }
 
 if is_multi_db():
@@ -0,0 +1,289 @@
+from django_evolution.tests.utils import test_sql_mapping
+
+tests = r"""
+>>> from django.db import models
+
+>>> from django_evolution.mutations import AddField, ChangeField, DeleteField, RenameField
+>>> from django_evolution.mutators import AppMutator
+>>> from django_evolution.tests.utils import test_proj_sig, execute_test_sql, register_models, deregister_models
+>>> from django_evolution.diff import Diff
+
+>>> import copy
+
+>>> class MutatorBaseModel(models.Model):
+...     char_field = models.CharField(max_length=20)
+...     char_field2 = models.CharField(max_length=30, null=True)
+...     int_field = models.IntegerField()
+...     int_field2 = models.IntegerField()
+
+# Store the base signatures
+>>> start = register_models(('TestModel', MutatorBaseModel))
+>>> start_sig = test_proj_sig(('TestModel', MutatorBaseModel))
+
+# Several changes to the same model
+>>> class MultipleChangesModel(models.Model):
+...     char_field = models.CharField(max_length=40)
+...     char_field2 = models.CharField(max_length=30, null=False)
+...     renamed_field = models.IntegerField()
+...     added_field = models.IntegerField()
+
+>>> end = register_models(('TestModel', MultipleChangesModel))
+>>> end_sig = test_proj_sig(('TestModel', MultipleChangesModel))
+
+>>> evolution = [
+...     AddField('TestModel', 'added_field', models.IntegerField, initial=42),
+...     ChangeField('TestModel', 'char_field', max_length=40),
+...     ChangeField('TestModel', 'char_field2', null=False, initial='abc'),
+...     RenameField('TestModel', 'int_field', 'renamed_field'),
+...     DeleteField('TestModel', 'int_field2'),
+... ]
+
+>>> test_sig = copy.deepcopy(start_sig)
+>>> app_mutator = AppMutator('tests', test_sig)
+>>> test_sql = app_mutator.run_mutations(evolution)
+>>> app_mutator.simulated
+True
+
+>>> Diff(test_sig, end_sig).is_empty()
+True
+
+>>> execute_test_sql(start, end, test_sql) # MultipleChangesModel
+%(MultipleChangesModel)s
+
+# A single change to several attributes of a field
+>>> class MultiAttrChangeModel(models.Model):
+...     char_field = models.CharField(max_length=40, null=True)
+...     char_field2 = models.CharField(max_length=30, null=True)
+...     int_field = models.IntegerField()
+...     int_field2 = models.IntegerField()
+
+>>> multi_attr_end = register_models(('TestModel', MultiAttrChangeModel))
+>>> multi_attr_end_sig = test_proj_sig(('TestModel', MultiAttrChangeModel))
+
+>>> test_sig = copy.deepcopy(start_sig)
+>>> app_mutator = AppMutator('tests', test_sig)
+>>> multi_attr_sql = app_mutator.run_mutations([
+...     ChangeField('TestModel', 'char_field', max_length=40, null=True),
+... ])
+
+>>> Diff(test_sig, multi_attr_end_sig).is_empty()
+True
+
+>>> execute_test_sql(start, multi_attr_end, multi_attr_sql) # MultiAttrChangeModel
+%(MultiAttrChangeModel)s
+
+# MockModels can be cached during an evolution, until a simulation changes
+# their model.
+>>> from django_evolution.mutations import MockModelCache, get_mock_model, set_mock_model_cache
+>>> cache = MockModelCache()
+>>> set_mock_model_cache(cache)
+>>> test_sig = copy.deepcopy(start_sig)
+>>> model = get_mock_model(test_sig, 'tests', 'TestModel', test_sig['tests']['TestModel'])
+>>> get_mock_model(test_sig, 'tests', 'TestModel', test_sig['tests']['TestModel']) is model
+True
+>>> cache.hits, cache.misses
+(1, 1)
+
+>>> ChangeField('TestModel', 'char_field', max_length=40).simulate('tests', test_sig)
+>>> model = get_mock_model(test_sig, 'tests', 'TestModel', test_sig['tests']['TestModel'])
+>>> model._meta.get_field('char_field').max_length
+40
+>>> cache.hits, cache.misses
+(1, 2)
+
+# The SQL is the same when using the cache.
+>>> test_sig = copy.deepcopy(start_sig)
+>>> AppMutator('tests', test_sig).run_mutations(evolution) == test_sql
+True
+>>> set_mock_model_cache(None)
+
+# Consecutive ALTER TABLE statements on one table are combined on backends
+# that support it, unless they affect the same column.
+>>> from django.db import connection
+>>> from django_evolution.db import mysql, postgresql
+>>> evolver = postgresql.EvolutionOperations(connection)
+>>> for statement in evolver.combine_alter_statements([
+...         'ALTER TABLE "tests_testmodel" ADD COLUMN "added_field" integer NULL ;',
+...         'ALTER TABLE "tests_testmodel" ALTER COLUMN "char_field" SET NOT NULL;',
+...         'ALTER TABLE "tests_testmodel" DROP COLUMN "added_field" CASCADE;',
+...         'ALTER TABLE "tests_testmodel" RENAME COLUMN "int_field" TO "renamed_field";',
+...         'ALTER TABLE "tests_testmodel" DROP COLUMN "int_field2" CASCADE;',
+...         'ALTER TABLE "tests_testmodel" DROP COLUMN "int_field3" CASCADE;',
+...         'ALTER TABLE "tests_othermodel" DROP COLUMN "int_field" CASCADE;',
+...         ('UPDATE "tests_othermodel" SET "value" = %%s WHERE "value" IS NULL;', (1,)),
+...         'ALTER TABLE "tests_othermodel" ALTER COLUMN "value" SET NOT NULL;',
+...     ]):
+...     print statement
+ALTER TABLE "tests_testmodel" ADD COLUMN "added_field" integer NULL, ALTER COLUMN "char_field" SET NOT NULL;
+ALTER TABLE "tests_testmodel" DROP COLUMN "added_field" CASCADE;
+ALTER TABLE "tests_testmodel" RENAME COLUMN "int_field" TO "renamed_field";
+ALTER TABLE "tests_testmodel" DROP COLUMN "int_field2" CASCADE, DROP COLUMN "int_field3" CASCADE;
+ALTER TABLE "tests_othermodel" DROP COLUMN "int_field" CASCADE;
+('UPDATE "tests_othermodel" SET "value" = %%s WHERE "value" IS NULL;', (1,))
+ALTER TABLE "tests_othermodel" ALTER COLUMN "value" SET NOT NULL;
+
+>>> evolver = mysql.EvolutionOperations(connection)
+>>> for statement in evolver.combine_alter_statements([
+...         'ALTER TABLE `tests_testmodel` CHANGE COLUMN `int_field` `renamed_field` integer NOT NULL;',
+...         'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field` varchar(40);',
+...         'ALTER TABLE `tests_testmodel` MODIFY COLUMN `renamed_field` integer NULL;',
+...     ]):
+...     print statement
+ALTER TABLE `tests_testmodel` CHANGE COLUMN `int_field` `renamed_field` integer NOT NULL, MODIFY COLUMN `char_field` varchar(40);
+ALTER TABLE `tests_testmodel` MODIFY COLUMN `renamed_field` integer NULL;
+
+# The sources of each statement, such as the mutations that generated them,
+# are kept track of when combining.
+>>> sql, sources = evolver.combine_alter_statements([
+...         'ALTER TABLE `tests_testmodel` CHANGE COLUMN `int_field` `renamed_field` integer NOT NULL;',
+...         'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field` varchar(40);',
+...         'ALTER TABLE `tests_testmodel` MODIFY COLUMN `renamed_field` integer NULL;',
+...     ], [['rename'], ['change char_field'], ['change renamed_field']])
+>>> sources
+[['rename', 'change char_field'], ['change renamed_field']]
+
+# MySQL can run schema changes with online DDL clauses, falling back to more
+# restrictive ones when the server rejects them.
+>>> evolver = mysql.EvolutionOperations(connection)
+>>> evolver.online_ddl = True
+>>> sql = evolver.apply_online_ddl([
+...     'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field` varchar(40);',
+...     'CREATE INDEX `tests_testmodel_char_field` ON `tests_testmodel` (`char_field`);',
+...     ('UPDATE `tests_testmodel` SET `char_field` = %%s;', ('abc',)),
+... ])
+>>> for statement in sql:
+...     print unicode(statement)
+ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field` varchar(40), ALGORITHM=INPLACE, LOCK=NONE;
+CREATE INDEX `tests_testmodel_char_field` ON `tests_testmodel` (`char_field`) ALGORITHM=INPLACE LOCK=NONE;
+('UPDATE `tests_testmodel` SET `char_field` = %%s;', ('abc',))
+
+>>> class RejectingCursor(object):
+...     def execute(self, sql, params=None):
+...         if 'LOCK=NONE' in sql:
+...             raise Exception(1846, 'LOCK=NONE is not supported.')
+...         print sql
+>>> sql[0].execute(RejectingCursor())
+ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field` varchar(40), ALGORITHM=INPLACE, LOCK=SHARED;
+>>> print sql[0].get_report()
+ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field` varchar(40); -- ALGORITHM=INPLACE, LOCK=SHARED
+
+# MySQL only truncates the values that are too long when shrinking a column,
+# and doesn't truncate anything when widening it.
+>>> from django_evolution.mutations import MockModel
+>>> def mock_model():
+...     return MockModel(start_sig, 'tests', 'TestModel', copy.deepcopy(start_sig['tests']['TestModel']))
+>>> evolver = mysql.EvolutionOperations(connection)
+>>> for statement in evolver.change_max_length(mock_model(), 'char_field', 40):
+...     print statement
+ALTER TABLE "tests_testmodel" MODIFY COLUMN "char_field" varchar(40);
+>>> for statement in evolver.change_max_length(mock_model(), 'char_field', 10):
+...     print statement
+UPDATE "tests_testmodel" SET "char_field"=LEFT("char_field",10) WHERE CHAR_LENGTH("char_field") > 10;
+ALTER TABLE "tests_testmodel" MODIFY COLUMN "char_field" varchar(10);
+
+>>> evolver.backfill_chunk_size = 500
+>>> sql = evolver.change_max_length(mock_model(), 'char_field', 10)
+>>> for statement in sql:
+...     print unicode(statement)
+-- Truncate in ranges of 500 rows of id:
+UPDATE "tests_testmodel" SET "char_field" = LEFT("char_field",10) WHERE CHAR_LENGTH("char_field") > 10 AND "id" >= %%s AND "id" < %%s;
+ALTER TABLE "tests_testmodel" MODIFY COLUMN "char_field" varchar(10);
+
+>>> class RangeCursor(object):
+...     rowcount = 100
+...     def execute(self, sql, params=None):
+...         print sql.split(' FROM ')[0].split(' WHERE ')[0], params
+...     def fetchone(self):
+...         return (3, 1200)
+>>> sql[0].execute(RangeCursor())
+SELECT MIN("id"), MAX("id") None
+UPDATE "tests_testmodel" SET "char_field" = LEFT("char_field",10) (3, 503)
+UPDATE "tests_testmodel" SET "char_field" = LEFT("char_field",10) (503, 1003)
+UPDATE "tests_testmodel" SET "char_field" = LEFT("char_field",10) (1003, 1503)
+>>> sql[0].rowcount
+300
+
+# PostgreSQL can create and drop indexes concurrently, outside of the
+# evolution's transaction.
+>>> connection.ops.postgres_version = (9, 2, 0)
+>>> evolver = postgresql.EvolutionOperations(connection)
+>>> evolver.concurrent_indexes = True
+>>> field = copy.copy(MultipleChangesModel._meta.get_field('added_field'))
+>>> field.db_index = True
+>>> for statement in evolver.create_index(MultipleChangesModel, field):
+...     print unicode(statement)
+...     print statement.index_name
+CREATE INDEX CONCURRENTLY "tests_testmodel_7840e0db" ON "tests_testmodel" ("added_field");
+tests_testmodel_7840e0db
+>>> for statement in evolver.drop_index(MultipleChangesModel, field):
+...     print unicode(statement)
+...     print statement.index_name
+DROP INDEX CONCURRENTLY "tests_testmodel_added_field";
+tests_testmodel_added_field
+
+# The evolution's transaction must be committed before an index is created
+# concurrently.
+>>> statement.execute(connection.cursor())
+Traceback (most recent call last):
+...
+EvolutionException: Indexes can only be created or dropped concurrently if the current transaction can be committed first.
+
+# Indexes can only be dropped concurrently from PostgreSQL 9.2.
+>>> connection.ops.postgres_version = (9, 1, 4)
+>>> evolver.drop_index(MultipleChangesModel, field)
+['DROP INDEX "tests_testmodel_added_field";']
+>>> evolver.create_index(MultipleChangesModel, field)[0].concurrent_drop
+False
+>>> del connection.ops.postgres_version
+
+# SQLite renames and drops columns in place when the library supports it,
+# instead of rebuilding the table.
+>>> from django_evolution.db import sqlite3
+>>> evolution = [
+...     RenameField('TestModel', 'int_field', 'renamed_field'),
+...     DeleteField('TestModel', 'int_field2'),
+... ]
+>>> app_mutator = AppMutator('tests', copy.deepcopy(start_sig))
+>>> app_mutator.evolver = sqlite3.EvolutionOperations(connection)
+>>> app_mutator.evolver.supports_rename_column = True
+>>> app_mutator.evolver.supports_drop_column = True
+>>> for statement in app_mutator.run_mutations(evolution):
+...     print statement
+ALTER TABLE "tests_testmodel" RENAME COLUMN "int_field" TO "renamed_field";
+ALTER TABLE "tests_testmodel" DROP COLUMN "int_field2";
+
+>>> app_mutator = AppMutator('tests', copy.deepcopy(start_sig))
+>>> app_mutator.evolver = sqlite3.EvolutionOperations(connection)
+>>> app_mutator.evolver.supports_rename_column = False
+>>> app_mutator.evolver.supports_drop_column = False
+>>> len([statement for statement in app_mutator.run_mutations(evolution)
+...      if statement.startswith('CREATE TEMPORARY TABLE')])
+1
+
+# Indexes are recreated under the new column's name, and constrained columns
+# still need a rebuild.
+>>> evolver = sqlite3.EvolutionOperations(connection)
+>>> evolver.supports_rename_column = True
+>>> evolver.supports_drop_column = True
+>>> old_field = copy.copy(MutatorBaseModel._meta.get_field('int_field'))
+>>> old_field.db_index = True
+>>> new_field = copy.copy(old_field)
+>>> new_field.column = 'renamed_field'
+>>> for statement in evolver.rename_column_in_place('tests_testmodel', [new_field], old_field, new_field):
+...     print statement
+ALTER TABLE "tests_testmodel" RENAME COLUMN "int_field" TO "renamed_field";
+DROP INDEX IF EXISTS "tests_testmodel_5103e3cc";
+CREATE INDEX "tests_testmodel_b42a4683" ON "tests_testmodel" ("renamed_field");
+
+>>> evolver.can_drop_column(MutatorBaseModel, MutatorBaseModel._meta.get_field('int_field2'))
+True
+>>> evolver.can_drop_column(MutatorBaseModel, MutatorBaseModel._meta.pk)
+False
+>>> evolver.supports_drop_column = False
+>>> evolver.can_drop_column(MutatorBaseModel, MutatorBaseModel._meta.get_field('int_field2'))
+False
+
+# Clean up after the applications that were installed
+>>> deregister_models()
+
+""" % test_sql_mapping('app_mutator')
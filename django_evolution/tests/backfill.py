@@ -0,0 +1,143 @@
+tests = r"""
+>>> from django.db import connection, models
+>>> from django_evolution.db import postgresql
+>>> from django_evolution.db.common import Backfill
+>>> from django_evolution.evolve import execute_evolution_sql
+>>> from django_evolution.models import Version
+>>> from django_evolution.utils import execute_sql, write_sql
+>>> from django_evolution.tests.utils import register_models, deregister_models
+
+>>> cursor = connection.cursor()
+>>> cursor.execute('CREATE TABLE "tests_backfill" ("id" integer NOT NULL PRIMARY KEY, "value" integer NULL);') and None
+>>> for i in range(1, 26):
+...     cursor.execute('INSERT INTO "tests_backfill" ("id", "value") VALUES (%s, NULL);', (i,)) and None
+>>> cursor.execute('UPDATE "tests_backfill" SET "value" = 7 WHERE "id" = 3;') and None
+
+# Initial values can be set in ranges of primary keys, committing after each
+# range.
+>>> backfill = Backfill(connection, 'tests_backfill', 'id', 'value', 42, 10)
+>>> print unicode(backfill)
+-- Backfill in ranges of 10 rows of id:
+UPDATE "tests_backfill" SET "value" = %s WHERE "value" IS NULL AND "id" >= %s AND "id" < %s;
+
+# The SQL written for a backfill updates all the rows at once, as the ranges
+# aren't known until it's executed.
+>>> write_sql([backfill], 'default')
+UPDATE "tests_backfill" SET "value" = 42 WHERE "value" IS NULL;
+
+# Commits are told how many of the statements have been completed.
+>>> commits = []
+>>> execute_sql(cursor, ['SELECT 1;', backfill], commits.append)
+>>> commits
+[1, 1, 1]
+>>> cursor.execute('SELECT "value", COUNT(*) FROM "tests_backfill" GROUP BY "value" ORDER BY "value";') and None
+>>> cursor.fetchall()
+[(7, 1), (42, 24)]
+
+# Running a backfill again starts at the first row still missing a value
+>>> cursor.execute('UPDATE "tests_backfill" SET "value" = NULL WHERE "id" > 20;') and None
+>>> commits = []
+>>> execute_sql(cursor, [backfill], commits.append)
+>>> len(commits)
+1
+>>> cursor.execute('SELECT COUNT(*) FROM "tests_backfill" WHERE "value" IS NULL;') and None
+>>> cursor.fetchone()
+(0,)
+
+# When an evolution is interrupted partway through a backfill, a checkpoint
+# records the statements that were committed before it.
+>>> class InterruptingCursor(object):
+...     def __init__(self, cursor, updates):
+...         self.cursor = cursor
+...         self.updates = updates
+...     def execute(self, sql, params=()):
+...         if sql.startswith('UPDATE'):
+...             if not self.updates:
+...                 raise Exception('Interrupted')
+...             self.updates -= 1
+...         return self.cursor.execute(sql, params)
+...     def __getattr__(self, name):
+...         return getattr(self.cursor, name)
+
+>>> base_version = Version()
+>>> base_version.set_signature({'__version__': 1})
+>>> base_version.save()
+>>> sql = [
+...     'ALTER TABLE "tests_backfill" ADD COLUMN "extra" integer NULL;',
+...     Backfill(connection, 'tests_backfill', 'id', 'extra', 5, 10),
+...     'UPDATE "tests_backfill" SET "value" = "extra";',
+... ]
+>>> execute_evolution_sql(InterruptingCursor(cursor, 2), sql, 'default', base_version, lambda: None)
+Traceback (most recent call last):
+...
+Exception: Interrupted
+
+>>> checkpoint_version = Version.objects.get(pk__gt=base_version.pk)
+>>> checkpoint_version.get_checkpoint()['completed']
+1
+>>> checkpoint_version.get_signature()
+{'__version__': 1}
+>>> cursor.execute('SELECT COUNT(*) FROM "tests_backfill" WHERE "extra" IS NULL;') and None
+>>> cursor.fetchone()
+(5,)
+
+# Running the same evolution again skips the column that was added, and
+# resumes the backfill with the rows that weren't updated.
+>>> commits = []
+>>> execute_evolution_sql(cursor, sql, 'default', checkpoint_version, lambda: commits.append(True))
+1
+>>> len(commits)
+1
+>>> cursor.execute('SELECT "value", COUNT(*) FROM "tests_backfill" GROUP BY "value";') and None
+>>> cursor.fetchall()
+[(5, 25)]
+
+# An interrupted evolution isn't resumed with different SQL.
+>>> execute_evolution_sql(cursor, sql[:2], 'default', checkpoint_version, lambda: None)
+Traceback (most recent call last):
+...
+EvolutionException: An earlier evolution of this database was interrupted after committing 1 statement(s), and the evolution has changed since. The rest of the earlier evolution must be applied by hand.
+
+# Adding a baseline version for new models during syncdb keeps the
+# checkpoint, so the interrupted evolution can still be resumed.
+>>> from django_evolution import models as evolution_app
+>>> from django_evolution.management import evolution
+>>> from django_evolution.signature import create_project_sig
+>>> proj_sig = create_project_sig('default').copy()
+>>> del proj_sig['sessions']['Session']
+>>> checkpoint_version.set_signature(proj_sig, None, checkpoint_version.get_checkpoint())
+>>> checkpoint_version.save()
+>>> evolution(evolution_app, set(), verbosity=0, db='default')
+>>> baseline_version = Version.objects.latest('when')
+>>> baseline_version.pk > checkpoint_version.pk
+True
+>>> 'Session' in baseline_version.get_signature()['sessions']
+True
+>>> baseline_version.get_checkpoint() == checkpoint_version.get_checkpoint()
+True
+
+>>> Version.objects.filter(pk__gte=base_version.pk).delete()
+
+>>> cursor.execute('DROP TABLE "tests_backfill";') and None
+
+# Evolvers backfill initial values when backfill_chunk_size is set
+>>> class BackfillModel(models.Model):
+...     value = models.IntegerField(null=True)
+
+>>> start = register_models(('TestModel', BackfillModel))
+>>> evolver = postgresql.EvolutionOperations(connection)
+>>> field = BackfillModel._meta.get_field('value')
+>>> evolver.set_initial_value(BackfillModel, field, 42)
+[('UPDATE "tests_testmodel" SET "value" = %s WHERE "value" IS NULL;', (42,))]
+
+>>> evolver.backfill_chunk_size = 1000
+>>> for statement in evolver.change_null(BackfillModel, 'value', False, 42):
+...     print unicode(statement)
+-- Backfill in ranges of 1000 rows of id:
+UPDATE "tests_testmodel" SET "value" = %s WHERE "value" IS NULL AND "id" >= %s AND "id" < %s;
+ALTER TABLE "tests_testmodel" ALTER COLUMN "value" SET NOT NULL;
+
+# Clean up after the applications that were installed
+>>> deregister_models()
+
+"""
@@ -146,13 +146,10 @@ change_field = {
     "SetNullChangeModel": 'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field2` varchar(30) DEFAULT NULL;',
     "NoOpChangeModel": '',
     'IncreasingMaxLengthChangeModel':
-            '\n'.join([
-                'UPDATE `tests_testmodel` SET `char_field`=LEFT(`char_field`,45);',
-                'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field` varchar(45);',
-            ]),
+            'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field` varchar(45);',
     'DecreasingMaxLengthChangeModel':
             '\n'.join([
-                'UPDATE `tests_testmodel` SET `char_field`=LEFT(`char_field`,1);',
+                'UPDATE `tests_testmodel` SET `char_field`=LEFT(`char_field`,1) WHERE CHAR_LENGTH(`char_field`) > 1;',
                 'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field` varchar(1);',
             ]),
     "DBColumnChangeModel": 'ALTER TABLE `tests_testmodel` CHANGE COLUMN `custom_db_column` `customised_db_column` integer NOT NULL;',
@@ -167,12 +164,10 @@ change_field = {
         '\n'.join([
             'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field2` varchar(30) DEFAULT NULL;',
             'ALTER TABLE `tests_testmodel` CHANGE COLUMN `custom_db_column` `custom_db_column2` integer NOT NULL;',
-            'UPDATE `tests_testmodel` SET `char_field`=LEFT(`char_field`,35);',
             'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field` varchar(35);',
         ]),
     "MultiAttrSingleFieldChangeModel":
         '\n'.join([
-            'UPDATE `tests_testmodel` SET `char_field2`=LEFT(`char_field2`,35);',
             'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field2` varchar(35);',
             'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field2` varchar(35) DEFAULT NULL;',
         ]),
@@ -180,7 +175,6 @@ change_field = {
         '\n'.join([
             'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field2` varchar(30) DEFAULT NULL;',
             'ALTER TABLE `tests_testmodel` CHANGE COLUMN `custom_db_column` `custom_db_column3` integer NOT NULL;',
-            'UPDATE `tests_testmodel` SET `char_field`=LEFT(`char_field`,35);',
             'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field` varchar(35);',
         ]),
 }
@@ -271,3 +265,19 @@ inheritance = {
     'DeleteFromChildModel':
         'ALTER TABLE `tests_childmodel` DROP COLUMN `int_field` CASCADE;',
 }
+
+app_mutator = {
+    'MultipleChangesModel':
+        '\n'.join([
+            'ALTER TABLE `tests_testmodel` ADD COLUMN `added_field` integer ;',
+            'UPDATE `tests_testmodel` SET `added_field` = 42 WHERE `added_field` IS NULL;',
+            'ALTER TABLE `tests_testmodel` MODIFY COLUMN `added_field` integer NOT NULL, MODIFY COLUMN `char_field` varchar(40);',
+            'UPDATE `tests_testmodel` SET `char_field2` = \'abc\' WHERE `char_field2` IS NULL;',
+            'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field2` varchar(30) NOT NULL, CHANGE COLUMN `int_field` `renamed_field` integer NOT NULL, DROP COLUMN `int_field2` CASCADE;',
+        ]),
+    'MultiAttrChangeModel':
+        '\n'.join([
+            'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field` varchar(40);',
+            'ALTER TABLE `tests_testmodel` MODIFY COLUMN `char_field` varchar(40) DEFAULT NULL;',
+        ]),
+}
@@ -322,3 +322,21 @@ inheritance = {
     'DeleteFromChildModel':
         'ALTER TABLE "tests_childmodel" DROP COLUMN "int_field" CASCADE;',
 }
+
+app_mutator = {
+    'MultipleChangesModel':
+        '\n'.join([
+            'ALTER TABLE "tests_testmodel" ADD COLUMN "added_field" integer ;',
+            'UPDATE "tests_testmodel" SET "added_field" = 42 WHERE "added_field" IS NULL;',
+            'ALTER TABLE "tests_testmodel" ALTER COLUMN "added_field" SET NOT NULL, ALTER COLUMN "char_field" TYPE varchar(40) USING CAST("char_field" as varchar(40));',
+            'UPDATE "tests_testmodel" SET "char_field2" = \'abc\' WHERE "char_field2" IS NULL;',
+            'ALTER TABLE "tests_testmodel" ALTER COLUMN "char_field2" SET NOT NULL;',
+            'ALTER TABLE "tests_testmodel" RENAME COLUMN "int_field" TO "renamed_field";',
+            'ALTER TABLE "tests_testmodel" DROP COLUMN "int_field2" CASCADE;',
+        ]),
+    'MultiAttrChangeModel':
+        '\n'.join([
+            'ALTER TABLE "tests_testmodel" ALTER COLUMN "char_field" TYPE varchar(40) USING CAST("char_field" as varchar(40));',
+            'ALTER TABLE "tests_testmodel" ALTER COLUMN "char_field" DROP NOT NULL;',
+        ]),
+}
@@ -1,4 +1,5 @@
 from django.db import connection
+from django.db.backends.sqlite3.base import Database
 from django.db.models.options import Options
 
 
@@ -8,6 +9,11 @@ autocreate_through_tables = hasattr(Options({}), 'auto_created')
 # tables (Django 1.2), so we use it.
 digest_index_names = hasattr(Options({}), 'auto_created')
 
+# Columns are renamed and dropped in place on versions of SQLite that
+# support it, rather than by rebuilding the table.
+native_rename_column = Database.sqlite_version_info >= (3, 25, 0)
+native_drop_column = Database.sqlite_version_info >= (3, 35, 0)
+
 
 def generate_index_name(table, column):
     if digest_index_names:
@@ -282,6 +288,16 @@ delete_field = {
         ]),
 }
 
+if native_drop_column:
+    delete_field.update({
+        'DefaultNamedColumnModel':
+            'ALTER TABLE "tests_testmodel" DROP COLUMN "int_field";',
+        'NonDefaultNamedColumnModel':
+            'ALTER TABLE "tests_testmodel" DROP COLUMN "non-default_db_column";',
+        'DeleteColumnCustomTableModel':
+            'ALTER TABLE "custom_table_name" DROP COLUMN "value";',
+    })
+
 change_field = {
     "SetNotNullChangeModelWithConstant":
         '\n'.join([
@@ -428,6 +444,44 @@ change_field = {
         ]),
 }
 
+if native_rename_column:
+    change_field.update({
+        "DBColumnChangeModel":
+            'ALTER TABLE "tests_testmodel" RENAME COLUMN "custom_db_column" TO "customised_db_column";',
+        "MultiAttrChangeModel":
+            '\n'.join([
+                'CREATE TEMPORARY TABLE "TEMP_TABLE"("int_field4" integer NULL, "custom_db_column" integer NULL, "int_field1" integer NULL, "int_field2" integer NULL, "int_field3" integer NULL UNIQUE, "alt_pk" integer NULL, "char_field" varchar(20) NULL, "my_id" integer NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "TEMP_TABLE" ("int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "tests_testmodel";',
+                'DROP TABLE "tests_testmodel";',
+                'CREATE TABLE "tests_testmodel"("int_field4" integer NOT NULL, "custom_db_column" integer NOT NULL, "int_field1" integer NOT NULL, "int_field2" integer NOT NULL, "int_field3" integer NOT NULL UNIQUE, "alt_pk" integer NOT NULL, "char_field" varchar(20) NOT NULL, "my_id" integer NOT NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "tests_testmodel" ("int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "TEMP_TABLE";',
+                'DROP TABLE "TEMP_TABLE";',
+                'ALTER TABLE "tests_testmodel" RENAME COLUMN "custom_db_column" TO "custom_db_column2";',
+                'CREATE TEMPORARY TABLE "TEMP_TABLE"("int_field4" integer NULL, "custom_db_column2" integer NULL, "int_field1" integer NULL, "int_field2" integer NULL, "int_field3" integer NULL UNIQUE, "alt_pk" integer NULL, "char_field" varchar(35) NULL, "my_id" integer NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "TEMP_TABLE" ("int_field4", "custom_db_column2", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column2", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "tests_testmodel";',
+                'DROP TABLE "tests_testmodel";',
+                'CREATE TABLE "tests_testmodel"("int_field4" integer NOT NULL, "custom_db_column2" integer NOT NULL, "int_field1" integer NOT NULL, "int_field2" integer NOT NULL, "int_field3" integer NOT NULL UNIQUE, "alt_pk" integer NOT NULL, "char_field" varchar(35) NOT NULL, "my_id" integer NOT NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "tests_testmodel" ("int_field4", "custom_db_column2", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column2", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "TEMP_TABLE";',
+                'DROP TABLE "TEMP_TABLE";',
+            ]),
+        "RedundantAttrsChangeModel":
+            '\n'.join([
+                'CREATE TEMPORARY TABLE "TEMP_TABLE"("int_field4" integer NULL, "custom_db_column" integer NULL, "int_field1" integer NULL, "int_field2" integer NULL, "int_field3" integer NULL UNIQUE, "alt_pk" integer NULL, "char_field" varchar(20) NULL, "my_id" integer NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "TEMP_TABLE" ("int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "tests_testmodel";',
+                'DROP TABLE "tests_testmodel";',
+                'CREATE TABLE "tests_testmodel"("int_field4" integer NOT NULL, "custom_db_column" integer NOT NULL, "int_field1" integer NOT NULL, "int_field2" integer NOT NULL, "int_field3" integer NOT NULL UNIQUE, "alt_pk" integer NOT NULL, "char_field" varchar(20) NOT NULL, "my_id" integer NOT NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "tests_testmodel" ("int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "TEMP_TABLE";',
+                'DROP TABLE "TEMP_TABLE";',
+                'ALTER TABLE "tests_testmodel" RENAME COLUMN "custom_db_column" TO "custom_db_column3";',
+                'CREATE TEMPORARY TABLE "TEMP_TABLE"("int_field4" integer NULL, "custom_db_column3" integer NULL, "int_field1" integer NULL, "int_field2" integer NULL, "int_field3" integer NULL UNIQUE, "alt_pk" integer NULL, "char_field" varchar(35) NULL, "my_id" integer NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "TEMP_TABLE" ("int_field4", "custom_db_column3", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column3", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "tests_testmodel";',
+                'DROP TABLE "tests_testmodel";',
+                'CREATE TABLE "tests_testmodel"("int_field4" integer NOT NULL, "custom_db_column3" integer NOT NULL, "int_field1" integer NOT NULL, "int_field2" integer NOT NULL, "int_field3" integer NOT NULL UNIQUE, "alt_pk" integer NOT NULL, "char_field" varchar(35) NOT NULL, "my_id" integer NOT NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "tests_testmodel" ("int_field4", "custom_db_column3", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column3", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "TEMP_TABLE";',
+                'DROP TABLE "TEMP_TABLE";',
+            ]),
+    })
+
 multi_db = {
     "SetNotNullChangeModelWithConstant":
         '\n'.join([
@@ -572,8 +626,55 @@ multi_db = {
             'INSERT INTO "tests_testmodel" ("int_field4", "custom_db_column3", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column3", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "TEMP_TABLE";',
             'DROP TABLE "TEMP_TABLE";',
         ]),
+    'EvolveAllDatabases':
+        '\n'.join([
+            'CREATE TEMPORARY TABLE "TEMP_TABLE"("label" varchar(100) NULL, "version_id" integer NULL, "id" integer NULL UNIQUE PRIMARY KEY, "app_label" varchar(200) NULL);',
+            'INSERT INTO "TEMP_TABLE" ("label", "version_id", "id", "app_label") SELECT "label", "version_id", "id", "app_label" FROM "django_evolution";',
+            'DROP TABLE "django_evolution";',
+            'CREATE TABLE "django_evolution"("label" varchar(100) NOT NULL, "version_id" integer NOT NULL, "id" integer NOT NULL UNIQUE PRIMARY KEY, "app_label" varchar(200) NOT NULL);',
+            'INSERT INTO "django_evolution" ("label", "version_id", "id", "app_label") SELECT "label", "version_id", "id", "app_label" FROM "TEMP_TABLE";',
+            'DROP TABLE "TEMP_TABLE";',
+        ]),
 }
 
+if native_rename_column:
+    multi_db.update({
+        "DBColumnChangeModel":
+            'ALTER TABLE "tests_testmodel" RENAME COLUMN "custom_db_column" TO "customised_db_column";',
+        "MultiAttrChangeModel":
+            '\n'.join([
+                'CREATE TEMPORARY TABLE "TEMP_TABLE"("int_field4" integer NULL, "custom_db_column" integer NULL, "int_field1" integer NULL, "int_field2" integer NULL, "int_field3" integer NULL UNIQUE, "alt_pk" integer NULL, "char_field" varchar(20) NULL, "my_id" integer NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "TEMP_TABLE" ("int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "tests_testmodel";',
+                'DROP TABLE "tests_testmodel";',
+                'CREATE TABLE "tests_testmodel"("int_field4" integer NOT NULL, "custom_db_column" integer NOT NULL, "int_field1" integer NOT NULL, "int_field2" integer NOT NULL, "int_field3" integer NOT NULL UNIQUE, "alt_pk" integer NOT NULL, "char_field" varchar(20) NOT NULL, "my_id" integer NOT NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "tests_testmodel" ("int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "TEMP_TABLE";',
+                'DROP TABLE "TEMP_TABLE";',
+                'ALTER TABLE "tests_testmodel" RENAME COLUMN "custom_db_column" TO "custom_db_column2";',
+                'CREATE TEMPORARY TABLE "TEMP_TABLE"("int_field4" integer NULL, "custom_db_column2" integer NULL, "int_field1" integer NULL, "int_field2" integer NULL, "int_field3" integer NULL UNIQUE, "alt_pk" integer NULL, "char_field" varchar(35) NULL, "my_id" integer NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "TEMP_TABLE" ("int_field4", "custom_db_column2", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column2", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "tests_testmodel";',
+                'DROP TABLE "tests_testmodel";',
+                'CREATE TABLE "tests_testmodel"("int_field4" integer NOT NULL, "custom_db_column2" integer NOT NULL, "int_field1" integer NOT NULL, "int_field2" integer NOT NULL, "int_field3" integer NOT NULL UNIQUE, "alt_pk" integer NOT NULL, "char_field" varchar(35) NOT NULL, "my_id" integer NOT NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "tests_testmodel" ("int_field4", "custom_db_column2", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column2", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "TEMP_TABLE";',
+                'DROP TABLE "TEMP_TABLE";',
+            ]),
+        "RedundantAttrsChangeModel":
+            '\n'.join([
+                'CREATE TEMPORARY TABLE "TEMP_TABLE"("int_field4" integer NULL, "custom_db_column" integer NULL, "int_field1" integer NULL, "int_field2" integer NULL, "int_field3" integer NULL UNIQUE, "alt_pk" integer NULL, "char_field" varchar(20) NULL, "my_id" integer NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "TEMP_TABLE" ("int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "tests_testmodel";',
+                'DROP TABLE "tests_testmodel";',
+                'CREATE TABLE "tests_testmodel"("int_field4" integer NOT NULL, "custom_db_column" integer NOT NULL, "int_field1" integer NOT NULL, "int_field2" integer NOT NULL, "int_field3" integer NOT NULL UNIQUE, "alt_pk" integer NOT NULL, "char_field" varchar(20) NOT NULL, "my_id" integer NOT NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "tests_testmodel" ("int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "TEMP_TABLE";',
+                'DROP TABLE "TEMP_TABLE";',
+                'ALTER TABLE "tests_testmodel" RENAME COLUMN "custom_db_column" TO "custom_db_column3";',
+                'CREATE TEMPORARY TABLE "TEMP_TABLE"("int_field4" integer NULL, "custom_db_column3" integer NULL, "int_field1" integer NULL, "int_field2" integer NULL, "int_field3" integer NULL UNIQUE, "alt_pk" integer NULL, "char_field" varchar(35) NULL, "my_id" integer NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "TEMP_TABLE" ("int_field4", "custom_db_column3", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column3", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "tests_testmodel";',
+                'DROP TABLE "tests_testmodel";',
+                'CREATE TABLE "tests_testmodel"("int_field4" integer NOT NULL, "custom_db_column3" integer NOT NULL, "int_field1" integer NOT NULL, "int_field2" integer NOT NULL, "int_field3" integer NOT NULL UNIQUE, "alt_pk" integer NOT NULL, "char_field" varchar(35) NOT NULL, "my_id" integer NOT NULL UNIQUE PRIMARY KEY, "char_field1" varchar(25) NULL, "char_field2" varchar(30) NULL);',
+                'INSERT INTO "tests_testmodel" ("int_field4", "custom_db_column3", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2") SELECT "int_field4", "custom_db_column3", "int_field1", "int_field2", "int_field3", "alt_pk", "char_field", "my_id", "char_field1", "char_field2" FROM "TEMP_TABLE";',
+                'DROP TABLE "TEMP_TABLE";',
+            ]),
+    })
+
 delete_model = {
     'BasicModel':
         'DROP TABLE "tests_basicmodel";',
@@ -712,6 +813,32 @@ rename_field = {
         'ALTER TABLE "non-default_db_table" RENAME TO "tests_testmodel_renamed_field";',
 }
 
+if native_rename_column:
+    rename_field.update({
+        'RenameColumnModel':
+            'ALTER TABLE "tests_testmodel" RENAME COLUMN "int_field" TO "renamed_field";',
+        'RenameColumnWithTableNameModel':
+            'ALTER TABLE "tests_testmodel" RENAME COLUMN "int_field" TO "renamed_field";',
+        'RenamePrimaryKeyColumnModel':
+            'ALTER TABLE "tests_testmodel" RENAME COLUMN "id" TO "my_pk_id";',
+        'RenameForeignKeyColumnModel':
+            '\n'.join([
+                'ALTER TABLE "tests_testmodel" RENAME COLUMN "fk_field_id" TO "renamed_field_id";',
+                'DROP INDEX IF EXISTS "%s";'
+                % generate_index_name('tests_testmodel', 'fk_field_id'),
+                'CREATE INDEX "%s" ON "tests_testmodel" ("renamed_field_id");'
+                % generate_index_name('tests_testmodel', 'renamed_field_id'),
+            ]),
+        'RenameNonDefaultColumnNameModel':
+            'ALTER TABLE "tests_testmodel" RENAME COLUMN "custom_db_col_name" TO "renamed_field";',
+        'RenameNonDefaultColumnNameToNonDefaultNameModel':
+            'ALTER TABLE "tests_testmodel" RENAME COLUMN "custom_db_col_name" TO "non-default_column_name";',
+        'RenameNonDefaultColumnNameToNonDefaultNameAndTableModel':
+            'ALTER TABLE "tests_testmodel" RENAME COLUMN "custom_db_col_name" TO "non-default_column_name2";',
+        'RenameColumnCustomTableModel':
+            'ALTER TABLE "custom_rename_table_name" RENAME COLUMN "value" TO "renamed_field";',
+    })
+
 sql_mutation = {
     'SQLMutationSequence': """[
 ...    SQLMutation('first-two-fields', [
@@ -746,6 +873,12 @@ generics = {
         ])
 }
 
+if native_drop_column:
+    generics.update({
+        'DeleteColumnModel':
+            'ALTER TABLE "tests_testmodel" DROP COLUMN "char_field";',
+    })
+
 inheritance = {
     'AddToChildModel':
         '\n'.join([
@@ -767,3 +900,32 @@ inheritance = {
             'DROP TABLE "TEMP_TABLE";'
         ])
 }
+
+if native_drop_column:
+    inheritance.update({
+        'DeleteFromChildModel':
+            'ALTER TABLE "tests_childmodel" DROP COLUMN "int_field";',
+    })
+
+app_mutator = {
+    'MultipleChangesModel':
+        '\n'.join([
+            'CREATE TEMPORARY TABLE "TEMP_TABLE"("char_field" varchar(40) NULL, "renamed_field" integer NULL, "added_field" integer NULL, "char_field2" varchar(30) NULL, "id" integer NULL UNIQUE PRIMARY KEY);',
+            'INSERT INTO "TEMP_TABLE" ("char_field", "renamed_field", "char_field2", "id") SELECT "char_field", "int_field", "char_field2", "id" FROM "tests_testmodel";',
+            'UPDATE "TEMP_TABLE" SET "added_field" = 42;',
+            'UPDATE "TEMP_TABLE" SET "char_field2" = \'abc\' WHERE "char_field2" IS NULL;',
+            'DROP TABLE "tests_testmodel";',
+            'CREATE TABLE "tests_testmodel"("char_field" varchar(40) NOT NULL, "renamed_field" integer NOT NULL, "added_field" integer NOT NULL, "char_field2" varchar(30) NOT NULL, "id" integer NOT NULL UNIQUE PRIMARY KEY);',
+            'INSERT INTO "tests_testmodel" ("char_field", "renamed_field", "added_field", "char_field2", "id") SELECT "char_field", "renamed_field", "added_field", "char_field2", "id" FROM "TEMP_TABLE";',
+            'DROP TABLE "TEMP_TABLE";',
+        ]),
+    'MultiAttrChangeModel':
+        '\n'.join([
+            'CREATE TEMPORARY TABLE "TEMP_TABLE"("char_field2" varchar(30) NULL, "int_field" integer NULL, "id" integer NULL UNIQUE PRIMARY KEY, "int_field2" integer NULL, "char_field" varchar(40) NULL);',
+            'INSERT INTO "TEMP_TABLE" ("char_field2", "int_field", "id", "int_field2", "char_field") SELECT "char_field2", "int_field", "id", "int_field2", "char_field" FROM "tests_testmodel";',
+            'DROP TABLE "tests_testmodel";',
+            'CREATE TABLE "tests_testmodel"("char_field2" varchar(30) NULL, "int_field" integer NOT NULL, "id" integer NOT NULL UNIQUE PRIMARY KEY, "int_field2" integer NOT NULL, "char_field" varchar(40) NULL);',
+            'INSERT INTO "tests_testmodel" ("char_field2", "int_field", "id", "int_field2", "char_field") SELECT "char_field2", "int_field", "id", "int_field2", "char_field" FROM "TEMP_TABLE";',
+            'DROP TABLE "TEMP_TABLE";',
+        ]),
+}
@@ -0,0 +1,78 @@
+tests = r"""
+>>> from django.db import connection
+>>> from django_evolution.db import get_evolver, postgresql, reset_evolvers
+>>> from django_evolution.evolve import get_applied_evolutions, save_evolutions
+>>> from django_evolution.models import Evolution, Version
+
+# Evolvers are created once per database, and reused until they're reset
+>>> evolver = get_evolver('default')
+>>> get_evolver('default') is evolver
+True
+>>> reset_evolvers()
+>>> get_evolver('default') is evolver
+False
+
+# Rows are inserted in batches, with several rows per statement
+>>> evolver = postgresql.EvolutionOperations(connection)
+>>> for statement in evolver.insert_rows('tests_table', ['a', 'b'], [(1, 2), (3, 4), (5, 6)]):
+...     print statement
+('INSERT INTO "tests_table" ("a", "b") VALUES (%s, %s), (%s, %s), (%s, %s);', (1, 2, 3, 4, 5, 6))
+
+>>> evolver.supports_multi_row_insert = False
+>>> for statement in evolver.insert_rows('tests_table', ['a', 'b'], [(1, 2), (3, 4)]):
+...     print statement
+('INSERT INTO "tests_table" ("a", "b") VALUES (%s, %s);', (1, 2))
+('INSERT INTO "tests_table" ("a", "b") VALUES (%s, %s);', (3, 4))
+
+# Evolutions are saved in bulk, and loaded for every application at once
+>>> version = Version()
+>>> version.set_signature({'__version__': 1})
+>>> version.save()
+>>> evolutions = [Evolution(app_label='tests', label='evolution_%d' % i, version=version) for i in range(250)]
+>>> evolutions.append(Evolution(app_label='other_tests', label='evolution_0', version=version))
+>>> save_evolutions(evolutions, 'default')
+>>> Evolution.objects.filter(version=version).count()
+251
+
+>>> applied = get_applied_evolutions('default')
+>>> len(applied['tests'])
+250
+>>> 'evolution_249' in applied['tests']
+True
+>>> get_applied_evolutions('default', ['other_tests'])
+{u'other_tests': set([u'evolution_0'])}
+
+>>> Evolution.objects.filter(version=version).delete()
+>>> version.delete()
+
+# syncdb's state is computed once per run, as every application's
+# post_syncdb signal passes the same created_models set.
+>>> from django.contrib.contenttypes import models as contenttypes_app
+>>> from django_evolution import management
+>>> create_project_sig = management.create_project_sig
+>>> sig_dbs = []
+>>> def counting_create_project_sig(db):
+...     sig_dbs.append(db)
+...     return create_project_sig(db)
+>>> management.create_project_sig = counting_create_project_sig
+
+>>> created_models = set()
+>>> management.evolution(contenttypes_app, created_models, verbosity=0, db='default')
+>>> state = management.get_syncdb_state(created_models, 'default')
+>>> management.evolution(contenttypes_app, created_models, verbosity=0, db='default')
+>>> management.get_syncdb_state(created_models, 'default') is state
+True
+>>> sig_dbs
+['default']
+
+# A new run, with a new created_models set, computes the state again.
+>>> management.evolution(contenttypes_app, set(), verbosity=0, db='default')
+>>> management._syncdb_states['default'] is state
+False
+>>> sig_dbs
+['default', 'default']
+
+>>> management.create_project_sig = create_project_sig
+>>> management._syncdb_states.clear()
+
+"""
@@ -681,7 +681,117 @@ True
 >>> d.is_empty()
 True
 
+# Each model is only routed once during an evolution, and mutations on models
+# routed to another database are discarded without building MockModels.
+>>> from django_evolution.mutations import MockModelCache, RoutingCache, set_mock_model_cache, set_routing_cache
+>>> mock_model_cache = MockModelCache()
+>>> set_mock_model_cache(mock_model_cache)
+>>> routing_cache = RoutingCache()
+>>> set_routing_cache(routing_cache)
+
+>>> ChangeField('TestModel', 'char_field', max_length=30).is_mutable('tests', start_sig, 'default')
+True
+>>> ChangeField('TestModel', 'char_field', max_length=30).is_mutable('tests', start_sig, 'db_multi')
+False
+>>> ChangeField('TestModel', 'int_field1', db_index=False).is_mutable('tests', start_sig, 'db_multi')
+False
+>>> routing_cache.hits, routing_cache.misses
+(2, 1)
+>>> mock_model_cache.misses
+0
+
+>>> set_routing_cache(None)
+
+# The caches are only used by the thread that set them, so that databases
+# can be evolved side by side.
+>>> import threading
+>>> from django_evolution.mutations import get_mock_model_cache
+>>> thread_caches = []
+>>> thread = threading.Thread(target=lambda: thread_caches.append(get_mock_model_cache()))
+>>> thread.start()
+>>> thread.join()
+>>> thread_caches
+[None]
+>>> get_mock_model_cache() is mock_model_cache
+True
+
+>>> set_mock_model_cache(None)
+
+# Databases that the router treats the same share one project signature.
+>>> from django.db import router
+>>> from django_evolution.signature import create_project_sigs
+>>> proj_sigs = create_project_sigs(['default', 'db_multi'])
+>>> proj_sigs['default'] is proj_sigs['db_multi']
+True
+
+>>> class DefaultOnlyRouter(object):
+...     def allow_syncdb(self, db, model):
+...         return db == 'default'
+
+>>> old_routers = router.routers
+>>> router.routers = [DefaultOnlyRouter()]
+>>> proj_sigs = create_project_sigs(['default', 'db_multi'])
+>>> proj_sigs['default'] is proj_sigs['db_multi']
+False
+>>> len(proj_sigs['default']['django_evolution'])
+2
+>>> len(proj_sigs['db_multi']['django_evolution'])
+0
+>>> router.routers = old_routers
+
 # Clean up after the applications that were installed
 >>> deregister_models('tests')
 
+# Every database can be evolved at once, with the output for each database
+# shown in its own section, followed by the results.
+>>> import sys
+>>> from django.core.management import call_command
+>>> from django_evolution.models import Evolution, Version
+>>> evolve_options = dict(all_databases=True, hint=True, compile_sql=True, verbosity=1, interactive=False)
+>>> changed_sig = Version.objects.using('default').latest('when').get_signature()
+>>> changed_sig['django_evolution']['Evolution']['fields']['label']['max_length'] = 50
+>>> changed_version = Version()
+>>> changed_version.set_signature(changed_sig)
+>>> changed_version.save(using='default')
+>>> call_command('evolve', **evolve_options) # doctest: +ELLIPSIS
+#----- Database db_multi
+No evolution required.
+#----- Database default
+-- Evolve application django_evolution
+%(EvolveAllDatabases)s
+<BLANKLINE>
+Results:
+    db_multi: no evolution required (... seconds)
+    default: evolution required (... seconds)
+
+# A database that fails to evolve is reported, while the others still
+# complete.
+>>> multi_versions = list(Version.objects.using('db_multi').all())
+>>> multi_evolutions = list(Evolution.objects.using('db_multi').all())
+>>> Version.objects.using('db_multi').all().delete()
+>>> old_stderr = sys.stderr
+>>> sys.stderr = sys.stdout
+>>> try:
+...     call_command('evolve', **evolve_options) # doctest: +ELLIPSIS
+... except SystemExit:
+...     print 'Exited'
+#----- Database db_multi
+Can't evolve yet. Need to set an evolution baseline.
+#----- Database default
+-- Evolve application django_evolution
+%(EvolveAllDatabases)s
+<BLANKLINE>
+Results:
+    db_multi: failed (... seconds)
+    default: evolution required (... seconds)
+Error: Evolution failed for the 'db_multi' database(s).
+Exited
+>>> sys.stderr = old_stderr
+
+>>> for version in multi_versions:
+...     version.save(using='db_multi')
+>>> for evolution in multi_evolutions:
+...     evolution.save(using='db_multi')
+>>> changed_version.delete()
+
 """ % test_sql_mapping('multi_db', db_name='db_multi')
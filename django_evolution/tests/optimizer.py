@@ -0,0 +1,117 @@
+tests = r"""
+>>> from django.db import models
+
+>>> from django_evolution.mutations import AddField, ChangeField, DeleteField, DeleteModel, RenameField, SQLMutation
+>>> from django_evolution.optimizer import optimize_mutations
+>>> from django_evolution.tests.utils import test_proj_sig, register_models, deregister_models
+>>> from django_evolution.diff import Diff
+
+>>> import copy
+
+>>> class OptimizerBaseModel(models.Model):
+...     char_field = models.CharField(max_length=20)
+...     int_field = models.IntegerField()
+...     int_field2 = models.IntegerField()
+
+>>> class OptimizerOtherModel(models.Model):
+...     value = models.IntegerField()
+
+# Store the base signatures
+>>> start = register_models(('TestModel', OptimizerBaseModel), ('OtherModel', OptimizerOtherModel))
+>>> start_sig = test_proj_sig(('TestModel', OptimizerBaseModel), ('OtherModel', OptimizerOtherModel))
+
+# Adding and then deleting a field cancels out
+>>> mutations = optimize_mutations('tests', [
+...     AddField('TestModel', 'added_field', models.IntegerField, null=True),
+...     ChangeField('TestModel', 'char_field', max_length=30),
+...     DeleteField('TestModel', 'added_field'),
+... ], start_sig)
+>>> print [str(m) for m in mutations]
+["ChangeField('TestModel', 'char_field', initial=None, max_length=30)"]
+
+# Chained renames are merged
+>>> mutations = optimize_mutations('tests', [
+...     RenameField('TestModel', 'int_field', 'renamed_field'),
+...     RenameField('TestModel', 'renamed_field', 'renamed_field2', db_column='renamed_column'),
+... ], start_sig)
+>>> print [str(m) for m in mutations]
+["RenameField('TestModel', 'int_field', 'renamed_field2', db_column='renamed_column')"]
+
+# Only the last value of each attribute is kept for repeated ChangeFields
+>>> mutations = optimize_mutations('tests', [
+...     ChangeField('TestModel', 'char_field', max_length=30, null=True),
+...     ChangeField('TestModel', 'int_field', db_index=True),
+...     ChangeField('TestModel', 'char_field', max_length=40),
+... ], start_sig)
+>>> print [str(m) for m in mutations]
+["ChangeField('TestModel', 'char_field', initial=None, max_length=40, null=True)", "ChangeField('TestModel', 'int_field', initial=None, db_index=True)"]
+
+# Changes to an added field are folded into the AddField
+>>> mutations = optimize_mutations('tests', [
+...     AddField('TestModel', 'added_field', models.IntegerField, null=True),
+...     RenameField('TestModel', 'added_field', 'renamed_field'),
+...     ChangeField('TestModel', 'renamed_field', null=False, initial=42),
+... ], start_sig)
+>>> print [str(m) for m in mutations]
+["AddField('TestModel', 'renamed_field', models.IntegerField, initial=42, null=False)"]
+
+# Changes to a model that is later deleted are removed
+>>> mutations = optimize_mutations('tests', [
+...     ChangeField('TestModel', 'char_field', max_length=30),
+...     RenameField('OtherModel', 'value', 'renamed_value'),
+...     DeleteField('TestModel', 'int_field2'),
+...     DeleteModel('TestModel'),
+... ], start_sig)
+>>> print [str(m) for m in mutations]
+["RenameField('OtherModel', 'value', 'renamed_value')", "DeleteModel('TestModel')"]
+
+# Mutations touching the same field in between prevent merging
+>>> mutations = optimize_mutations('tests', [
+...     RenameField('TestModel', 'int_field', 'renamed_field'),
+...     AddField('TestModel', 'int_field', models.IntegerField, null=True),
+...     RenameField('TestModel', 'renamed_field', 'int_field'),
+... ], start_sig)
+>>> len(mutations)
+3
+
+# Mutations are never merged across an SQLMutation
+>>> mutations = optimize_mutations('tests', [
+...     AddField('TestModel', 'added_field', models.IntegerField, null=True),
+...     SQLMutation('fill-added-field', ['UPDATE tests_testmodel SET added_field = 1;']),
+...     DeleteField('TestModel', 'added_field'),
+... ], start_sig)
+>>> len(mutations)
+3
+
+# The optimized mutations result in the same signature
+>>> class OptimizedModel(models.Model):
+...     char_field = models.CharField(max_length=40, null=True)
+...     renamed_field = models.IntegerField(db_column='int_field')
+...     added_field = models.IntegerField()
+
+>>> end = register_models(('TestModel', OptimizedModel), ('OtherModel', OptimizerOtherModel))
+>>> end_sig = test_proj_sig(('TestModel', OptimizedModel), ('OtherModel', OptimizerOtherModel))
+
+>>> mutations = optimize_mutations('tests', [
+...     ChangeField('TestModel', 'char_field', max_length=30),
+...     AddField('TestModel', 'added_field', models.IntegerField, null=True),
+...     RenameField('TestModel', 'int_field', 'temp_field'),
+...     DeleteField('TestModel', 'int_field2'),
+...     ChangeField('TestModel', 'added_field', null=False, initial=1),
+...     RenameField('TestModel', 'temp_field', 'renamed_field', db_column='int_field'),
+...     ChangeField('TestModel', 'char_field', max_length=40, null=True),
+... ], start_sig)
+>>> print [str(m) for m in mutations]
+["ChangeField('TestModel', 'char_field', initial=None, max_length=40, null=True)", "AddField('TestModel', 'added_field', models.IntegerField, initial=1, null=False)", "RenameField('TestModel', 'int_field', 'renamed_field', db_column='int_field')", "DeleteField('TestModel', 'int_field2')"]
+
+>>> test_sig = copy.deepcopy(start_sig)
+>>> for mutation in mutations:
+...     mutation.simulate('tests', test_sig)
+
+>>> Diff(test_sig, end_sig).is_empty()
+True
+
+# Clean up after the applications that were installed
+>>> deregister_models()
+
+"""
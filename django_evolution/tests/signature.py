@@ -169,6 +169,12 @@ False
 >>> print [str(e) for e in d.evolution()['tests']] # Rename Field
 ["AddField('TestModel', 'full_name', models.CharField, initial=<<USER VALUE REQUIRED>>, max_length=20)", "DeleteField('TestModel', 'name')"]
 
+# The differences are also available as a flat list of change records
+>>> d.changes
+[<FieldDeleted tests.TestModel.name>, <FieldAdded tests.TestModel.full_name>]
+>>> print d.to_json()
+[{"type": "field_deleted", "app_label": "tests", "model_name": "TestModel", "field_name": "name"}, {"type": "field_added", "app_label": "tests", "model_name": "TestModel", "field_name": "full_name"}]
+
 # Adding a property to a field which was not present in the original Model
 >>> class AddPropertyModel(models.Model):
 ...     name = models.CharField(max_length=20)
@@ -225,6 +231,10 @@ False
 In model tests.TestModel:
     In field 'name':
         Property 'max_length' has changed
+>>> d.changes
+[<FieldChanged tests.TestModel.name>]
+>>> d.changes[0].to_dict()
+{'type': 'field_changed', 'app_label': 'tests', 'model_name': 'TestModel', 'field_name': 'name', 'properties': ['max_length']}
 
 # Changing the model that a ForeignKey references
 >>> class ChangeFKModel(models.Model):
@@ -241,6 +251,232 @@ False
 >>> print [str(e) for e in d.evolution()['tests']] # Change Field - change property
 ["ChangeField('TestModel', 'ref', initial=None, related_model='tests.Anchor2')"]
 
+# Signatures are stored as compact, canonical JSON, and load back into the
+# same project signature.
+>>> sig_models = [('TestModel', SigModel), ('ParentModel', ParentModel), ('ChildModel', ChildModel)] + anchors
+>>> end = register_models(*sig_models)
+>>> proj_sig = test_proj_sig(*sig_models)
+>>> stored = signature.serialize_project_sig(proj_sig)
+>>> stored.startswith('{"__version__":2,')
+True
+>>> '"field_type":"CharField"' in stored
+True
+>>> loaded = signature.deserialize_project_sig(stored)
+>>> loaded == proj_sig
+True
+>>> loaded['tests'].keys() == proj_sig['tests'].keys()
+True
+>>> Diff(loaded, proj_sig).is_empty()
+True
+
+# Field types outside of django.db.models are stored by their full path
+>>> signature.get_field_type_name(generic.GenericRelation)
+'django.contrib.contenttypes.generic.GenericRelation'
+>>> signature.get_field_type('django.contrib.contenttypes.generic.GenericRelation') is generic.GenericRelation
+True
+
+# Attributes set to their default values are left out
+>>> proj_sig['tests']['TestModel']['fields']['int_field']['null'] = False
+>>> signature.serialize_project_sig(proj_sig) == stored
+True
+
+# Signatures can be compressed
+>>> compressed = signature.serialize_project_sig(proj_sig, compress=True)
+>>> compressed.startswith('zlib:')
+True
+>>> len(compressed) < len(stored)
+True
+>>> signature.deserialize_project_sig(compressed) == loaded
+True
+
+# Older pickled signatures still load
+>>> import pickle
+>>> signature.deserialize_project_sig(pickle.dumps(loaded)) == loaded
+True
+
+# Content hashes are stored along with the signature, for the project and
+# for each application and model.
+>>> hashes = signature.create_project_sig_hashes(loaded)
+>>> signature.load_signature_hashes(stored) == hashes
+True
+>>> signature.create_project_sig_hashes(proj_sig) == hashes
+True
+>>> changed_sig = test_proj_sig(*sig_models)
+>>> changed_sig['tests']['TestModel']['fields']['int_field']['null'] = True
+>>> changed_hashes = signature.create_project_sig_hashes(changed_sig)
+>>> changed_hashes['project'] == hashes['project']
+False
+>>> changed_hashes['apps']['tests'] == hashes['apps']['tests']
+False
+>>> changed_hashes['models']['tests']['TestModel'] == hashes['models']['tests']['TestModel']
+False
+>>> changed_hashes['models']['tests']['Anchor1'] == hashes['models']['tests']['Anchor1']
+True
+
+# Diff only compares the models whose hashes differ
+>>> print Diff(loaded, changed_sig, hashes, changed_hashes)
+In model tests.TestModel:
+    In field 'int_field':
+        Property 'null' has changed
+>>> Diff(loaded, changed_sig, hashes, hashes).is_empty()
+True
+
+# Signatures can be stored as the changes made since a previous signature.
+>>> import copy
+>>> new_sig = copy.deepcopy(loaded)
+>>> new_sig['tests']['TestModel']['fields']['int_field']['null'] = True
+>>> del new_sig['tests']['Anchor2']
+>>> delta = signature.serialize_project_sig_delta(loaded, new_sig, 1, 1)
+>>> len(delta) < len(stored)
+True
+>>> signature.get_signature_depth(delta)
+1
+>>> signature.deserialize_project_sig(delta, lambda base_id: copy.deepcopy(loaded)) == new_sig
+True
+
+# Versions store deltas when DJANGO_EVOLUTION_SIGNATURE_SNAPSHOT_INTERVAL is
+# set, with a full signature every N versions.
+>>> from django.conf import settings
+>>> from django_evolution import EvolutionException
+>>> from django_evolution.models import Version
+>>> settings.DJANGO_EVOLUTION_SIGNATURE_SNAPSHOT_INTERVAL = 2
+>>> version1 = Version()
+>>> version1.set_signature(loaded)
+>>> version1.save()
+>>> version2 = Version()
+>>> version2.set_signature(new_sig, version1)
+>>> version2.save()
+>>> signature.get_signature_depth(version2.signature)
+1
+>>> Version.objects.get(pk=version2.pk).get_signature() == new_sig
+True
+>>> version3 = Version()
+>>> version3.set_signature(loaded, version2)
+>>> signature.get_signature_depth(version3.signature)
+0
+>>> del settings.DJANGO_EVOLUTION_SIGNATURE_SNAPSHOT_INTERVAL
+>>> Version.objects.filter(pk__in=[version1.pk, version2.pk]).delete()
+
+# A delta whose base version was pruned can't be loaded, and a new version
+# based on it stores a full signature instead.
+>>> settings.DJANGO_EVOLUTION_SIGNATURE_SNAPSHOT_INTERVAL = 10
+>>> version1 = Version()
+>>> version1.set_signature(loaded)
+>>> version1.save()
+>>> version2 = Version()
+>>> version2.set_signature(new_sig, version1)
+>>> version2.save()
+>>> base_pk = version1.pk
+>>> version1.delete()
+>>> version2 = Version.objects.get(pk=version2.pk)
+>>> try:
+...     version2.get_signature()
+... except EvolutionException, e:
+...     str(e) == ('Unable to load the signature of version %s, as the '
+...                'version %s it was stored relative to no longer exists'
+...                % (version2.pk, base_pk))
+True
+>>> version3 = Version()
+>>> version3.set_signature(loaded, version2)
+>>> signature.get_signature_depth(version3.signature)
+0
+>>> signature.deserialize_project_sig(version3.signature) == loaded
+True
+>>> del settings.DJANGO_EVOLUTION_SIGNATURE_SNAPSHOT_INTERVAL
+>>> version2.delete()
+
+# Field signatures are built from attribute lists worked out once per field
+# class, giving the same results as checking each attribute on every field.
+>>> def reference_field_sig(field):
+...     field_sig = {'field_type': field.__class__}
+...     for attrib in signature.ATTRIBUTE_DEFAULTS.keys():
+...         alias = signature.ATTRIBUTE_ALIASES.get(attrib, attrib)
+...         if hasattr(field, alias):
+...             value = getattr(field, alias)
+...             if isinstance(field, models.ForeignKey) and attrib == 'db_index':
+...                 default = True
+...             else:
+...                 default = signature.ATTRIBUTE_DEFAULTS[attrib]
+...             if default != value:
+...                 field_sig[attrib] = value
+...     rel = field_sig.pop('rel', None)
+...     if rel:
+...         field_sig['related_model'] = '.'.join([rel.to._meta.app_label, rel.to._meta.object_name])
+...     return field_sig
+
+>>> all_fields = []
+>>> for model in models.get_models() + [Anchor1, Anchor2, Anchor3, SigModel, ParentModel, ChildModel]:
+...     all_fields.extend(model._meta.local_fields + model._meta.local_many_to_many)
+>>> len(all_fields) > 50
+True
+>>> [f.name for f in all_fields if signature.create_field_sig(f) != reference_field_sig(f)]
+[]
+
+# Project signatures only create the signature of an application the first
+# time it's accessed.
+>>> proj_sig = signature.create_project_sig('default')
+>>> 'auth' in proj_sig, 'sessions' in proj_sig, 'removed_app' in proj_sig
+(True, True, False)
+>>> sorted(proj_sig._app_sigs.keys())
+['__version__']
+>>> proj_sig['sessions'].keys()
+['Session']
+>>> sorted(proj_sig._app_sigs.keys())
+['__version__', 'sessions']
+
+# Copying them creates every application's signature, as a normal dictionary.
+>>> old_sig = signature.create_project_sig('default').copy()
+>>> type(old_sig), type(copy.deepcopy(proj_sig))
+(<type 'dict'>, <type 'dict'>)
+>>> old_sig == proj_sig
+True
+
+# Diffs can be limited to some applications, leaving the signatures of the
+# others uncreated, while still finding deleted applications.
+>>> del old_sig['sessions']['Session']['fields']['expire_date']
+>>> old_sig['removed_app'] = {}
+>>> proj_sig = signature.create_project_sig('default')
+>>> d = Diff(old_sig, proj_sig, app_labels=['auth'])
+>>> d.is_empty(), d.deleted
+(True, {'removed_app': []})
+>>> sorted(proj_sig._app_sigs.keys())
+['__version__', 'auth']
+
+>>> print Diff(old_sig, proj_sig, app_labels=['sessions'])
+The application removed_app has been deleted
+In model sessions.Session:
+    Field 'expire_date' has been added
+
+# Changing a field's class to one with the same internal type isn't a change.
+# Each field class is only instantiated once to find its internal type.
+>>> class CountingCharField(models.CharField):
+...     instances = 0
+...     def __init__(self, *args, **kwargs):
+...         CountingCharField.instances += 1
+...         super(CountingCharField, self).__init__(*args, **kwargs)
+>>> test_sig = copy.deepcopy(start_sig)
+>>> test_sig['tests']['TestModel']['fields']['name']['field_type'] = CountingCharField
+>>> Diff(start_sig, test_sig).is_empty(), Diff(start_sig, test_sig).is_empty()
+(True, True)
+>>> CountingCharField.instances
+1
+>>> Diff.get_internal_type(CountingCharField)
+'CharField'
+
+# Field classes that fail to construct have an unknown internal type, and are
+# reported as changed, unless their internal type has been registered.
+>>> class RequiredArgCharField(models.CharField):
+...     def __init__(self, choices_source, *args, **kwargs):
+...         super(RequiredArgCharField, self).__init__(*args, **kwargs)
+>>> test_sig['tests']['TestModel']['fields']['name']['field_type'] = RequiredArgCharField
+>>> Diff(start_sig, test_sig).changes
+[<FieldChanged tests.TestModel.name>]
+>>> print Diff.get_internal_type(RequiredArgCharField)
+None
+>>> Diff.register_internal_type(RequiredArgCharField, 'CharField')
+>>> Diff(start_sig, test_sig).changes
+[]
+
 # Clean up after the applications that were installed
 >>> deregister_models()
 
@@ -0,0 +1,137 @@
+tests = r"""
+>>> from django.db import connection, models
+>>> from django_evolution.db import sqlite3
+>>> from django_evolution.utils import execute_sql, write_sql
+>>> from django_evolution.tests.utils import register_models, deregister_models
+
+>>> class TableCopyModel(models.Model):
+...     char_field = models.CharField(max_length=20, db_index=True)
+...     int_field = models.IntegerField(null=True)
+
+>>> start = register_models(('TestModel', TableCopyModel))
+
+>>> cursor = connection.cursor()
+>>> cursor.execute('CREATE TABLE "tests_testmodel" ("id" integer NOT NULL UNIQUE PRIMARY KEY, "char_field" varchar(20) NOT NULL, "int_field" integer NULL);') and None
+>>> for i in range(1, 26):
+...     cursor.execute('INSERT INTO "tests_testmodel" ("id", "char_field", "int_field") VALUES (%s, %s, NULL);', (i, 'row %d' % i)) and None
+>>> cursor.execute('UPDATE "tests_testmodel" SET "int_field" = 7 WHERE "id" = 3;') and None
+
+>>> def progress(description, done, total):
+...     print '%s: %d of %d' % (description, done, total)
+
+# SQLite tables can be rebuilt by copying their rows once, in batches of
+# rowids, into a new table that then replaces the original one.
+>>> evolver = sqlite3.EvolutionOperations(connection)
+>>> evolver.copy_batch_size = 10
+>>> added_field = models.IntegerField()
+>>> added_field.set_attributes_from_name('added_field')
+>>> sql = evolver.add_column(TableCopyModel, added_field, 42)
+>>> for statement in sql:
+...     print unicode(statement)
+CREATE TABLE "tests_testmodel__evolution_new"("id" integer NOT NULL UNIQUE PRIMARY KEY, "char_field" varchar(20) NOT NULL, "int_field" integer NULL, "added_field" integer NOT NULL);
+-- Copy in batches of 10 rows by rowid:
+INSERT INTO "tests_testmodel__evolution_new" ("id", "char_field", "int_field", "added_field") SELECT "id", "char_field", "int_field", %s FROM "tests_testmodel" WHERE rowid >= %s AND rowid < %s ORDER BY rowid;
+DROP TABLE "tests_testmodel";
+ALTER TABLE "tests_testmodel__evolution_new" RENAME TO "tests_testmodel";
+
+# The SQL written for the copy copies all the rows at once.
+>>> write_sql(sql[1:2], 'default')
+INSERT INTO "tests_testmodel__evolution_new" ("id", "char_field", "int_field", "added_field") SELECT "id", "char_field", "int_field", 42 FROM "tests_testmodel";
+
+# Executed statements can be recorded in a report, along with where they
+# came from, and passed to a callback as soon as they've been executed.
+>>> from django.utils import simplejson
+>>> from django_evolution.utils import ExecutionReport
+>>> def statement_executed(record):
+...     print record['table'], record['rowcount'], record['app_label'], record['mutations']
+>>> report = ExecutionReport('default', statement_executed)
+>>> sources = [('tests', ["AddField('TestModel', 'added_field', models.IntegerField, initial=42)"])] * len(sql)
+
+>>> execute_sql(cursor, sql, progress=progress, report=report, sources=sources)
+tests_testmodel__evolution_new -1 tests [u"AddField('TestModel', 'added_field', models.IntegerField, initial=42)"]
+Copying rows of tests_testmodel: 10 of 25
+Copying rows of tests_testmodel: 20 of 25
+Copying rows of tests_testmodel: 25 of 25
+tests_testmodel__evolution_new 25 tests [u"AddField('TestModel', 'added_field', models.IntegerField, initial=42)"]
+tests_testmodel -1 tests [u"AddField('TestModel', 'added_field', models.IntegerField, initial=42)"]
+tests_testmodel__evolution_new -1 tests [u"AddField('TestModel', 'added_field', models.IntegerField, initial=42)"]
+>>> cursor.execute('SELECT COUNT(*), MIN("added_field"), MAX("added_field") FROM "tests_testmodel";') and None
+>>> cursor.fetchone()
+(25, 42, 42)
+
+>>> data = simplejson.loads(report.to_json())
+>>> data['database'], len(data['statements']), data['total_time'] >= 0
+(u'default', 4, True)
+>>> print data['statements'][1]['sql']
+-- Copy in batches of 10 rows by rowid:
+INSERT INTO "tests_testmodel__evolution_new" ("id", "char_field", "int_field", "added_field") SELECT "id", "char_field", "int_field", %s FROM "tests_testmodel" WHERE rowid >= %s AND rowid < %s ORDER BY rowid;
+>>> data['statements'][1]['error'] is None
+True
+
+# A statement that fails is recorded along with its error.
+>>> report.callback = None
+>>> execute_sql(cursor, ['DROP TABLE "tests_missing";'], report=report)
+Traceback (most recent call last):
+...
+DatabaseError: no such table: tests_missing
+>>> record = report.statements[-1]
+>>> record['sql'], record['table'], record['rowcount'], record['time'] >= 0
+(u'DROP TABLE "tests_missing";', u'tests_missing', -1, True)
+>>> print record['error']
+DatabaseError: no such table: tests_missing
+
+# Initial values for columns that are no longer nullable only replace NULLs
+>>> class TableCopyNotNullModel(models.Model):
+...     char_field = models.CharField(max_length=20, db_index=True)
+...     int_field = models.IntegerField()
+...     added_field = models.IntegerField()
+
+>>> end = register_models(('TestModel', TableCopyNotNullModel))
+>>> old_fields = dict([(f.name, f) for f in TableCopyModel._meta.local_fields])
+>>> old_fields['added_field'] = added_field
+>>> new_fields = TableCopyNotNullModel._meta.local_fields
+>>> sql = evolver.copy_table('tests_testmodel', new_fields, [old_fields[f.name] for f in new_fields], {'int_field': (1, True)})
+>>> for statement in sql:
+...     print unicode(statement)
+CREATE TABLE "tests_testmodel__evolution_new"("id" integer NOT NULL UNIQUE PRIMARY KEY, "char_field" varchar(20) NOT NULL, "int_field" integer NOT NULL, "added_field" integer NOT NULL);
+-- Copy in batches of 10 rows by rowid:
+INSERT INTO "tests_testmodel__evolution_new" ("id", "char_field", "int_field", "added_field") SELECT "id", "char_field", COALESCE("int_field", %s), "added_field" FROM "tests_testmodel" WHERE rowid >= %s AND rowid < %s ORDER BY rowid;
+DROP TABLE "tests_testmodel";
+ALTER TABLE "tests_testmodel__evolution_new" RENAME TO "tests_testmodel";
+CREATE INDEX "tests_testmodel_f15b9174" ON "tests_testmodel" ("char_field");
+
+>>> execute_sql(cursor, sql)
+>>> cursor.execute('SELECT "int_field", COUNT(*) FROM "tests_testmodel" GROUP BY "int_field" ORDER BY "int_field";') and None
+>>> cursor.fetchall()
+[(1, 24), (7, 1)]
+
+>>> cursor.execute('DROP TABLE "tests_testmodel";') and None
+
+# Rebuilding a table to change an attribute leaves out the indexes, so a
+# field can then be deleted in place without its index.
+>>> class IndexedModel(models.Model):
+...     char_field = models.CharField(max_length=20, db_index=True)
+...     int_field = models.IntegerField(null=True)
+
+>>> end = register_models(('TestModel', IndexedModel))
+>>> cursor.execute('CREATE TABLE "tests_testmodel" ("id" integer NOT NULL PRIMARY KEY, "char_field" varchar(20) NOT NULL, "int_field" integer NULL);') and None
+>>> char_field = IndexedModel._meta.get_field('char_field')
+>>> evolver = sqlite3.EvolutionOperations(connection)
+>>> execute_sql(cursor, evolver.create_index(IndexedModel, char_field))
+>>> sql = evolver.change_null(IndexedModel, 'char_field', True)
+>>> sql.extend(evolver.delete_column(IndexedModel, char_field))
+>>> execute_sql(cursor, sql)
+>>> cursor.execute('SELECT * FROM "tests_testmodel";') and None
+>>> [column[0] for column in cursor.description]
+['id', 'int_field']
+
+>>> evolver.supports_drop_column = True
+>>> evolver.delete_column(IndexedModel, char_field)
+['DROP INDEX IF EXISTS "tests_testmodel_f15b9174";', 'ALTER TABLE "tests_testmodel" DROP COLUMN "char_field";']
+
+>>> cursor.execute('DROP TABLE "tests_testmodel";') and None
+
+# Clean up after the applications that were installed
+>>> deregister_models()
+
+"""
@@ -1,25 +1,192 @@
-from django_evolution.db import EvolutionOperationsMulti
+import re
+import sys
+import time
+import traceback
 
-def write_sql(sql, database):
-    "Output a list of SQL statements, unrolling parameters as required"
-    qp = EvolutionOperationsMulti(database).get_evolver().quote_sql_param
+from django.utils import simplejson
+from django.utils.datastructures import SortedDict
+from django.utils.functional import curry
+from django.utils.hashcompat import sha_constructor
+
+from django_evolution.db import get_evolver
+from django_evolution.db.common import SQLOperation
+
+
+# Matches the table that an SQL statement operates on.
+STATEMENT_TABLE_RE = re.compile(
+    r'^\s*(?:ALTER TABLE|CREATE (?:TEMPORARY )?TABLE|DROP TABLE|'
+    r'INSERT INTO|UPDATE|DELETE FROM|'
+    r'CREATE (?:UNIQUE )?INDEX (?:CONCURRENTLY )?\S+ ON|'
+    r'DROP INDEX (?:CONCURRENTLY )?\S+ ON)\s+[`"]?(?P<table>[^`"\s(]+)',
+    re.IGNORECASE | re.MULTILINE)
+
+
+def get_statement_table(statement):
+    """
+    Returns the name of the table an SQL statement operates on, or None if
+    it can't be determined.
+    """
+    if isinstance(statement, tuple):
+        statement = statement[0]
+
+    m = STATEMENT_TABLE_RE.search(unicode(statement))
+
+    if m:
+        return m.group('table')
+
+    return None
+
+
+class ExecutionReport(object):
+    """
+    A record of the statements executed by execute_sql.
+
+    For each statement, this records the time taken to execute it, the
+    number of rows it affected (or -1 if that isn't known), the table it
+    operates on, and the application and mutations it was generated for.
+    A statement that failed is recorded along with its error.
+
+    If a callback is provided, it's called with the record for each
+    statement as soon as the statement has been executed.
+    """
+    def __init__(self, database=None, callback=None):
+        self.database = database
+        self.callback = callback
+        self.statements = []
+
+    def add(self, statement, time_taken, rowcount, app_label=None,
+            mutations=None, error=None):
+        "Records a statement that has been executed, or that failed."
+        mutations = mutations or []
 
-    for statement in sql:
         if isinstance(statement, tuple):
-            print unicode(statement[0] % tuple(qp(s) for s in statement[1]))
+            sql = statement[0]
+        else:
+            sql = unicode(statement)
+
+        record = SortedDict([
+            ('database', self.database),
+            ('sql', sql),
+            ('app_label', app_label),
+            ('mutations', [unicode(mutation) for mutation in mutations]),
+            ('table', get_statement_table(statement)),
+            ('time', time_taken),
+            ('rowcount', rowcount),
+            ('error', error),
+        ])
+
+        self.statements.append(record)
+
+        if self.callback:
+            self.callback(record)
+
+    def get_total_time(self):
+        "Returns the time taken by all the statements executed."
+        return sum([record['time'] for record in self.statements])
+
+    def get_data(self):
+        "Returns the report as a dictionary that can be encoded as JSON."
+        return SortedDict([
+            ('database', self.database),
+            ('total_time', self.get_total_time()),
+            ('statements', self.statements),
+        ])
+
+    def to_json(self, indent=None):
+        "Returns the report as JSON."
+        return simplejson.dumps(self.get_data(), indent=indent)
+
+
+def write_sql(sql, database, out=None):
+    """
+    Output a list of SQL statements, unrolling parameters as required
+
+    Operations are written as the statements that would apply them by hand.
+    The statements are written to out if provided, or to stdout otherwise.
+    """
+    qp = get_evolver(database).quote_sql_param
+    out = out or sys.stdout
+
+    for statement in sql:
+        if isinstance(statement, SQLOperation):
+            write_sql(statement.get_sql(), database, out)
+        elif isinstance(statement, tuple):
+            print >>out, unicode(statement[0] %
+                                 tuple(qp(s) for s in statement[1]))
         else:
-            print unicode(statement)
+            print >>out, unicode(statement)
+
+
+def get_sql_hash(sql):
+    """
+    Returns a hash identifying a list of SQL statements, as they would be
+    written by write_sql.
+    """
+    hasher = sha_constructor()
 
+    for statement in sql:
+        if isinstance(statement, tuple):
+            statement = u'%s %r' % (statement[0], tuple(statement[1]))
+
+        hasher.update(unicode(statement).encode('utf-8'))
+        hasher.update('\n')
 
-def execute_sql(cursor, sql):
+    return hasher.hexdigest()
+
+
+def execute_sql(cursor, sql, commit=None, progress=None, report=None,
+                sources=None):
     """
     Execute a list of SQL statements on the provided cursor, unrolling
     parameters as required
+
+    Operations such as backfills may commit the current transaction as they
+    go, by calling commit (if provided) with the number of statements in
+    sql that have been completed so far. They may also call progress (if
+    provided) to report how far along they are.
+
+    If report is provided, each statement executed is recorded in that
+    ExecutionReport, including a statement that fails. sources may provide
+    an (app_label, mutations) tuple for each statement in sql, which is
+    recorded along with the statement.
     """
-    for statement in sql:
+    for i, statement in enumerate(sql):
         if isinstance(statement, tuple):
-            if not statement[0].startswith('--'):
+            if statement[0].startswith('--'):
+                continue
+        elif not isinstance(statement, SQLOperation):
+            if statement.startswith('--'):
+                continue
+
+        start = time.time()
+        rowcount = -1
+        error = None
+
+        try:
+            if isinstance(statement, SQLOperation):
+                try:
+                    if commit:
+                        statement.execute(cursor, curry(commit, i), progress)
+                    else:
+                        statement.execute(cursor, None, progress)
+                finally:
+                    rowcount = statement.rowcount
+            elif isinstance(statement, tuple):
                 cursor.execute(*statement)
-        else:
-            if not statement.startswith('--'):
+                rowcount = cursor.rowcount
+            else:
                 cursor.execute(statement)
+                rowcount = cursor.rowcount
+        except:
+            error = traceback.format_exception_only(
+                *sys.exc_info()[:2])[-1].strip()
+            raise
+        finally:
+            if report is not None:
+                if sources:
+                    app_label, mutations = sources[i]
+                else:
+                    app_label, mutations = None, []
+
+                report.add(statement, time.time() - start, rowcount,
+                           app_label, mutations, error)
@@ -0,0 +1,493 @@
+#!/usr/bin/env python
+#
+# Benchmarks each stage of an evolution on a synthetic project, using SQLite.
+#
+# The project has N applications, each with M models of K fields. Models
+# have foreign keys to each other, within and across applications, and some
+# have many-to-many relations. The project is synced, the models are then
+# changed (adding, changing and deleting fields on every model), and each
+# stage of `evolve --hint`, `evolve --hint --sql` and
+# `evolve --hint --execute` is timed.
+#
+# The results are written as JSON, and can be compared against the results
+# of an earlier run:
+#
+#     ./tests/benchmark.py --apps=10 --models=20 --fields=10 \
+#                          --output=before.json
+#     ./tests/benchmark.py --apps=10 --models=20 --fields=10 \
+#                          --compare=before.json
+#
+# Comparing exits with a non-zero status if any stage became slower than
+# the allowed threshold.
+
+import copy
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+from django.utils import simplejson
+
+
+# The version of the results format. Results are only compared if they were
+# recorded with the same version.
+RESULTS_VERSION = 1
+
+# The types of the fields on each model, after the first two fields. The
+# first field is always a CharField and the second an IntegerField, as
+# these are changed by the evolution.
+FIELD_TYPES = [
+    'models.BooleanField(default=False)',
+    'models.DateTimeField(null=True)',
+    'models.DecimalField(max_digits=10, decimal_places=2, default=0)',
+    'models.TextField(null=True)',
+    'models.IntegerField(null=True, db_index=True)',
+]
+
+# The stages that are timed, in the order they're run.
+STAGES = [
+    'syncdb',
+    'insert_rows',
+    'create_project_sig',
+    'load_stored_sig',
+    'diff',
+    'diff_evolution',
+    'mock_models',
+    'sql_generation',
+    'evolve_hint',
+    'evolve_hint_sql',
+    'evolve_hint_execute',
+]
+
+
+def get_app_label(app_index):
+    return 'bench_app%d' % app_index
+
+
+def generate_models(options, evolved=False):
+    """
+    Returns the source of the models.py file for each application.
+
+    If evolved is set, the models are changed: a field is added to every
+    model, the first two fields are changed, and the last field is deleted.
+    """
+    apps = {}
+
+    for app_index in range(options.apps):
+        lines = ['from django.db import models', '']
+
+        if app_index > 0:
+            lines[1:1] = ['from %s.models import Model0 as PreviousAppModel'
+                          % get_app_label(app_index - 1)]
+            lines.append('')
+
+        for model_index in range(options.models):
+            lines.append('class Model%d(models.Model):' % model_index)
+
+            if evolved:
+                lines.append('    field0 = models.CharField(max_length=100)')
+                lines.append('    field1 = models.IntegerField(db_index=True)')
+            else:
+                lines.append('    field0 = models.CharField(max_length=50)')
+                lines.append('    field1 = models.IntegerField()')
+
+            num_fields = options.fields
+
+            if evolved and num_fields > 2:
+                num_fields -= 1
+
+            for field_index in range(2, num_fields):
+                lines.append('    field%d = %s' % (
+                    field_index,
+                    FIELD_TYPES[(field_index - 2) % len(FIELD_TYPES)]))
+
+            if model_index > 0:
+                lines.append('    parent = models.ForeignKey(Model%d)'
+                             % (model_index - 1))
+            elif app_index > 0:
+                lines.append('    other_app = '
+                             'models.ForeignKey(PreviousAppModel)')
+
+            if model_index > 0 and model_index % 3 == 0:
+                lines.append('    related = models.ManyToManyField(Model0)')
+
+            if evolved:
+                lines.append('    added = models.IntegerField(null=True)')
+
+            lines.append('')
+            lines.append('')
+
+        apps[get_app_label(app_index)] = '\n'.join(lines)
+
+    return apps
+
+
+def write_project(project_dir, options, evolved=False):
+    "Writes the settings and applications of the project."
+    db_name = os.path.join(project_dir, 'benchmark.db')
+    app_labels = [get_app_label(i) for i in range(options.apps)]
+
+    f = open(os.path.join(project_dir, 'benchmark_settings.py'), 'w')
+    f.write('DATABASES = {\n'
+            '    "default": {\n'
+            '        "ENGINE": "django.db.backends.sqlite3",\n'
+            '        "NAME": %r,\n'
+            '    },\n'
+            '}\n'
+            'DATABASE_ENGINE = "sqlite3"\n'
+            'DATABASE_NAME = %r\n'
+            'INSTALLED_APPS = %r\n'
+            'SECRET_KEY = "benchmark"\n'
+            % (db_name, db_name,
+               ['django.contrib.contenttypes', 'django_evolution'] +
+               app_labels))
+    f.close()
+
+    for app_label, source in generate_models(options, evolved).items():
+        app_dir = os.path.join(project_dir, app_label)
+
+        if not os.path.exists(app_dir):
+            os.mkdir(app_dir)
+            open(os.path.join(app_dir, '__init__.py'), 'w').close()
+
+        f = open(os.path.join(app_dir, 'models.py'), 'w')
+        f.write(source)
+        f.close()
+
+        # Make sure the changed models aren't loaded from stale bytecode.
+        if os.path.exists(os.path.join(app_dir, 'models.pyc')):
+            os.unlink(os.path.join(app_dir, 'models.pyc'))
+
+
+class StageTimer(object):
+    "Times stages, keeping the best time of each stage."
+    def __init__(self):
+        self.timings = {}
+
+    def run(self, stage, func, repeat=1):
+        result = None
+
+        for i in range(repeat):
+            start = time.time()
+            result = func()
+            elapsed = time.time() - start
+
+            if stage not in self.timings or elapsed < self.timings[stage]:
+                self.timings[stage] = elapsed
+
+        return result
+
+
+def run_quietly(func):
+    "Runs a function with anything it prints discarded."
+    old_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+
+    try:
+        return func()
+    finally:
+        sys.stdout.close()
+        sys.stdout = old_stdout
+
+
+def insert_rows(num_rows):
+    "Inserts rows into the table of every model in the project."
+    from django.db import connection, models, transaction
+
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+
+    for app in models.get_apps():
+        for model in models.get_models(app):
+            if not model._meta.app_label.startswith('bench_app'):
+                continue
+
+            fields = model._meta.local_fields
+            rows = []
+
+            for row_id in range(1, num_rows + 1):
+                row = []
+
+                for field in fields:
+                    if field.primary_key:
+                        row.append(row_id)
+                    elif field.rel:
+                        row.append(1)
+                    elif field.null:
+                        row.append(None)
+                    elif isinstance(field, models.CharField):
+                        row.append('value %d' % row_id)
+                    elif isinstance(field, models.BooleanField):
+                        row.append(False)
+                    else:
+                        row.append(row_id)
+
+                rows.append(row)
+
+            cursor.executemany(
+                'INSERT INTO %s (%s) VALUES (%s);'
+                % (qn(model._meta.db_table),
+                   ', '.join([qn(field.column) for field in fields]),
+                   ', '.join(['%s'] * len(fields))),
+                rows)
+
+    transaction.commit_unless_managed()
+
+
+def run_setup_stage(options, timer):
+    "Syncs the original project, and fills in its tables."
+    from django.core.management import call_command
+
+    timer.run('syncdb', lambda: run_quietly(
+        lambda: call_command('syncdb', verbosity=0, interactive=False)))
+    timer.run('insert_rows', lambda: insert_rows(options.rows))
+
+
+def run_evolve_stage(options, timer):
+    "Times each stage of evolving the changed project."
+    from django_evolution.diff import Diff
+    from django_evolution.management.commands.evolve import Command
+    from django_evolution.models import Version
+    from django_evolution.mutations import MockModel
+    from django_evolution.mutators import AppMutator
+    from django_evolution.signature import create_project_sig
+
+    repeat = options.repeat
+
+    # The project signature is created lazily, so copy it to create the
+    # signatures of every application.
+    proj_sig = timer.run('create_project_sig',
+                         lambda: create_project_sig('default').copy(), repeat)
+    stored_sig = timer.run(
+        'load_stored_sig',
+        lambda: Version.objects.latest('when').get_signature(), repeat)
+    diff = timer.run('diff', lambda: Diff(stored_sig, proj_sig), repeat)
+    hinted = timer.run('diff_evolution', diff.evolution, repeat)
+
+    def build_mock_models():
+        for app_label, app_sig in stored_sig.items():
+            if app_label != '__version__':
+                for model_name, model_sig in app_sig.items():
+                    MockModel(stored_sig, app_label, model_name, model_sig)
+
+    timer.run('mock_models', build_mock_models, repeat)
+
+    def generate_sql():
+        sig = copy.deepcopy(stored_sig)
+
+        for app_label, mutations in hinted.items():
+            AppMutator(app_label, sig, 'default').run_mutations(mutations)
+
+    timer.run('sql_generation', generate_sql, repeat)
+
+    def evolve(**kwargs):
+        command_options = {
+            'verbosity': 0,
+            'interactive': False,
+            'hint': True,
+            'purge': False,
+            'compile_sql': False,
+            'execute': False,
+            'database': None,
+            'all_databases': False,
+        }
+        command_options.update(kwargs)
+
+        return lambda: run_quietly(
+            lambda: Command().evolve(**command_options))
+
+    timer.run('evolve_hint', evolve(), repeat)
+    timer.run('evolve_hint_sql', evolve(compile_sql=True), repeat)
+    timer.run('evolve_hint_execute', evolve(execute=True))
+
+
+def disable_sync(sender, connection, **kwargs):
+    """
+    Turns off syncing to disk on new SQLite connections.
+
+    Otherwise, the time taken by stages that write to the database mostly
+    depends on the disk, making it hard to compare between runs.
+    """
+    connection.cursor().execute('PRAGMA synchronous=OFF;')
+
+
+def run_stage(options):
+    "Runs a stage inside the benchmark project, recording its timings."
+    from django.db.backends.signals import connection_created
+
+    connection_created.connect(disable_sync)
+    timer = StageTimer()
+
+    if options.stage == 'setup':
+        run_setup_stage(options, timer)
+    else:
+        run_evolve_stage(options, timer)
+
+    f = open(options.stage_output, 'w')
+    f.write(simplejson.dumps(timer.timings))
+    f.close()
+
+
+def run_benchmark(options):
+    "Runs the benchmark, returning the results."
+    project_dir = tempfile.mkdtemp(prefix='django-evolution-benchmark-')
+    repo_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    env = dict(os.environ,
+               DJANGO_SETTINGS_MODULE='benchmark_settings',
+               PYTHONPATH=os.pathsep.join([project_dir, repo_dir,
+                                           os.path.dirname(__file__)]))
+    timings = {}
+
+    try:
+        for stage, evolved in (('setup', False), ('evolve', True)):
+            write_project(project_dir, options, evolved)
+            stage_output = os.path.join(project_dir, '%s.json' % stage)
+
+            args = [sys.executable, os.path.abspath(__file__),
+                    '--stage=%s' % stage,
+                    '--stage-output=%s' % stage_output,
+                    '--apps=%d' % options.apps,
+                    '--models=%d' % options.models,
+                    '--fields=%d' % options.fields,
+                    '--rows=%d' % options.rows,
+                    '--repeat=%d' % options.repeat]
+
+            if subprocess.call(args, env=env) != 0:
+                raise RuntimeError('The %s stage of the benchmark failed.'
+                                   % stage)
+
+            f = open(stage_output, 'r')
+            timings.update(simplejson.loads(f.read()))
+            f.close()
+    finally:
+        shutil.rmtree(project_dir)
+
+    import django
+    import sqlite3
+
+    return {
+        'version': RESULTS_VERSION,
+        'parameters': {
+            'apps': options.apps,
+            'models': options.models,
+            'fields': options.fields,
+            'rows': options.rows,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+        },
+        'stages': timings,
+    }
+
+
+def print_results(results):
+    print 'Stage                       Time (s)'
+
+    for stage in STAGES:
+        if stage in results['stages']:
+            print '%-26s %9.4f' % (stage, results['stages'][stage])
+
+
+def compare_results(baseline, results, threshold, min_time):
+    """
+    Prints a comparison of the results against a baseline.
+
+    Returns whether any stage regressed, taking longer than the baseline
+    by more than the threshold (as a ratio) and by at least min_time
+    seconds.
+    """
+    if baseline.get('version') != results['version']:
+        raise ValueError('The baseline was recorded with a different '
+                         'version of the benchmark.')
+
+    if baseline['parameters'] != results['parameters']:
+        raise ValueError('The baseline was recorded with different '
+                         'parameters: %r' % baseline['parameters'])
+
+    regressed = False
+
+    print 'Stage                       Baseline     Current    Ratio'
+
+    for stage in STAGES:
+        if stage not in results['stages'] or stage not in baseline['stages']:
+            continue
+
+        old_time = baseline['stages'][stage]
+        new_time = results['stages'][stage]
+        ratio = new_time / max(old_time, 1e-9)
+        flag = ''
+
+        if ratio > threshold and new_time - old_time >= min_time:
+            flag = '  REGRESSION'
+            regressed = True
+
+        print '%-26s %9.4f   %9.4f   %6.2f%s' % (stage, old_time, new_time,
+                                                 ratio, flag)
+
+    return regressed
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--apps', type='int', default=5,
+                      help='Number of applications to generate.')
+    parser.add_option('--models', type='int', default=10,
+                      help='Number of models in each application.')
+    parser.add_option('--fields', type='int', default=8,
+                      help='Number of fields in each model, not counting '
+                           'relations.')
+    parser.add_option('--rows', type='int', default=100,
+                      help='Number of rows in each table.')
+    parser.add_option('--repeat', type='int', default=3,
+                      help='Number of times to run the stages that can be '
+                           'repeated, keeping the best time.')
+    parser.add_option('--output',
+                      help='Write the results as JSON to this file.')
+    parser.add_option('--compare',
+                      help='Compare the results against the results in '
+                           'this file.')
+    parser.add_option('--threshold', type='float', default=1.25,
+                      help='Ratio of the baseline time above which a '
+                           'stage is reported as a regression.')
+    parser.add_option('--min-time', type='float', default=0.01,
+                      help='Difference in seconds below which a stage is '
+                           'never reported as a regression.')
+    parser.add_option('--stage', help='(Internal) Run a single stage.')
+    parser.add_option('--stage-output', help='(Internal) Stage results.')
+
+    options, args = parser.parse_args()
+
+    if options.fields < 2:
+        parser.error('--fields must be at least 2.')
+
+    if options.stage:
+        run_stage(options)
+        return
+
+    results = run_benchmark(options)
+
+    if options.output:
+        f = open(options.output, 'w')
+        f.write(simplejson.dumps(results, indent=2, sort_keys=True))
+        f.close()
+
+    if options.compare:
+        f = open(options.compare, 'r')
+        baseline = simplejson.loads(f.read())
+        f.close()
+
+        if compare_results(baseline, results, options.threshold,
+                           options.min_time):
+            sys.exit(1)
+    else:
+        print_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,14 +10,18 @@ ADMINS = (
 
 MANAGERS = ADMINS
 
+# The test databases are stored in files rather than in memory, so that
+# evolve --all-databases can reach them from its threads.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': 'django_evolution_test.db',
+        'TEST_NAME': 'test_django_evolution_test.db',
     },
     'db_multi': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': 'django_evolution_test_multi.db',
+        'TEST_NAME': 'test_django_evolution_test_multi.db',
     },
 }
 